@@ -141,6 +141,7 @@ setup(
         "kaleido",
         "papermill",
         "python-dotenv",
+        "psutil",
     ],  # Optional
     # List additional groups of dependencies here (e.g. development
     # dependencies). Users will be able to install these using the "extras"
@@ -152,6 +153,7 @@ setup(
     # projects.
     extras_require={
         "dev": ["black", "flake8", "isort>=5", "pre-commit", "pytest", "tox"],
+        "parquet": ["pyarrow"],
         # "test": [],
     },  # Optional
     # If there are data files included in your packages that need to be
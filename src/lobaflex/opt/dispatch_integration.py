@@ -2,18 +2,23 @@ import logging
 import os
 import warnings
 
-from copy import deepcopy
+from copy import copy
 from datetime import datetime
-from functools import partial
 
 import pandas as pd
 
-from edisgo.edisgo import EDisGo, import_edisgo_from_files
+from edisgo.edisgo import EDisGo
 
 from lobaflex import config_dir, logs_dir, results_dir
 from lobaflex.opt.timeframe_selection import extract_timeframe
 from lobaflex.tools.logger import setup_logging
-from lobaflex.tools.tools import get_config, get_files_in_subdirs, log_errors
+from lobaflex.tools.result_store import (
+    find_result_files,
+    parse_time_index,
+    read_result_files,
+)
+from lobaflex.tools.snapshot import load_stage_edisgo, save_edisgo
+from lobaflex.tools.tools import get_config, log_errors
 
 if __name__ == "__main__":
     logger = logging.getLogger("lobaflex.opt." + __name__)
@@ -21,6 +26,38 @@ else:
     logger = logging.getLogger(__name__)
 
 
+def copy_edisgo_for_integration(edisgo_obj):
+    """Shallow copy of the edisgo object. Only the objects changed by
+    :func:`integrate_timeseries` are copied: the loads of the topology and
+    the containers of the time series, flexibility bands and heat pump time
+    series. The time series themselves are shared until they are replaced by
+    the selected timeframe. All other data is shared with the given object.
+
+    Parameters
+    ----------
+    edisgo_obj : :class:`edisgo.EDisGo`
+
+    Returns
+    -------
+    :class:`edisgo.EDisGo`
+    """
+    edisgo_copy = copy(edisgo_obj)
+
+    edisgo_copy.topology = copy(edisgo_obj.topology)
+    edisgo_copy.topology.loads_df = edisgo_obj.topology.loads_df.copy()
+
+    edisgo_copy.timeseries = copy(edisgo_obj.timeseries)
+
+    edisgo_copy.electromobility = copy(edisgo_obj.electromobility)
+    edisgo_copy.electromobility.flexibility_bands = dict(
+        edisgo_obj.electromobility.flexibility_bands
+    )
+
+    edisgo_copy.heat_pump = copy(edisgo_obj.heat_pump)
+
+    return edisgo_copy
+
+
 def integrate_timeseries(
     edisgo_obj,
     import_path,
@@ -52,7 +89,7 @@ def integrate_timeseries(
     :class:`edisgo.EDisGo`
         EDisGo object with integrated time series
     """
-    edisgo_obj = deepcopy(edisgo_obj)
+    edisgo_obj = copy_edisgo_for_integration(edisgo_obj)
 
     cfg_o = get_config(path=config_dir / ".opt.yaml")
 
@@ -62,21 +99,13 @@ def integrate_timeseries(
 
     # results_path = results_dir / run_id / str(grid_id) / "mvgd"
 
-    list_of_files = get_files_in_subdirs(import_path, pattern="*.csv")
-
-    filenames = [
-        file
-        for file in list_of_files
-        for parameter in parameters
-        if parameter in file
-    ]
-
-    filenames = [file for file in filenames if "slack_initial" not in file]
+    filenames = find_result_files(
+        import_path, kind="concat", parameters=parameters
+    ).file.tolist()
 
     logger.info(f"Import results of {' & '.join(parameters)}.")
-    df_loads_active_power = pd.concat(
-        map(partial(pd.read_csv, index_col=0, parse_dates=True), filenames),
-        axis=1,
+    df_loads_active_power = parse_time_index(
+        pd.concat(read_result_files(filenames), axis=1)
     )
 
     # mark all optimised loads
@@ -96,7 +125,9 @@ def integrate_timeseries(
         timeframe = df_loads_active_power.index
 
     logger.info("Reduce timeseries to selected timeframe.")
-    edisgo_obj = extract_timeframe(edisgo_obj=edisgo_obj, timeframe=timeframe)
+    edisgo_obj = extract_timeframe(
+        edisgo_obj=edisgo_obj, timeframe=timeframe, copy=True
+    )
 
     logger.info("Drop former timeseries of flexible loads.")
     edisgo_obj.timeseries.loads_active_power = (
@@ -171,12 +202,9 @@ def integrate_dispatch(
     else:
 
         logger.info(f"Import Grid from file: {obj_or_path}")
-        edisgo_obj = import_edisgo_from_files(
+        edisgo_obj = load_stage_edisgo(
             obj_or_path,
-            import_topology=True,
-            import_timeseries=True,
-            import_electromobility=True,
-            import_heat_pump=True,
+            "dispatch_integration",
         )
 
     export_path = import_path.parent / "mvgd"
@@ -199,7 +227,8 @@ def integrate_dispatch(
     )
 
     logger.info(f"Save integrated grid to {export_path}")
-    edisgo_obj.save(
+    save_edisgo(
+        edisgo_obj,
         export_path,
         save_topology=True,
         save_timeseries=True,
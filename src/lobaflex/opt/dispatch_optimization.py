@@ -1,126 +1,76 @@
 import logging
+import multiprocessing
 import os
-import re
 import shutil
 import warnings
 
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
 import edisgo.opf.lopf as lopf
-import networkx as nx
 import numpy as np
 import pandas as pd
+import scipy.sparse as sp
 
-from edisgo.edisgo import EDisGo, import_edisgo_from_files
-from edisgo.network.topology import Topology
+from edisgo.edisgo import EDisGo
 from edisgo.tools.tools import convert_impedances_to_mv
 
 from lobaflex import config_dir, data_dir, logs_dir, results_dir
+from lobaflex.opt.dnm_generation import (
+    downstream_nodes_matrix_to_frame,
+    get_cached_downstream_nodes_matrix,
+)
 from lobaflex.opt.feeder_extraction import get_flexible_loads
+from lobaflex.opt.result_concatination import (
+    concat_feeder_results,
+    export_concatenated_results,
+)
+from lobaflex.opt.solver import (
+    get_warm_start_values,
+    set_warm_start_values,
+    solver_context,
+)
+from lobaflex.tools.ledger import solver_timer
 from lobaflex.tools.logger import setup_logging
-from lobaflex.tools.tools import dump_yaml, get_config, log_errors, timeit
+from lobaflex.tools.manifest import remove_from_manifest
+from lobaflex.tools.result_store import get_result_sink
+from lobaflex.tools.snapshot import load_stage_edisgo
+from lobaflex.tools.tools import dump_yaml, get_config, log_errors
 
 if __name__ == "__main__":
     logger = logging.getLogger("lobaflex.opt." + __name__)
 else:
     logger = logging.getLogger(__name__)
 
+POTENTIAL_OBJECTIVES = [
+    "maximize_grid_power",
+    "minimize_grid_power",
+    "maximize_energy_level",
+    "minimize_energy_level",
+]
 
-@timeit
-def get_downstream_nodes_matrix_iterative(grid):
-    """
-    Method that returns matrix M with 0 and 1 entries describing the relation
-    of buses within the network. If bus b is descendant of a (assuming the
-    station is the root of the radial network) M[a,b] = 1, otherwise M[a,b] = 0.
-    The matrix is later used to determine the power flow at the different buses
-    by multiplying with the nodal power flow. S_sum = M * s, where s is the
-    nodal power vector.
-
-    Note: only works for radial networks.
-
-    Parameters
-    ----------
-    grid : either Topology, MVGrid or LVGrid
 
-    Returns
-    -------
-    downstream_node_matrix : pd.DataFrame
-
-    Todo: Check version with networkx successor
-    """
-
-    def recursive_downstream_node_matrix_filling(
-        current_bus,
-        current_feeder,
-        downstream_node_matrix,
-        grid,
-        visited_buses,
-    ):
-        current_feeder.append(current_bus)
-        for neighbor in tree.successors(current_bus):
-            if (
-                neighbor not in visited_buses
-                and neighbor not in current_feeder
-            ):
-                recursive_downstream_node_matrix_filling(
-                    neighbor,
-                    current_feeder,
-                    downstream_node_matrix,
-                    grid,
-                    visited_buses,
-                )
-        # current_bus = current_feeder.pop()
-        downstream_node_matrix.loc[current_feeder, current_bus] = 1
-        visited_buses.append(current_bus)
-        # if len(visited_buses) % 10 == 0:
-        #     logger.info(
-        #         "{} % of the buses have been checked".format(
-        #             len(visited_buses) / len(buses) * 100
-        #         )
-        #     )
-        current_feeder.pop()
-
-    buses = grid.buses_df.index.values
-    if isinstance(grid, Topology):
-        graph = grid.to_graph()
-        slack = grid.mv_grid.station.index[0]
-    else:
-        graph = grid.graph
-        slack = grid.transformers_df.bus1.iloc[0]
-    tree = nx.bfs_tree(graph, slack)
-
-    logger.info(f"Extract Downstream Note Matrix for {len(buses)} buses.")
-    downstream_node_matrix = pd.DataFrame(columns=buses, index=buses)
-    downstream_node_matrix.fillna(0, inplace=True)
-    visited_buses = []
-    current_feeder = []
-
-    recursive_downstream_node_matrix_filling(
-        slack, current_feeder, downstream_node_matrix, grid, visited_buses
-    )
-
-    return downstream_node_matrix
-
-
-def export_results(result_dict, export_path, timesteps, filename):
-    """Exports results to csv. Dropping all slack timesteps
+def export_results(result_dict, sink, timesteps, iteration):
+    """Exports results to the result sink. Dropping all slack timesteps
     with values < 1e-6. Dropping overlap timesteps.
 
     Parameters
     ----------
     result_dict : dict
-    export_path : PosixPath
+    sink : :class:`lobaflex.tools.result_store.ResultSink` or None
+        If None, results are not exported but returned only
     timesteps : pd.DatetimeIndex
-    filename : str
+    iteration : int
 
     Returns
     -------
+    exported_results : dict
+        Dictionary with result name as key and exported results as value
 
     """
 
-    iteration = re.findall(r"iteration_(\d+)", filename)[0]
-
+    exported_results = {}
     for res_name, res in result_dict.items():
 
         # dont export overlap
@@ -142,9 +92,55 @@ def export_results(result_dict, export_path, timesteps, filename):
         if res.empty:
             logger.info(f"No results for {res_name}.")
         else:
-            file_path = export_path / filename.replace("$res_name$", res_name)
-            res.astype(np.float16).to_csv(file_path)
-            logger.info(f"Saved results for {res_name}.")
+            res = res.astype(np.float32)
+            exported_results[res_name] = res
+            if sink is not None:
+                sink.write(res_name, iteration, res)
+                logger.info(f"Saved results for {res_name}.")
+
+    return exported_results
+
+
+def get_solver_options(solver_options=None):
+    """Solver options of the config updated by the given options.
+
+    Parameters
+    ----------
+    solver_options : dict or None
+        Options which overwrite the options of the config, e.g.
+        {"threads": 4}
+
+    Returns
+    -------
+    options : dict
+    """
+    cfg_o = get_config(path=config_dir / ".opt.yaml")
+    options = dict(cfg_o["options"] or {})
+    if solver_options is not None:
+        options.update(solver_options)
+    return options
+
+
+def get_worker_threads(workers, options=None):
+    """Solver threads per parallel worker so the machine is not
+    oversubscribed. The configured threads are an upper bound.
+
+    Parameters
+    ----------
+    workers : int
+        Number of parallel workers
+    options : dict or None
+        Solver options, see :func:`get_solver_options`
+
+    Returns
+    -------
+    threads : int
+    """
+    options = get_solver_options() if options is None else options
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    if options.get("threads"):
+        threads = min(threads, options["threads"])
+    return threads
 
 
 def update_start_values(result_dict, fixed_parameters):
@@ -212,7 +208,122 @@ def update_start_values(result_dict, fixed_parameters):
     return start_values
 
 
-def prepare_input_parameters(edisgo_obj, timeframe_only=False):
+def get_solver_files(export_path, grid_id, feeder_id, iteration):
+    """Paths of the lp file and the solver log of one iteration as defined by
+    the config.
+
+    Parameters
+    ----------
+    export_path : PosixPath
+    grid_id : int
+    feeder_id : str
+    iteration : int
+
+    Returns
+    -------
+    lp_filename : PosixPath or None
+    logfile : PosixPath or None
+    """
+    cfg_o = get_config(path=config_dir / ".opt.yaml")
+
+    # lpfile
+    if cfg_o["save_lp_files"]:
+        lp_filename = export_path / f"lp_file_iteration_{iteration}.lp"
+        logger.info(
+            f"LP files for iteration {iteration} are saved to:"
+            f" {lp_filename}"
+        )
+
+    else:
+        lp_filename = None
+
+    # logfile
+    if cfg_o["save_solver_logs"]:
+        date = datetime.now().date().isoformat()
+        logfile = (
+            logs_dir / f"gurobi_{date}_{grid_id}_{feeder_id}"
+            f"_iteration_{iteration}.log"
+        )
+        logger.info(
+            f"Solver logs for iteration {iteration} are saved to:"
+            f" {logfile}"
+        )
+    else:
+        logfile = None
+
+    return lp_filename, logfile
+
+
+def solve_iteration(model, iteration, lp_filename, logfile, options, solver):
+    """Solve the model of one iteration. If the optimization fails, it is
+    repeated once with tuned Gurobi parameters.
+
+    Parameters
+    ----------
+    model : :pyomo:`ConcreteModel`
+    iteration : int
+    lp_filename : PosixPath or None
+    logfile : PosixPath or None
+    options : dict
+        Solver options. Tuned parameters are updated in place and kept for
+        the following iterations.
+    solver : str
+        Name of the solver, see :func:`solver_context`
+
+    Returns
+    -------
+    result_dict : dict
+    """
+    cfg_o = get_config(path=config_dir / ".opt.yaml")
+
+    try:
+        with solver_timer():
+            result_dict = lopf.optimize(
+                model=model,
+                solver=solver,
+                tee=cfg_o["print_solver_logs"],
+                lp_filename=lp_filename,
+                logfile=logfile,
+                options=options,
+            )
+
+        if result_dict is None:
+            raise ValueError(f"Optimization failed for iteration {iteration}.")
+
+    except ValueError as e:
+        logger.warning(e)
+        logger.info("Tuning Gurobi parameters.")
+        options.update(
+            {
+                "OptimalityTol": 1e-5,
+                "FeasibilityTol": 1e-5,
+                "BarConvTol": 1e-5,
+                "NumericFocus": 3,
+                "BarHomogeneous": 1,
+            }
+        )
+
+        with solver_timer():
+            result_dict = lopf.optimize(
+                model=model,
+                solver=solver,
+                tee=cfg_o["print_solver_logs"],
+                lp_filename=lp_filename,
+                logfile=logfile,
+                options=options,
+            )
+        if result_dict is None:
+            raise ValueError(
+                f"Optimization failed for iteration {iteration} even "
+                "after Gurobi parameter tuning."
+            )
+
+    return result_dict
+
+
+def prepare_input_parameters(
+    edisgo_obj, timeframe_only=False, dnm_cache_dir=None, dnm_base_files=None
+):
     """Prepare input parameters for the LOPF.
 
     Parameters
@@ -223,6 +334,12 @@ def prepare_input_parameters(edisgo_obj, timeframe_only=False):
         If True, the optimization is performed for the in the config defined
         time frame only. If False, the optimization is performed for the whole
         time series of the edisgo object (default=False).
+    dnm_cache_dir : PosixPath or None
+        Directory of the downstream nodes matrix cache. If None, the matrix
+        is computed without cache (default=None).
+    dnm_base_files : list of PosixPath or None
+        Cached downstream nodes matrices of previous topologies which are
+        patched on a cache miss (default=None).
 
     Returns
     -------
@@ -231,9 +348,14 @@ def prepare_input_parameters(edisgo_obj, timeframe_only=False):
 
     cfg_o = get_config(path=config_dir / ".opt.yaml")
 
-    logger.info("Compute downstream nodes matrix")
-    downstream_nodes_matrix = get_downstream_nodes_matrix_iterative(
-        edisgo_obj.topology
+    logger.info("Get downstream nodes matrix")
+    downstream_nodes_matrix, buses = get_cached_downstream_nodes_matrix(
+        edisgo_obj.topology,
+        cache_dir=dnm_cache_dir,
+        base_files=dnm_base_files,
+    )
+    downstream_nodes_matrix = downstream_nodes_matrix_to_frame(
+        downstream_nodes_matrix, buses
     )
 
     logger.info("Get flexible loads")
@@ -301,6 +423,10 @@ def long_term_optimization(
     objective,
     timeframe_only=False,
     export_path=None,
+    dnm_cache_dir=None,
+    dnm_base_files=None,
+    solver_options=None,
+    collect_results=False,
 ):
     """Rolling horizon optimization for flexibilities like EVs and heat pumps.
 
@@ -319,17 +445,33 @@ def long_term_optimization(
         time frame only. If False, the optimization is performed for the whole
         time series of the edisgo object (default=False).
     export_path :
+    dnm_cache_dir : PosixPath or None
+        Directory of the downstream nodes matrix cache (default=None).
+    dnm_base_files : list of PosixPath or None
+        Cached downstream nodes matrices of previous topologies which are
+        patched on a cache miss (default=None).
+    solver_options : dict or None
+        Solver options which update the options of the config, e.g.
+        {"threads": 4} (default=None).
+    collect_results : bool
+        If True, the exported results of all iterations are collected and
+        returned (default=False).
 
     Returns
     -------
+    collected_results : dict or None
+        If collect_results is True, dictionary with result name as key and
+        results of all iterations as value.
 
     """
 
     cfg_o = get_config(path=config_dir / ".opt.yaml")
     feeder_id = f"{int(feeder_id):02}"
+    options = get_solver_options(solver_options)
 
     if export_path is not None:
         shutil.rmtree(export_path, ignore_errors=True)
+        remove_from_manifest(export_path)
         os.makedirs(export_path, exist_ok=True)
         # Dump opt configs to results
         dump_yaml(yaml_file=cfg_o, save_to=export_path)
@@ -344,134 +486,90 @@ def long_term_optimization(
         flexible_loads,
         total_timesteps,
         timeframe,
-    ) = prepare_input_parameters(edisgo_obj, timeframe_only)
+    ) = prepare_input_parameters(
+        edisgo_obj,
+        timeframe_only,
+        dnm_cache_dir=dnm_cache_dir,
+        dnm_base_files=dnm_base_files,
+    )
 
     equal_splits = len(timeframe) / (
         cfg_o["timesteps_per_iteration"] * cfg_o["iterations_per_era"]
     )
     windows = np.split(timeframe.sort_values(), equal_splits)
+    collected_results = {}
 
-    for iteration, window in enumerate(windows):
+    with get_result_sink(
+        export_path, grid_id, feeder_id
+    ) as sink, solver_context(
+        cfg_o["solver"], persistent=cfg_o["persistent_solver"]
+    ) as solver:
+        for iteration, window in enumerate(windows):
 
-        window.freq = pd.infer_freq(window)
-        logger.info(
-            f"Timeframe of iteration {iteration}: {window[0]} -> "
-            f"{window[-1]} including {len(window)} timesteps."
-        )
-        if iteration == 0:
-            logger.info("Set up model.")
-            model = lopf.setup_model(
-                fixed_parameters=fixed_parameters,
-                timesteps=window,
-                objective=objective,
-                flexible_loads=flexible_loads,
-                energy_level_ends={"ev": True, "tes": True},
-                # **start_values, # TODO not needed anymore @Anya?
-                load_factor_rings=0.5 if cfg_o["n-1"] else None  # TODO N-1
-                # DEACTIVATED!
-                # **kwargs,
-            )
-        else:
-
-            logger.info(f"Update model for iteration {iteration}.")
-            model = lopf.update_model(
-                model=model,
-                timesteps=window,
-                fixed_parameters=fixed_parameters,
-                objective=objective,
-                # flexible_loads=flexible_loads,
-                energy_level_starts={"ev": 0.5, "tes": 0.5},
-                energy_level_ends={"ev": True, "tes": True},
-                # **start_values,
-                # **kwargs,
-            )
-
-        # lpfile
-        if cfg_o["save_lp_files"]:
-            lp_filename = export_path / f"lp_file_iteration_{iteration}.lp"
+            window.freq = pd.infer_freq(window)
             logger.info(
-                f"LP files for iteration {iteration} are saved to:"
-                f" {lp_filename}"
+                f"Timeframe of iteration {iteration}: {window[0]} -> "
+                f"{window[-1]} including {len(window)} timesteps."
             )
+            if iteration == 0:
+                logger.info("Set up model.")
+                model = lopf.setup_model(
+                    fixed_parameters=fixed_parameters,
+                    timesteps=window,
+                    objective=objective,
+                    flexible_loads=flexible_loads,
+                    energy_level_ends={"ev": True, "tes": True},
+                    # **start_values, # TODO not needed anymore @Anya?
+                    # TODO N-1 DEACTIVATED!
+                    load_factor_rings=0.5 if cfg_o["n-1"] else None,
+                    # **kwargs,
+                )
+            else:
+
+                logger.info(f"Update model for iteration {iteration}.")
+                model = lopf.update_model(
+                    model=model,
+                    timesteps=window,
+                    fixed_parameters=fixed_parameters,
+                    objective=objective,
+                    # flexible_loads=flexible_loads,
+                    energy_level_starts={"ev": 0.5, "tes": 0.5},
+                    energy_level_ends={"ev": True, "tes": True},
+                    # **start_values,
+                    # **kwargs,
+                )
 
-        else:
-            lp_filename = None
-
-        # logfile
-        if cfg_o["save_solver_logs"]:
-            date = datetime.now().date().isoformat()
-            logfile = (
-                logs_dir / f"gurobi_{date}_{grid_id}_{feeder_id}"
-                f"_iteration_{iteration}.log"
+            lp_filename, logfile = get_solver_files(
+                export_path, grid_id, feeder_id, iteration
             )
-            logger.info(
-                f"Solver logs for iteration {iteration} are saved to:"
-                f" {logfile}"
+            result_dict = solve_iteration(
+                model, iteration, lp_filename, logfile, options, solver
             )
-        else:
-            logfile = None
 
-        try:
-            result_dict = lopf.optimize(
-                model=model,
-                solver=cfg_o["solver"],
-                tee=cfg_o["print_solver_logs"],
-                lp_filename=lp_filename,
-                logfile=logfile,
-                options=cfg_o["options"],
-            )
+            logger.info(f"Finished optimisation for iteration {iteration}.")
 
-            if result_dict is None:
-                raise ValueError(
-                    f"Optimization failed for iteration {iteration}."
+            try:
+                exported_results = export_results(
+                    result_dict=result_dict,
+                    sink=sink,
+                    timesteps=window,
+                    iteration=iteration,
                 )
-
-        except ValueError as e:
-            logger.warning(e)
-            logger.info("Tuning Gurobi parameters.")
-            options = cfg_o["options"]
-            options.update(
-                {
-                    "OptimalityTol": 1e-5,
-                    "FeasibilityTol": 1e-5,
-                    "BarConvTol": 1e-5,
-                    "NumericFocus": 3,
-                    "BarHomogeneous": 1,
-                }
-            )
-
-            result_dict = lopf.optimize(
-                model=model,
-                solver=cfg_o["solver"],
-                tee=cfg_o["print_solver_logs"],
-                lp_filename=lp_filename,
-                logfile=logfile,
-                options=options,
-            )
-            if result_dict is None:
-                raise ValueError(
-                    f"Optimization failed for iteration {iteration} even "
-                    "after Gurobi parameter tuning."
+            except Exception:
+                logger.warning(
+                    "Optimization Error. Result's couldn't be exported."
                 )
+                raise ValueError("Results not valid")
 
-        logger.info(f"Finished optimisation for iteration {iteration}.")
+            if collect_results:
+                for res_name, res in exported_results.items():
+                    collected_results.setdefault(res_name, []).append(res)
 
-        # if export_path is not None:
-        filename = (
-            f"$res_name$_{grid_id}-{feeder_id}_iteration_{iteration}.csv"
-        )
-        try:
-            export_results(
-                result_dict=result_dict,
-                export_path=export_path,
-                timesteps=window,
-                filename=filename,
-            )
-        except Exception:
-            logger.warning(
-                "Optimization Error. Result's couldn't be exported."
-            )
-            raise ValueError("Results not valid")
+    if collect_results:
+        return {
+            res_name: pd.concat(res, axis=0)
+            for res_name, res in collected_results.items()
+        }
 
 
 def rolling_horizon_optimization(
@@ -481,6 +579,11 @@ def rolling_horizon_optimization(
     objective,
     timeframe_only=False,
     export_path=None,
+    dnm_cache_dir=None,
+    dnm_base_files=None,
+    solver_options=None,
+    collect_results=False,
+    era_workers=None,
 ):
     """Rolling horizon optimization for flexibilities like EVs and heat pumps.
 
@@ -499,17 +602,40 @@ def rolling_horizon_optimization(
         time frame only. If False, the optimization is performed for the whole
         time series of the edisgo object (default=False).
     export_path :
+    dnm_cache_dir : PosixPath or None
+        Directory of the downstream nodes matrix cache (default=None).
+    dnm_base_files : list of PosixPath or None
+        Cached downstream nodes matrices of previous topologies which are
+        patched on a cache miss (default=None).
+    solver_options : dict or None
+        Solver options which update the options of the config, e.g.
+        {"threads": 4} (default=None).
+    collect_results : bool
+        If True, the exported results of all iterations are collected and
+        returned (default=False).
+    era_workers : int or None
+        Number of parallel processes, each optimizing a separate model per
+        era. If None, the config value `era_workers` is used. With 0 or 1 all
+        iterations are optimized consecutively on one model (default=None).
+        Eras can only be optimized in parallel if `iterations_per_era`
+        equals `timesteps_per_iteration`, see
+        :func:`optimize_rolling_horizon_iterations`.
 
     Returns
     -------
+    collected_results : dict or None
+        If collect_results is True, dictionary with result name as key and
+        results of all iterations as value.
 
     """
 
     cfg_o = get_config(path=config_dir / ".opt.yaml")
     feeder_id = f"{int(feeder_id):02}"
+    options = get_solver_options(solver_options)
 
     if export_path is not None:
         shutil.rmtree(export_path, ignore_errors=True)
+        remove_from_manifest(export_path)
         os.makedirs(export_path, exist_ok=True)
         # Dump opt configs to results
         dump_yaml(yaml_file=cfg_o, save_to=export_path)
@@ -524,7 +650,12 @@ def rolling_horizon_optimization(
         flexible_loads,
         total_timesteps,
         timeframe,
-    ) = prepare_input_parameters(edisgo_obj, timeframe_only)
+    ) = prepare_input_parameters(
+        edisgo_obj,
+        timeframe_only,
+        dnm_cache_dir=dnm_cache_dir,
+        dnm_base_files=dnm_base_files,
+    )
 
     # Define rolling horizon parameters
     timesteps_per_iteration = cfg_o["timesteps_per_iteration"]
@@ -535,172 +666,284 @@ def rolling_horizon_optimization(
     )
 
     # ####################### Rolling Horizon ############################
-    # define result_dict for first iteration
-    # will be overwritten afterwards
-    result_dict = {}
-
-    for iteration in range(0, int(len(timeframe) / timesteps_per_iteration)):
+    n_iterations = int(len(timeframe) / timesteps_per_iteration)
+    eras = [
+        range(start, min(start + iterations_per_era, n_iterations))
+        for start in range(0, n_iterations, iterations_per_era)
+    ]
+
+    era_workers = cfg_o["era_workers"] if era_workers is None else era_workers
+    era_workers = min(era_workers or 1, len(eras))
+
+    kwargs = {
+        "fixed_parameters": fixed_parameters,
+        "flexible_loads": flexible_loads,
+        "timeframe": timeframe,
+        "grid_id": grid_id,
+        "feeder_id": feeder_id,
+        "objective": objective,
+        "export_path": export_path,
+        "collect_results": collect_results,
+    }
+    if era_workers > 1:
+        # eras are only independent if every era starts with reset start
+        # values as in the consecutive optimization
+        if iterations_per_era != timesteps_per_iteration:
+            raise ValueError(
+                "Eras can only be optimized in parallel if iterations_per_era "
+                f"({iterations_per_era}) equals timesteps_per_iteration "
+                f"({timesteps_per_iteration})."
+            )
+        threads = get_worker_threads(era_workers, options)
+        options.update({"threads": threads})
+        logger.info(
+            f"Optimize {len(eras)} eras with {era_workers} workers and "
+            f"{threads} solver threads each."
+        )
+        # the dense downstream nodes matrix is quadratic in the number of
+        # buses, workers get it sparse and convert it themselves
+        dnm = fixed_parameters.get("downstream_nodes_matrix")
+        if isinstance(dnm, pd.DataFrame):
+            kwargs["fixed_parameters"] = {
+                key: value
+                for key, value in fixed_parameters.items()
+                if key != "downstream_nodes_matrix"
+            }
+            kwargs["downstream_nodes_matrix"] = (
+                sp.csr_matrix(dnm.values),
+                dnm.index,
+            )
+        with ProcessPoolExecutor(
+            max_workers=era_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as executor:
+            futures = [
+                executor.submit(
+                    optimize_rolling_horizon_iterations,
+                    iterations=era,
+                    options=options,
+                    **kwargs,
+                )
+                for era in eras
+            ]
+            era_results = [future.result() for future in futures]
+    else:
+        era_results = [
+            optimize_rolling_horizon_iterations(
+                iterations=range(n_iterations), options=options, **kwargs
+            )
+        ]
 
-        logger.info(f"Starting optimisation for iteration {iteration}.")
+    if collect_results:
+        res_names = dict.fromkeys(
+            res_name for results in era_results for res_name in results
+        )
+        return {
+            res_name: pd.concat(
+                [
+                    res
+                    for results in era_results
+                    for res in results.get(res_name, [])
+                ],
+                axis=0,
+            )
+            for res_name in res_names
+        }
 
-        # Defines windows of iteration with timesteps
-        # if last iteration of era, no overlap is added but energy_level
-        # at the end needs to be reached
-        if iteration % iterations_per_era == iterations_per_era - 1:
-            timesteps = timeframe[
-                iteration
-                * timesteps_per_iteration : (iteration + 1)
-                * timesteps_per_iteration
-            ]
-            # Fixes end energy level to specific percentage (50%)
-            energy_level_end = True
-            logger.info("End of era")
 
-        # in all other iterations overlap is added to the timeframe
-        else:
-            timesteps = timeframe[
-                iteration
-                * timesteps_per_iteration : (iteration + 1)
-                * timesteps_per_iteration
-                + cfg_o["overlap_iterations"]
-            ]
-            energy_level_end = None
-
-        if iteration % timesteps_per_iteration == 0:
-
-            # define start_values for first iteration of era
-            # will get updated afterwards
-            start_values = {
-                "energy_level_starts": {
-                    "ev": None,
-                    "tes": None,
-                },
-                "charging_starts": {
-                    "ev": None,
-                    "tes": None,
-                    "hp": None,
-                },
-            }
+def optimize_rolling_horizon_iterations(
+    fixed_parameters,
+    flexible_loads,
+    timeframe,
+    iterations,
+    grid_id,
+    feeder_id,
+    objective,
+    export_path,
+    options,
+    collect_results=False,
+    downstream_nodes_matrix=None,
+):
+    """Rolling horizon optimization of consecutive iterations. The model is
+    set up for the first iteration and updated for all following iterations.
+    Start values are reset every `timesteps_per_iteration` iterations, the
+    iterations in between start from the results of the previous iteration.
 
-        else:
-            logger.info("Update start values for next iteration.")
-            start_values = update_start_values(result_dict, fixed_parameters)
+    Parameters
+    ----------
+    fixed_parameters : dict
+        Time-invariant parameters, see :func:`prepare_input_parameters`
+    flexible_loads : dict
+    timeframe : pd.DatetimeIndex
+        Whole timeframe of the optimization
+    iterations : range
+        Iterations to be optimized, e.g. all iterations of one era
+    grid_id : int
+        Grid id of the MVGD
+    feeder_id : str
+        Feeder id of the feeder of the MVGD, e.g. '01'
+    objective : str
+        Objective function to be optimized
+    export_path : PosixPath or None
+    options : dict
+        Solver options
+    collect_results : bool
+        If True, the exported results of all iterations are collected and
+        returned (default=False).
+    downstream_nodes_matrix : tuple or None
+        Sparse downstream nodes matrix and its buses which is added to
+        `fixed_parameters` as DataFrame, see
+        :func:`lobaflex.opt.dnm_generation.downstream_nodes_matrix_to_frame`
+        (default=None).
 
-        if iteration == 0:
+    Returns
+    -------
+    collected_results : dict
+        Dictionary with result name as key and list of results per iteration
+        as value. Empty if collect_results is False.
 
-            logger.info(f"Set up model for first iteration {iteration}.")
-            model = lopf.setup_model(
-                fixed_parameters=fixed_parameters,
-                timesteps=timesteps,
-                objective=objective,
-                flexible_loads=flexible_loads,
-                # charging_starts={"ev": 0, "hp": 0, "tes": 0},
-                **start_values,
-                load_factor_rings=0.5 if cfg_o["n-1"] else None  # TODO N-1
-                # DEACTIVATED!
-                # **kwargs,
-            )
-        else:
+    """
+    cfg_o = get_config(path=config_dir / ".opt.yaml")
+    timesteps_per_iteration = cfg_o["timesteps_per_iteration"]
+    iterations_per_era = cfg_o["iterations_per_era"]
 
-            logger.info(f"Update model for iteration {iteration}.")
-            model = lopf.update_model(
-                model=model,
-                timesteps=timesteps,
-                fixed_parameters=fixed_parameters,
-                objective=objective,
-                energy_level_end_tes=energy_level_end,
-                energy_level_end_ev=energy_level_end,
-                flexible_loads=flexible_loads,
-                **start_values,
-                # **kwargs,
-            )
+    if downstream_nodes_matrix is not None:
+        fixed_parameters = {
+            **fixed_parameters,
+            "downstream_nodes_matrix": downstream_nodes_matrix_to_frame(
+                *downstream_nodes_matrix
+            ),
+        }
 
-        # lpfile
-        if cfg_o["save_lp_files"]:
-            lp_filename = export_path / f"lp_file_iteration_{iteration}.lp"
-            logger.info(
-                f"LP files for iteration {iteration} are saved to:"
-                f" {lp_filename}"
-            )
+    # define result_dict for first iteration
+    # will be overwritten afterwards
+    result_dict = {}
+    collected_results = {}
+    warm_start_values = {}
+    model = None
+
+    with get_result_sink(
+        export_path, grid_id, feeder_id
+    ) as sink, solver_context(
+        cfg_o["solver"],
+        persistent=cfg_o["persistent_solver"],
+        warm_start=cfg_o["warm_start"],
+    ) as solver:
+        for iteration in iterations:
+
+            logger.info(f"Starting optimisation for iteration {iteration}.")
+
+            # Defines windows of iteration with timesteps
+            # if last iteration of era, no overlap is added but energy_level
+            # at the end needs to be reached
+            if iteration % iterations_per_era == iterations_per_era - 1:
+                timesteps = timeframe[
+                    iteration
+                    * timesteps_per_iteration : (iteration + 1)
+                    * timesteps_per_iteration
+                ]
+                # Fixes end energy level to specific percentage (50%)
+                energy_level_end = True
+                logger.info("End of era")
+
+            # in all other iterations overlap is added to the timeframe
+            else:
+                timesteps = timeframe[
+                    iteration
+                    * timesteps_per_iteration : (iteration + 1)
+                    * timesteps_per_iteration
+                    + cfg_o["overlap_iterations"]
+                ]
+                energy_level_end = None
+
+            if iteration % timesteps_per_iteration == 0:
+
+                # define start_values for first iteration of era
+                # will get updated afterwards
+                start_values = {
+                    "energy_level_starts": {
+                        "ev": None,
+                        "tes": None,
+                    },
+                    "charging_starts": {
+                        "ev": None,
+                        "tes": None,
+                        "hp": None,
+                    },
+                }
 
-        else:
-            lp_filename = None
-
-        # logfile
-        if cfg_o["save_solver_logs"]:
-            date = datetime.now().date().isoformat()
-            logfile = (
-                logs_dir / f"gurobi_{date}_{grid_id}_{feeder_id}"
-                f"_iteration_{iteration}.log"
-            )
-            logger.info(
-                f"Solver logs for iteration {iteration} are saved to:"
-                f" {logfile}"
-            )
-        else:
-            logfile = None
+            else:
+                logger.info("Update start values for next iteration.")
+                start_values = update_start_values(
+                    result_dict, fixed_parameters
+                )
 
-        try:
-            result_dict = lopf.optimize(
-                model=model,
-                solver=cfg_o["solver"],
-                tee=cfg_o["print_solver_logs"],
-                lp_filename=lp_filename,
-                logfile=logfile,
-                options=cfg_o["options"],
-            )
+            if model is None:
+
+                logger.info(f"Set up model for first iteration {iteration}.")
+                model = lopf.setup_model(
+                    fixed_parameters=fixed_parameters,
+                    timesteps=timesteps,
+                    objective=objective,
+                    flexible_loads=flexible_loads,
+                    # charging_starts={"ev": 0, "hp": 0, "tes": 0},
+                    energy_level_end_tes=energy_level_end,
+                    energy_level_end_ev=energy_level_end,
+                    **start_values,
+                    # TODO N-1 DEACTIVATED!
+                    load_factor_rings=0.5 if cfg_o["n-1"] else None,
+                    # **kwargs,
+                )
+            else:
+
+                logger.info(f"Update model for iteration {iteration}.")
+                model = lopf.update_model(
+                    model=model,
+                    timesteps=timesteps,
+                    fixed_parameters=fixed_parameters,
+                    objective=objective,
+                    energy_level_end_tes=energy_level_end,
+                    energy_level_end_ev=energy_level_end,
+                    flexible_loads=flexible_loads,
+                    **start_values,
+                    # **kwargs,
+                )
 
-            if result_dict is None:
-                raise ValueError(
-                    f"Optimization failed for iteration {iteration}."
+            if warm_start_values:
+                # start from previous solution shifted to the new window
+                set_warm_start_values(
+                    model, warm_start_values, shift=timesteps_per_iteration
                 )
 
-        except ValueError as e:
-            logger.warning(e)
-            logger.info("Tuning Gurobi parameters.")
-            options = cfg_o["options"]
-            options.update(
-                {
-                    "OptimalityTol": 1e-5,
-                    "FeasibilityTol": 1e-5,
-                    "BarConvTol": 1e-5,
-                    "NumericFocus": 3,
-                    "BarHomogeneous": 1,
-                }
+            lp_filename, logfile = get_solver_files(
+                export_path, grid_id, feeder_id, iteration
             )
-
-            result_dict = lopf.optimize(
-                model=model,
-                solver=cfg_o["solver"],
-                tee=cfg_o["print_solver_logs"],
-                lp_filename=lp_filename,
-                logfile=logfile,
-                options=options,
+            result_dict = solve_iteration(
+                model, iteration, lp_filename, logfile, options, solver
             )
-            if result_dict is None:
-                raise ValueError(
-                    f"Optimization failed for iteration {iteration} even "
-                    "after Gurobi parameter tuning."
+            if cfg_o["warm_start"]:
+                warm_start_values = get_warm_start_values(model)
+
+            logger.info(f"Finished optimisation for iteration {iteration}.")
+
+            try:
+                exported_results = export_results(
+                    result_dict=result_dict,
+                    sink=sink,
+                    timesteps=timesteps[:timesteps_per_iteration],
+                    iteration=iteration,
+                )
+            except Exception:
+                logger.warning(
+                    "Optimization Error. Result's couldn't be exported."
                 )
+                raise ValueError("Results not valid")
 
-        logger.info(f"Finished optimisation for iteration {iteration}.")
+            if collect_results:
+                for res_name, res in exported_results.items():
+                    collected_results.setdefault(res_name, []).append(res)
 
-        # if export_path is not None:
-        filename = (
-            f"$res_name$_{grid_id}-{feeder_id}_iteration_{iteration}.csv"
-        )
-        try:
-            export_results(
-                result_dict=result_dict,
-                export_path=export_path,
-                timesteps=timesteps[:timesteps_per_iteration],
-                filename=filename,
-            )
-        except Exception:
-            logger.warning(
-                "Optimization Error. Result's couldn't be exported."
-            )
-            raise ValueError("Results not valid")
+    return collected_results
 
 
 @log_errors
@@ -713,6 +956,8 @@ def run_dispatch_optimization(
     meta=None,
     run_id=None,
     version_db=None,
+    solver_options=None,
+    return_results=False,
 ):
     """
 
@@ -735,11 +980,18 @@ def run_dispatch_optimization(
         run id used for pydoit versioning
     version_db : dict or None
         Dictionary with version information for pydoit versioning
+    solver_options : dict or None
+        Solver options which update the options of the config, e.g.
+        {"threads": 4} (default=None).
+    return_results : bool
+        If True, the results of all iterations are returned instead of the
+        version information (default=False).
 
     Returns
     -------
-    If run_id and version are not None, a dictionary with these values is
-    given for the pydoit versioning.
+    If return_results is True, a dictionary with result name as key and
+    results of all iterations as value. Else if run_id and version are not
+    None, a dictionary with these values is given for the pydoit versioning.
     """
     # Log to pipeline log file
     logger.info(f"Run dispatch optimization of {grid_id}/{feeder_id}")
@@ -763,23 +1015,17 @@ def run_dispatch_optimization(
     if isinstance(obj_or_path, EDisGo):
         edisgo_obj = obj_or_path
         export_path = results_dir / run_id / objective
+        dnm_cache_dir = None
+        dnm_base_files = None
     else:
 
         logger.info(f"Import Grid from file: {obj_or_path}")
 
-        edisgo_obj = import_edisgo_from_files(
+        edisgo_obj = load_stage_edisgo(
             obj_or_path,
-            import_topology=True,
-            import_timeseries=True,
-            import_heat_pump=True,
-            import_electromobility=True,
+            "dispatch_optimization",
         )
-        if objective in [
-            "maximize_grid_power",
-            "minimize_grid_power",
-            "maximize_energy_level",
-            "minimize_energy_level",
-        ]:
+        if objective in POTENTIAL_OBJECTIVES:
 
             rolling_horizon = rolling_horizon["pot"]
 
@@ -805,6 +1051,19 @@ def run_dispatch_optimization(
         )
         os.makedirs(export_path, exist_ok=True)
 
+        # topology is shared by all objectives optimized on this dump
+        dnm_cache_dir = obj_or_path if cfg_o["cache_dnm"] else None
+
+        # matrices of feeders of previous stages, e.g. before reinforcement
+        mvgd_path = results_dir / run_id / str(grid_id)
+        dnm_base_files = [
+            file
+            for pattern in ["*/feeder/*", "scenarios/*/feeder/*"]
+            for file in mvgd_path.glob(
+                f"{pattern}/downstream_nodes_matrix_*.npz"
+            )
+        ]
+
     logger.info("Run Powerflow for first timestep")
     try:
         edisgo_obj.analyze(timesteps=edisgo_obj.timeseries.timeindex[0])
@@ -814,27 +1073,145 @@ def run_dispatch_optimization(
 
     if rolling_horizon:
         logger.info("Run rolling horizon optimization.")
-        rolling_horizon_optimization(
+        results = rolling_horizon_optimization(
             edisgo_obj,
             grid_id,
             feeder_id,
             objective=objective,
             timeframe_only=False,
             export_path=export_path,
+            dnm_cache_dir=dnm_cache_dir,
+            dnm_base_files=dnm_base_files,
+            solver_options=solver_options,
+            collect_results=return_results,
         )
     else:
         logger.info("Run long-term optimization.")
-        long_term_optimization(
+        results = long_term_optimization(
             edisgo_obj,
             grid_id,
             feeder_id,
             objective=objective,
             timeframe_only=False,
             export_path=export_path,
+            dnm_cache_dir=dnm_cache_dir,
+            dnm_base_files=dnm_base_files,
+            solver_options=solver_options,
+            collect_results=return_results,
         )
 
+    if return_results:
+        return results
+
+    if version_db is not None:
+        return version_db["db"]
+
+
+@log_errors
+def run_dispatch_optimization_parallel(
+    grid_id,
+    feeders,
+    objective,
+    directory,
+    rolling_horizon=False,
+    workers=None,
+    run_id=None,
+    version_db=None,
+):
+    """Dispatch optimization of all feeders of one MVGD in parallel processes.
+
+    The solver threads of each process are limited to the cpu count divided
+    by the number of workers. The results of all feeders are collected in
+    memory and saved concatenated, therefore no result concatenation is
+    needed afterwards.
+
+    Parameters
+    ----------
+    grid_id : int
+        grid id of MVGD
+    feeders : list of int or str
+        feeder ids, respective folder names of feeders
+    objective : str
+        objective function to be used for optimization
+    directory : PosixPath
+        directory of the feeder dumps relative to the MVGD results, e.g.
+        Path("reference") / "feeder"
+    rolling_horizon : {"pot": False, "load":False}
+        If True, rolling horizon optimization is performed else long-term
+        optimization (default = False).
+    workers : int or None
+        Number of parallel processes. If None, the config value
+        `feeder_workers` is used (default = None).
+    run_id : str or None
+        run id used for pydoit versioning
+    version_db : dict or None
+        Dictionary with version information for pydoit versioning
+
+    Returns
+    -------
+    If run_id and version are not None, a dictionary with these values is
+    given for the pydoit versioning. Else a dictionary with (grid, parameter)
+    as key and concatenated results as value.
+    """
+    # Log to pipeline log file
+    logger.info(f"Run parallel dispatch optimization of {grid_id}")
+
+    cfg_o = get_config(path=config_dir / ".opt.yaml")
+    feeders = [f"{int(feeder):02}" for feeder in sorted(feeders)]
+
+    workers = workers or cfg_o["feeder_workers"] or os.cpu_count() or 1
+    workers = max(1, min(workers, len(feeders)))
+
+    # don't oversubscribe the machine with solver threads
+    threads = get_worker_threads(workers)
+    logger.info(
+        f"Optimize {len(feeders)} feeders with {workers} workers and "
+        f"{threads} solver threads each."
+    )
+
+    import_path = results_dir / run_id / str(grid_id) / directory
+
+    # spawn avoids forking the solver and logging threads of the parent
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        futures = {
+            feeder: executor.submit(
+                run_dispatch_optimization,
+                obj_or_path=import_path / feeder,
+                grid_id=grid_id,
+                feeder_id=feeder,
+                objective=objective,
+                rolling_horizon=rolling_horizon,
+                meta=directory.parent.name,
+                run_id=run_id,
+                solver_options={"threads": threads},
+                return_results=True,
+            )
+            for feeder in feeders
+        }
+        feeder_results = {
+            feeder: future.result() for feeder, future in futures.items()
+        }
+
+    logger.info("Concatenate results of all feeders.")
+    results = concat_feeder_results(
+        feeder_results, grid_id=grid_id, fillna={"value": 0}
+    )
+
+    # same directory as the result concatenation task
+    if objective in POTENTIAL_OBJECTIVES:
+        concat_dir = Path("potential") / directory.parent.name
+    else:
+        concat_dir = ""
+    export_path = (
+        results_dir / run_id / str(grid_id) / concat_dir / objective / "concat"
+    )
+    export_concatenated_results(results, export_path)
+
     if version_db is not None:
         return version_db["db"]
+    return results
 
 
 if __name__ == "__main__":
@@ -1,4 +1,5 @@
 """"""
+import hashlib
 import logging
 import os
 import warnings
@@ -7,13 +8,15 @@ from datetime import datetime
 from pathlib import Path
 
 import networkx as nx
+import numpy as np
 import pandas as pd
+import scipy.sparse as sp
 
-from edisgo.edisgo import import_edisgo_from_files
 from edisgo.network.topology import Topology
 
 from lobaflex import config_dir, logs_dir
 from lobaflex.tools.logger import setup_logging
+from lobaflex.tools.snapshot import load_stage_edisgo
 from lobaflex.tools.tools import get_config, timeit  # , write_metadata
 
 if __name__ == "__main__":
@@ -22,6 +25,262 @@ else:
     logger = logging.getLogger(__name__)
 
 
+def _get_slack(grid):
+    """Returns the bus the tree of the grid is rooted at."""
+    if isinstance(grid, Topology):
+        return grid.mv_grid.station.index[0]
+    return grid.transformers_df.bus1.iloc[0]
+
+
+def _get_graph_and_slack(grid):
+    """Returns the graph of the grid and the bus the tree is rooted at.
+
+    Parameters
+    ----------
+    grid : either Topology, MVGrid or LVGrid
+
+    Returns
+    -------
+    graph : networkx.Graph
+    slack : str
+    """
+    if isinstance(grid, Topology):
+        graph = grid.to_graph()
+    else:
+        graph = grid.graph
+    return graph, _get_slack(grid)
+
+
+def get_subtree_intervals(grid):
+    """
+    Numbers the buses of the grid in depth-first pre-order starting at the
+    station (Euler tour). All descendants of a bus then form one contiguous
+    interval of this order: bus b is descendant of a if
+    entry[a] <= entry[b] < exit[a].
+
+    The traversal uses an explicit stack and a set of visited buses, so it
+    is linear in the number of buses and independent of the recursion limit
+    on long feeders.
+
+    Note: only works for radial networks.
+
+    Parameters
+    ----------
+    grid : either Topology, MVGrid or LVGrid
+
+    Returns
+    -------
+    buses : pd.Index
+        Buses of the grid, positions refer to this order
+    order : np.ndarray
+        Bus positions in depth-first pre-order
+    entry : np.ndarray
+        Index of each bus in `order`, -1 for buses not connected to the
+        station
+    exit : np.ndarray
+        End (exclusive) of the subtree interval of each bus in `order`, -1
+        for buses not connected to the station
+    parents : np.ndarray
+        Position of the parent of each bus, -1 for the station and buses
+        not connected to the station
+    """
+    buses = grid.buses_df.index
+    graph, slack = _get_graph_and_slack(grid)
+    position = dict(zip(buses, range(len(buses))))
+
+    entry = np.full(len(buses), -1)
+    exit = np.full(len(buses), -1)
+    parents = np.full(len(buses), -1)
+    order = [position[slack]]
+    entry[position[slack]] = 0
+    visited = {slack}
+    stack = [(slack, iter(graph[slack]))]
+    while stack:
+        bus, neighbors = stack[-1]
+        for neighbor in neighbors:
+            if neighbor not in visited:
+                visited.add(neighbor)
+                entry[position[neighbor]] = len(order)
+                parents[position[neighbor]] = position[bus]
+                order.append(position[neighbor])
+                stack.append((neighbor, iter(graph[neighbor])))
+                break
+        else:
+            stack.pop()
+            exit[position[bus]] = len(order)
+
+    return buses, np.array(order), entry, exit, parents
+
+
+def _get_downstream_nodes_matrix(grid):
+    """Returns the sparse downstream nodes matrix, the buses and the
+    position of each bus' parent, see
+    :func:`get_downstream_nodes_matrix_sparse`."""
+    buses, order, entry, exit, parents = get_subtree_intervals(grid)
+
+    logger.info(f"Extract Downstream Node Matrix for {len(buses)} buses.")
+
+    # number of descendants (incl. the bus itself) is the row length
+    sizes = exit - entry
+    indptr = np.append(0, np.cumsum(sizes))
+    # position in `order` of every non-zero entry: row start + offset
+    offsets = np.repeat(entry - indptr[:-1], sizes)
+    indices = order[offsets + np.arange(indptr[-1])]
+
+    downstream_nodes_matrix = sp.csr_matrix(
+        (np.ones(len(indices), dtype=np.int8), indices, indptr),
+        shape=(len(buses), len(buses)),
+    )
+    downstream_nodes_matrix.sort_indices()
+    return downstream_nodes_matrix, buses, parents
+
+
+@timeit
+def get_downstream_nodes_matrix_sparse(grid):
+    """
+    Method that returns the downstream nodes matrix M as sparse matrix. If bus
+    b is descendant of a (assuming the station is the root of the radial
+    network) or a == b, M[a,b] = 1, otherwise M[a,b] = 0. Row and column
+    order is given by the bus order of `grid.buses_df`.
+
+    The descendants of each bus are taken as contiguous slice of the
+    depth-first order from :func:`get_subtree_intervals`, so the matrix is
+    filled in one vectorized step, linear in its number of non-zero entries.
+
+    Note: only works for radial networks.
+
+    Parameters
+    ----------
+    grid : either Topology, MVGrid or LVGrid
+
+    Returns
+    -------
+    downstream_nodes_matrix : scipy.sparse.csr_matrix
+    buses : pd.Index
+        Buses in order of rows and columns of the matrix
+    """
+    downstream_nodes_matrix, buses, _ = _get_downstream_nodes_matrix(grid)
+    return downstream_nodes_matrix, buses
+
+
+def _get_parent_names(buses, parents):
+    """Maps parent positions to bus names, '' for buses without parent."""
+    return np.where(parents >= 0, np.asarray(buses)[parents], "").astype(str)
+
+
+@timeit
+def update_downstream_nodes_matrix(
+    grid, downstream_nodes_matrix, buses, parents
+):
+    """Patches the downstream nodes matrix of a previous topology to the
+    topology of `grid` instead of rebuilding it.
+
+    Buses which were added, removed or got a new parent are identified by
+    comparing the parent of each bus. Only the columns of the buses in the
+    subtrees of these buses have new ancestors and are recomputed. All
+    other columns are taken from the previous matrix with the rows mapped to
+    the new bus order. This is the usual case after reinforcement, where
+    mostly line parameters change and feeders are only occasionally split.
+
+    Parameters
+    ----------
+    grid : either Topology, MVGrid or LVGrid
+        Grid with the new topology
+    downstream_nodes_matrix : scipy.sparse.spmatrix
+        Downstream nodes matrix of the previous topology
+    buses : pd.Index
+        Buses of the previous topology in order of the matrix
+    parents : np.ndarray of str
+        Name of the parent of each bus of the previous topology, '' for the
+        station and unconnected buses
+
+    Returns
+    -------
+    downstream_nodes_matrix : scipy.sparse.csr_matrix
+    buses : pd.Index
+    parents : np.ndarray of str
+    """
+    new_buses, order, entry, exit, new_parents = get_subtree_intervals(grid)
+    new_parent_names = _get_parent_names(new_buses, new_parents)
+
+    old_parents = pd.Series(parents, index=buses)
+    old_parents = old_parents.reindex(new_buses).fillna("-").values
+    changed = np.flatnonzero(old_parents != new_parent_names)
+
+    # mark the subtree intervals of all changed buses in depth-first order
+    connected = changed[entry[changed] >= 0]
+    marker = np.zeros(len(order) + 1, dtype=int)
+    np.add.at(marker, entry[connected], 1)
+    np.add.at(marker, exit[connected], -1)
+    affected = np.zeros(len(new_buses), dtype=bool)
+    affected[order[np.cumsum(marker[:-1]) > 0]] = True
+    affected[changed] = True
+
+    logger.info(
+        f"Update downstream nodes matrix: {affected.sum()} of "
+        f"{len(new_buses)} buses affected by topology changes."
+    )
+
+    # unaffected columns: ancestors unchanged, only map to new positions
+    old_position = pd.Series(np.arange(len(buses)), index=buses)
+    new_position = pd.Series(np.arange(len(new_buses)), index=new_buses)
+    old_to_new = new_position.reindex(buses).fillna(-1).astype(int).values
+    kept = np.flatnonzero(~affected)
+    kept_columns = sp.csc_matrix(downstream_nodes_matrix)[
+        :, old_position.loc[new_buses[kept]].values
+    ]
+    rows = [old_to_new[kept_columns.indices]]
+    cols = [np.repeat(kept, np.diff(kept_columns.indptr))]
+
+    # affected columns: walk up the new tree level by level
+    descendants = np.flatnonzero(affected & (entry >= 0))
+    ancestors = descendants
+    while len(ancestors):
+        rows.append(ancestors)
+        cols.append(descendants)
+        ancestors = new_parents[ancestors]
+        mask = ancestors >= 0
+        ancestors, descendants = ancestors[mask], descendants[mask]
+
+    rows = np.concatenate(rows)
+    cols = np.concatenate(cols)
+    new_downstream_nodes_matrix = sp.csr_matrix(
+        (np.ones(len(rows), dtype=np.int8), (rows, cols)),
+        shape=(len(new_buses), len(new_buses)),
+    )
+    new_downstream_nodes_matrix.sort_indices()
+    return new_downstream_nodes_matrix, new_buses, new_parent_names
+
+
+def downstream_nodes_matrix_to_frame(
+    downstream_nodes_matrix, buses, sparse=False
+):
+    """Converts the sparse downstream nodes matrix to the DataFrame with
+    buses as index and columns which is expected by
+    :func:`edisgo.opf.lopf.prepare_time_invariant_parameters`.
+
+    Parameters
+    ----------
+    downstream_nodes_matrix : scipy.sparse.spmatrix
+    buses : pd.Index
+        Buses in order of rows and columns of the matrix
+    sparse : bool
+        If True, a DataFrame with sparse columns is returned, else a dense
+        int8 DataFrame (default=False).
+
+    Returns
+    -------
+    pd.DataFrame
+    """
+    if sparse:
+        return pd.DataFrame.sparse.from_spmatrix(
+            downstream_nodes_matrix, index=buses, columns=buses
+        )
+    return pd.DataFrame(
+        downstream_nodes_matrix.toarray(), index=buses, columns=buses
+    )
+
+
 def get_downstream_nodes_matrix_iterative(grid):
     """
     Method that returns matrix M with 0 and 1 entries describing the relation
@@ -31,66 +290,215 @@ def get_downstream_nodes_matrix_iterative(grid):
     by multiplying with the nodal power flow. S_sum = M * s, where s is the
     nodal power vector.
 
+    The matrix is built sparse by
+    :func:`get_downstream_nodes_matrix_sparse` and only converted to a
+    DataFrame at the end.
+
     Note: only works for radial networks.
 
-    :param grid: either Topology, MVGrid or LVGrid
-    :return:
-    Todo: Check version with networkx successor
+    Parameters
+    ----------
+    grid : either Topology, MVGrid or LVGrid
+
+    Returns
+    -------
+    downstream_node_matrix : pd.DataFrame
     """
+    downstream_nodes_matrix, buses = get_downstream_nodes_matrix_sparse(grid)
+    return downstream_nodes_matrix_to_frame(downstream_nodes_matrix, buses)
 
-    def recursive_downstream_node_matrix_filling(
-        current_bus,
-        current_feeder,
-        downstream_node_matrix,
-        grid,
-        visited_buses,
-    ):
-        current_feeder.append(current_bus)
-        for neighbor in tree.successors(current_bus):
-            if (
-                neighbor not in visited_buses
-                and neighbor not in current_feeder
-            ):
-                recursive_downstream_node_matrix_filling(
-                    neighbor,
-                    current_feeder,
-                    downstream_node_matrix,
-                    grid,
-                    visited_buses,
-                )
-        # current_bus = current_feeder.pop()
-        downstream_node_matrix.loc[current_feeder, current_bus] = 1
-        visited_buses.append(current_bus)
-        # if len(visited_buses) % 10 == 0:
-        #     logger.info(
-        #         "{} % of the buses have been checked".format(
-        #             len(visited_buses) / len(buses) * 100
-        #         )
-        #     )
-        current_feeder.pop()
-
-    buses = grid.buses_df.index.values
-    if str(type(grid)) == str(Topology):
-        graph = grid.to_graph()
-        slack = grid.mv_grid.station.index[0]
-    else:
-        graph = grid.graph
-        slack = grid.transformers_df.bus1.iloc[0]
-    tree = nx.bfs_tree(graph, slack)
 
-    logger.info("Matrix for {} buses is extracted.".format(len(buses)))
-    downstream_node_matrix = pd.DataFrame(columns=buses, index=buses)
-    downstream_node_matrix.fillna(0, inplace=True)
+def get_topology_fingerprint(grid):
+    """Hash of everything the downstream nodes matrix depends on: the bus
+    order of `buses_df`, the connected buses of `lines_df` and
+    `transformers_df` and the slack bus. Line parameters and line names are
+    not part of the hash, therefore e.g. reinforced line types keep the
+    fingerprint.
+
+    Parameters
+    ----------
+    grid : either Topology, MVGrid or LVGrid
+
+    Returns
+    -------
+    str
+        Hex digest of the topology
+    """
+    hasher = hashlib.sha256()
+    hasher.update(str(_get_slack(grid)).encode())
+    hasher.update(
+        pd.util.hash_pandas_object(
+            grid.buses_df.index.to_series(), index=False
+        ).values.tobytes()
+    )
+    for df in [grid.lines_df, grid.transformers_df]:
+        edges = df[["bus0", "bus1"]].sort_values(by=["bus0", "bus1"])
+        hasher.update(
+            pd.util.hash_pandas_object(edges, index=False).values.tobytes()
+        )
+    return hasher.hexdigest()
+
+
+def save_downstream_nodes_matrix(
+    path, downstream_nodes_matrix, buses, parents, fingerprint
+):
+    """Saves the sparse downstream nodes matrix to a npz file. As all entries
+    are 1, only the structure of the csr matrix is stored. The file is
+    written to a temporary file first and then moved, so parallel tasks never
+    read a partially written matrix.
+
+    Parameters
+    ----------
+    path : PosixPath
+    downstream_nodes_matrix : scipy.sparse.csr_matrix
+    buses : pd.Index
+    parents : np.ndarray of str
+        Name of the parent of each bus, '' if there is none. Needed for
+        :func:`update_downstream_nodes_matrix`.
+    fingerprint : str
+        Topology fingerprint, see :func:`get_topology_fingerprint`
+    """
+    tmp_path = path.parent / f".{path.name}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as file:
+        np.savez(
+            file,
+            indptr=downstream_nodes_matrix.indptr,
+            indices=downstream_nodes_matrix.indices,
+            buses=np.array(buses, dtype=str),
+            parents=np.asarray(parents, dtype=str),
+            fingerprint=np.array(fingerprint),
+        )
+    os.replace(tmp_path, path)
+
 
-    logger.info("Starting iteration.")
-    visited_buses = []
-    current_feeder = []
+def load_downstream_nodes_matrix(path):
+    """Loads a downstream nodes matrix saved by
+    :func:`save_downstream_nodes_matrix`.
 
-    recursive_downstream_node_matrix_filling(
-        slack, current_feeder, downstream_node_matrix, grid, visited_buses
+    Parameters
+    ----------
+    path : PosixPath
+
+    Returns
+    -------
+    downstream_nodes_matrix : scipy.sparse.csr_matrix
+    buses : pd.Index
+    parents : np.ndarray of str or None
+        None for files saved without parents
+    fingerprint : str
+    """
+    with np.load(path) as npz:
+        indptr = npz["indptr"]
+        indices = npz["indices"]
+        buses = pd.Index(npz["buses"], dtype=object)
+        parents = npz["parents"] if "parents" in npz.files else None
+        fingerprint = str(npz["fingerprint"])
+    downstream_nodes_matrix = sp.csr_matrix(
+        (np.ones(len(indices), dtype=np.int8), indices, indptr),
+        shape=(len(buses), len(buses)),
     )
+    return downstream_nodes_matrix, buses, parents, fingerprint
+
+
+def _find_base_matrix(grid, candidates, min_overlap=0.5):
+    """Returns the cache file out of `candidates` whose buses overlap most
+    with the buses of `grid` or None if no overlap reaches `min_overlap`."""
+    buses = grid.buses_df.index
+    best_file, best_overlap = None, min_overlap
+    for candidate in candidates:
+        try:
+            with np.load(candidate) as npz:
+                if "parents" not in npz.files:
+                    continue
+                candidate_buses = npz["buses"]
+        except (OSError, ValueError):
+            continue
+        overlap = buses.isin(candidate_buses).sum() / max(len(buses), 1)
+        if overlap >= best_overlap:
+            best_file, best_overlap = candidate, overlap
+    return best_file
+
+
+def get_cached_downstream_nodes_matrix(grid, cache_dir=None, base_files=None):
+    """Returns the sparse downstream nodes matrix of the grid from the cache
+    in `cache_dir`. The cache file is keyed by the topology fingerprint, if
+    it doesn't exist the matrix is computed and saved. Cache files of other
+    topologies in `cache_dir` are stale and removed.
+
+    On a cache miss, the stale files and `base_files` are searched for the
+    matrix of a similar topology, e.g. the same feeder before reinforcement.
+    If one is found, it is patched by :func:`update_downstream_nodes_matrix`
+    instead of computing the matrix from scratch.
 
-    return downstream_node_matrix
+    Parameters
+    ----------
+    grid : either Topology, MVGrid or LVGrid
+    cache_dir : PosixPath or None
+        Directory of the cache, usually the directory of the grid dump. If
+        None, the matrix is computed without cache.
+    base_files : list of PosixPath or None
+        Cache files of previous topologies to patch on a cache miss.
+
+    Returns
+    -------
+    downstream_nodes_matrix : scipy.sparse.csr_matrix
+    buses : pd.Index
+    """
+    if cache_dir is None:
+        return get_downstream_nodes_matrix_sparse(grid)
+
+    cache_dir = Path(cache_dir)
+    fingerprint = get_topology_fingerprint(grid)
+    cache_file = cache_dir / f"downstream_nodes_matrix_{fingerprint[:16]}.npz"
+
+    if cache_file.is_file():
+        logger.info(f"Load downstream nodes matrix from {cache_file}.")
+        (
+            downstream_nodes_matrix,
+            buses,
+            _,
+            cached,
+        ) = load_downstream_nodes_matrix(cache_file)
+        if cached == fingerprint:
+            return downstream_nodes_matrix, buses
+        logger.warning(f"Fingerprint mismatch of {cache_file}.")
+
+    stale_files = [
+        stale_file
+        for stale_file in cache_dir.glob("downstream_nodes_matrix_*.npz")
+        if stale_file != cache_file
+    ]
+    base_file = _find_base_matrix(
+        grid, stale_files + [Path(i) for i in base_files or []]
+    )
+
+    if base_file is not None:
+        logger.info(f"Update downstream nodes matrix of {base_file}.")
+        (
+            downstream_nodes_matrix,
+            buses,
+            parents,
+        ) = update_downstream_nodes_matrix(
+            grid, *load_downstream_nodes_matrix(base_file)[:3]
+        )
+    else:
+        (
+            downstream_nodes_matrix,
+            buses,
+            parents,
+        ) = _get_downstream_nodes_matrix(grid)
+        parents = _get_parent_names(buses, parents)
+
+    for stale_file in stale_files:
+        logger.info(f"Remove stale downstream nodes matrix {stale_file}.")
+        stale_file.unlink(missing_ok=True)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    save_downstream_nodes_matrix(
+        cache_file, downstream_nodes_matrix, buses, parents, fingerprint
+    )
+    logger.info(f"Saved downstream nodes matrix to {cache_file}.")
+    return downstream_nodes_matrix, buses
 
 
 @timeit
@@ -137,12 +545,9 @@ def run_dnm_generation(
 
         logger.info(f"Feeder {grid_dir.name} of grid: {grid_id}")
 
-        edisgo_obj = import_edisgo_from_files(
+        edisgo_obj = load_stage_edisgo(
             grid_dir,
-            import_topology=True,
-            import_electromobility=True,
-            import_heat_pump=True,
-            import_timeseries=True,
+            "dnm_generation",
             # TODO ass results?!
         )
 
@@ -5,12 +5,13 @@ import warnings
 from copy import deepcopy
 from datetime import datetime
 
-from edisgo.edisgo import EDisGo, import_edisgo_from_files
+from edisgo.edisgo import EDisGo
 from edisgo.flex_opt.reinforce_grid import enhanced_reinforce_wrapper
 
 from lobaflex import logs_dir, results_dir
 from lobaflex.opt.grid_reinforcement import iterative_reinforce
 from lobaflex.tools.logger import setup_logging
+from lobaflex.tools.snapshot import load_stage_edisgo, save_edisgo
 from lobaflex.tools.tools import log_errors
 
 if __name__ == "__main__":
@@ -65,12 +66,9 @@ def run_expansion_scenario(
     else:
         logger.info(f"Import Grid from file: {obj_or_path}")
 
-        edisgo_obj = import_edisgo_from_files(
+        edisgo_obj = load_stage_edisgo(
             obj_or_path,
-            import_topology=True,
-            import_timeseries=True,
-            import_electromobility=True,
-            import_heat_pump=True,
+            "expansion_scenario",
             import_results=True,
         )
 
@@ -123,7 +121,8 @@ def run_expansion_scenario(
     edisgo_obj.timeseries = ts_orig
 
     logger.info(f"Save reinforced grid to {export_path}")
-    edisgo_obj.save(
+    save_edisgo(
+        edisgo_obj,
         export_path,
         save_topology=True,
         save_timeseries=True,
@@ -7,11 +7,12 @@ import warnings
 
 from datetime import datetime
 
-from edisgo.edisgo import EDisGo, import_edisgo_from_files
+from edisgo.edisgo import EDisGo
 from edisgo.tools.complexity_reduction import extract_feeders_nx
 
 from lobaflex import config_dir, logs_dir, results_dir
 from lobaflex.tools.logger import setup_logging
+from lobaflex.tools.snapshot import load_stage_edisgo
 from lobaflex.tools.tools import get_config, timeit, write_metadata
 
 if __name__ == "__main__":
@@ -171,12 +172,9 @@ def run_feeder_extraction(
     else:
         logger.info(f"Import Grid from file: {obj_or_path}")
 
-        edisgo_obj = import_edisgo_from_files(
-            edisgo_path=obj_or_path,
-            import_topology=True,
-            import_timeseries=True,
-            import_electromobility=True,
-            import_heat_pump=True,
+        edisgo_obj = load_stage_edisgo(
+            obj_or_path,
+            "feeder_extraction",
         )
 
     logger.info(f"Extract feeders of {grid_id}.")
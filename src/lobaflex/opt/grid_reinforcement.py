@@ -9,11 +9,12 @@ from datetime import datetime
 import numpy as np
 import pandas as pd
 
-from edisgo.edisgo import EDisGo, import_edisgo_from_files
+from edisgo.edisgo import EDisGo
 from edisgo.flex_opt.reinforce_grid import enhanced_reinforce_wrapper
 
 from lobaflex import config_dir, logs_dir, results_dir
 from lobaflex.tools.logger import setup_logging
+from lobaflex.tools.snapshot import load_stage_edisgo, save_edisgo
 from lobaflex.tools.tools import get_config, log_errors
 
 if __name__ == "__main__":
@@ -214,12 +215,9 @@ def reinforce_grid(
     else:
         logger.info(f"Import Grid from file: {obj_or_path}")
 
-        edisgo_obj = import_edisgo_from_files(
+        edisgo_obj = load_stage_edisgo(
             obj_or_path,
-            import_topology=True,
-            import_timeseries=True,
-            import_electromobility=True,
-            import_heat_pump=True,
+            "grid_reinforcement",
         )
 
         # n-1 criterion deactivated
@@ -240,7 +238,8 @@ def reinforce_grid(
     edisgo_obj = enhanced_reinforce_wrapper(edisgo_obj)
 
     logger.info(f"Save reinforced grid to {export_path}")
-    edisgo_obj.save(
+    save_edisgo(
+        edisgo_obj,
         export_path,
         save_topology=True,
         save_timeseries=True,
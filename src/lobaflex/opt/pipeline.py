@@ -14,19 +14,22 @@ from lobaflex.opt.tasks import (  # dnm_generation_task,
     dot_file_task,
     expansion_scenario_task,
     feeder_extraction_task,
+    feeder_optimization_tasks,
     grid_reinforcement_task,
-    optimization_task,
     papermill_task,
     png_file_task,
-    result_concatenation_task,
     timeframe_selection_task,
     trust_ipynb,
 )
+from lobaflex.opt.work_queue import collect_jobs, publish_tasks
+from lobaflex.tools.ledger import LedgerReporterMixin
 from lobaflex.tools.logger import setup_logging
 from lobaflex.tools.pydoit import opt_uptodate  # noqa: F401
 from lobaflex.tools.pydoit import task__get_opt_version  # noqa: F401
 from lobaflex.tools.pydoit import task__get_version  # noqa: F401
+from lobaflex.tools.pydoit import task__ledger_summary  # noqa: F401
 from lobaflex.tools.pydoit import task__set_opt_version  # noqa: F401
+from lobaflex.tools.scheduling import longest_first
 from lobaflex.tools.tools import (
     TelegramReporter,
     get_config,
@@ -53,6 +56,14 @@ setup_logging(file_name=logfile)
 #         - https://stackoverflow.com/a/42421497 for create after
 #         - need to hack task generation to adjust tasknames
 
+
+class LedgerReporter(LedgerReporterMixin, TelegramReporter):
+    """:class:`TelegramReporter` writing the runtime and memory of every task
+    to the :class:`lobaflex.tools.ledger.RuntimeLedger`"""
+
+    desc = "telegram, csv, console and ledger output"
+
+
 DOIT_CONFIG = {
     "default_tasks": [
         "init",
@@ -68,8 +79,29 @@ DOIT_CONFIG = {
         "min_pot_2",
         # "trust_ipynb",
     ],
-    "reporter": TelegramReporter,
+    "reporter": LedgerReporter,
 }
+
+# parameters of the work queue tasks
+WORK_QUEUE_PARAMS = [
+    {
+        "name": "stage",
+        "short": "s",
+        "long": "stage",
+        "type": str,
+        "default": "min_exp",
+        "help": "Task group, e.g. min_exp or min_pot",
+    },
+    {
+        "name": "queue",
+        "short": "q",
+        "long": "queue",
+        "type": str,
+        "default": "",
+        "help": "Directory of the work queue, default is <run_id>/queue",
+    },
+]
+
 # DOIT_CONFIG = {
 #     "default_tasks": ["_set_opt_version"],
 #     "reporter": TelegramReporter,
@@ -84,6 +116,50 @@ DOIT_CONFIG = {
 # }
 
 
+def task__publish():
+    """Publishes the optimization and concatenation tasks of a task group,
+    e.g. 'min_pot', which aren't uptodate to the work queue of the run. Workers on any node execute
+    them with 'python -m lobaflex.opt.work_queue <queue>'."""
+
+    def publish(stage, queue):
+        _, run_id = init_versioning()
+        queue = queue or results_dir / run_id / "queue"
+        tasks = list(globals()[f"task_{stage}"]())
+        publish_tasks(
+            queue, stage, tasks, dep_manager=doit.Globals.dep_manager
+        )
+        print(f"Work queue: {queue}")
+
+    return {
+        "actions": [(publish,)],
+        "params": WORK_QUEUE_PARAMS,
+        "verbosity": 2,
+    }
+
+
+def task__collect():
+    """Saves the results of the jobs of a task group done by the workers to
+    the doit DB, so the tasks are uptodate in following runs."""
+
+    def collect(stage, queue):
+        _, run_id = init_versioning()
+        queue = queue or results_dir / run_id / "queue"
+        tasks = list(globals()[f"task_{stage}"]())
+        status = collect_jobs(
+            queue, stage, tasks, dep_manager=doit.Globals.dep_manager
+        )
+        print(
+            f"{status['collected']} jobs collected, {status['failed']} "
+            f"failed."
+        )
+
+    return {
+        "actions": [(collect,)],
+        "params": WORK_QUEUE_PARAMS,
+        "verbosity": 2,
+    }
+
+
 def task__do_graph():
     path = results_dir / "graph"
     yield dot_file_task(path)
@@ -174,6 +250,7 @@ def task_ref_exp():
 
 
 @create_after(executed="ref_exp")
+@longest_first
 def task_ref_pot():
     """Generator for reference load balancing potential tasks"""
 
@@ -208,34 +285,21 @@ def task_ref_pot():
             ]
             for objective in objectives:
 
-                dependencies = []
-                for feeder in sorted(feeder_ids):
-
-                    yield optimization_task(
-                        mvgd=mvgd,
-                        feeder=feeder,
-                        objective=objective,
-                        rolling_horizon=rolling_horizon,
-                        directory=directory,
-                        run_id=run_id,
-                        version_db=version_db,
-                        dep=[f"ref_exp:reference_feeder_{mvgd}"],
-                    )
-
-                    dependencies += [
-                        f"ref_pot:{objective}_{mvgd}" f"/{int(feeder):02}"
-                    ]
-
-                yield result_concatenation_task(
+                yield from feeder_optimization_tasks(
+                    basename="ref_pot",
                     mvgd=mvgd,
+                    feeders=feeder_ids,
                     objective=objective,
-                    directory=Path("potential") / "reference",
+                    rolling_horizon=rolling_horizon,
+                    directory=directory,
+                    concat_directory=Path("potential") / "reference",
                     run_id=run_id,
                     version_db=version_db,
-                    dep=dependencies,
+                    dep=[f"ref_exp:reference_feeder_{mvgd}"],
                 )
 
 @create_after(executed="ref_exp")
+@longest_first
 def task_ref_pot_2():
     """Generator for reference load balancing potential tasks"""
 
@@ -270,35 +334,22 @@ def task_ref_pot_2():
             ]
             for objective in objectives:
 
-                dependencies = []
-                for feeder in sorted(feeder_ids):
-
-                    yield optimization_task(
-                        mvgd=mvgd,
-                        feeder=feeder,
-                        objective=objective,
-                        rolling_horizon=rolling_horizon,
-                        directory=directory,
-                        run_id=run_id,
-                        version_db=version_db,
-                        dep=[f"ref_exp:reference_feeder_{mvgd}"],
-                    )
-
-                    dependencies += [
-                        f"ref_pot_2:{objective}_{mvgd}" f"/{int(feeder):02}"
-                    ]
-
-                yield result_concatenation_task(
+                yield from feeder_optimization_tasks(
+                    basename="ref_pot_2",
                     mvgd=mvgd,
+                    feeders=feeder_ids,
                     objective=objective,
-                    directory=Path("potential") / "reference",
+                    rolling_horizon=rolling_horizon,
+                    directory=directory,
+                    concat_directory=Path("potential") / "reference",
                     run_id=run_id,
                     version_db=version_db,
-                    dep=dependencies,
+                    dep=[f"ref_exp:reference_feeder_{mvgd}"],
                 )
 
 
 @create_after(executed="init")
+@longest_first
 def task_min_exp():
     """Generator for minimal grid expansion tasks
 
@@ -329,32 +380,17 @@ def task_min_exp():
                 if os.path.isdir(feeder_path / f)
             ]
 
-            dependencies = []
-            for feeder in sorted(feeder_ids):
-
-                yield optimization_task(
-                    mvgd=mvgd,
-                    feeder=feeder,
-                    objective=objective,
-                    rolling_horizon=rolling_horizon,
-                    directory=directory,
-                    run_id=run_id,
-                    version_db=version_db,
-                    dep=[f"init:initial_feeder_{mvgd}"],
-                )
-
-                # generate dependency list for concatenation task
-                dependencies += [
-                    f"min_exp:{objective}_{mvgd}/{int(feeder):02}"
-                ]
-
-            yield result_concatenation_task(
+            yield from feeder_optimization_tasks(
+                basename="min_exp",
                 mvgd=mvgd,
+                feeders=feeder_ids,
                 objective=objective,
-                directory=Path(""),
+                rolling_horizon=rolling_horizon,
+                directory=directory,
+                concat_directory=Path(""),
                 run_id=run_id,
                 version_db=version_db,
-                dep=dependencies,
+                dep=[f"init:initial_feeder_{mvgd}"],
             )
 
             yield dispatch_integration_task(
@@ -384,6 +420,7 @@ def task_min_exp():
 
 
 @create_after(executed="min_exp")
+@longest_first
 def task_min_pot():
     """Generator for minimal load balancing potential tasks"""
 
@@ -418,34 +455,21 @@ def task_min_pot():
             ]
             for objective in objectives:
 
-                dependencies = []
-                for feeder in sorted(feeder_ids):
-
-                    yield optimization_task(
-                        mvgd=mvgd,
-                        feeder=feeder,
-                        objective=objective,
-                        rolling_horizon=rolling_horizon,
-                        directory=directory,
-                        run_id=run_id,
-                        version_db=version_db,
-                        dep=[f"init:initial_feeder_{mvgd}"],
-                    )
-
-                    dependencies += [
-                        f"min_pot:{objective}_{mvgd}" f"/{int(feeder):02}"
-                    ]
-
-                yield result_concatenation_task(
+                yield from feeder_optimization_tasks(
+                    basename="min_pot",
                     mvgd=mvgd,
+                    feeders=feeder_ids,
                     objective=objective,
-                    directory=Path("potential") / "minimize_loading",
+                    rolling_horizon=rolling_horizon,
+                    directory=directory,
+                    concat_directory=Path("potential") / "minimize_loading",
                     run_id=run_id,
                     version_db=version_db,
-                    dep=dependencies,
+                    dep=[f"init:initial_feeder_{mvgd}"],
                 )
 
 @create_after(executed="min_exp")
+@longest_first
 def task_min_pot_2():
     """Generator for minimal load balancing potential tasks"""
 
@@ -480,31 +504,17 @@ def task_min_pot_2():
             ]
             for objective in objectives:
 
-                dependencies = []
-                for feeder in sorted(feeder_ids):
-
-                    yield optimization_task(
-                        mvgd=mvgd,
-                        feeder=feeder,
-                        objective=objective,
-                        rolling_horizon=rolling_horizon,
-                        directory=directory,
-                        run_id=run_id,
-                        version_db=version_db,
-                        dep=[f"init:initial_feeder_{mvgd}"],
-                    )
-
-                    dependencies += [
-                        f"min_pot_2:{objective}_{mvgd}" f"/{int(feeder):02}"
-                    ]
-
-                yield result_concatenation_task(
+                yield from feeder_optimization_tasks(
+                    basename="min_pot_2",
                     mvgd=mvgd,
+                    feeders=feeder_ids,
                     objective=objective,
-                    directory=Path("potential") / "minimize_loading",
+                    rolling_horizon=rolling_horizon,
+                    directory=directory,
+                    concat_directory=Path("potential") / "minimize_loading",
                     run_id=run_id,
                     version_db=version_db,
-                    dep=dependencies,
+                    dep=[f"init:initial_feeder_{mvgd}"],
                 )
 
 
@@ -575,6 +585,7 @@ def task_scn_exp():
 
 
 @create_after(executed="scn_exp")
+@longest_first
 def task_scn_pot():
     """Generator for expansion scenarios load balancing potential tasks"""
 
@@ -600,7 +611,8 @@ def task_scn_pot():
             scenarios = sorted([i for i in os.listdir(scenario_path)])
             for scenario in scenarios:
 
-                feeder_path = scenario_path / scenario / "feeder"
+                directory = Path("scenarios") / scenario / "feeder"
+                feeder_path = mvgd_path / directory
                 os.makedirs(feeder_path, exist_ok=True)
                 feeder_ids = [
                     f
@@ -609,35 +621,21 @@ def task_scn_pot():
                 ]
                 for objective in objectives:
 
-                    dependencies = []
-                    for feeder in sorted(feeder_ids):
-
-                        yield optimization_task(
-                            mvgd=mvgd,
-                            feeder=feeder,
-                            objective=objective,
-                            rolling_horizon=rolling_horizon,
-                            directory=Path("scenarios") / scenario / "feeder",
-                            run_id=run_id,
-                            version_db=version_db,
-                            dep=[f"scn_exp:{scenario}_feeder_{mvgd}"],
-                        )
-
-                        dependencies += [
-                            f"scn_pot:{scenario}_{objective}"
-                            f"_{mvgd}/{int(feeder):02}"
-                        ]
-
-                    yield result_concatenation_task(
+                    yield from feeder_optimization_tasks(
+                        basename="scn_pot",
                         mvgd=mvgd,
+                        feeders=feeder_ids,
                         objective=objective,
-                        directory=Path("potential") / scenario,
+                        rolling_horizon=rolling_horizon,
+                        directory=directory,
+                        concat_directory=Path("potential") / scenario,
                         run_id=run_id,
                         version_db=version_db,
-                        dep=dependencies,
+                        dep=[f"scn_exp:{scenario}_feeder_{mvgd}"],
                     )
 
 @create_after(executed="scn_exp")
+@longest_first
 def task_scn_pot_2():
     """Generator for expansion scenarios load balancing potential tasks"""
 
@@ -663,7 +661,8 @@ def task_scn_pot_2():
             scenarios = sorted([i for i in os.listdir(scenario_path)])
             for scenario in scenarios:
 
-                feeder_path = scenario_path / scenario / "feeder"
+                directory = Path("scenarios") / scenario / "feeder"
+                feeder_path = mvgd_path / directory
                 os.makedirs(feeder_path, exist_ok=True)
                 feeder_ids = [
                     f
@@ -672,32 +671,17 @@ def task_scn_pot_2():
                 ]
                 for objective in objectives:
 
-                    dependencies = []
-                    for feeder in sorted(feeder_ids):
-
-                        yield optimization_task(
-                            mvgd=mvgd,
-                            feeder=feeder,
-                            objective=objective,
-                            rolling_horizon=rolling_horizon,
-                            directory=Path("scenarios") / scenario / "feeder",
-                            run_id=run_id,
-                            version_db=version_db,
-                            dep=[f"scn_exp:{scenario}_feeder_{mvgd}"],
-                        )
-
-                        dependencies += [
-                            f"scn_pot_2:{scenario}_{objective}"
-                            f"_{mvgd}/{int(feeder):02}"
-                        ]
-
-                    yield result_concatenation_task(
+                    yield from feeder_optimization_tasks(
+                        basename="scn_pot_2",
                         mvgd=mvgd,
+                        feeders=feeder_ids,
                         objective=objective,
-                        directory=Path("potential") / scenario,
+                        rolling_horizon=rolling_horizon,
+                        directory=directory,
+                        concat_directory=Path("potential") / scenario,
                         run_id=run_id,
                         version_db=version_db,
-                        dep=dependencies,
+                        dep=[f"scn_exp:{scenario}_feeder_{mvgd}"],
                     )
 
 
@@ -1,7 +1,6 @@
-import functools
 import os
-import re
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
@@ -9,7 +8,15 @@ import pandas as pd
 
 from lobaflex import config_dir, logs_dir, results_dir
 from lobaflex.tools.logger import logging, setup_logging
-from lobaflex.tools.tools import get_config, get_files_in_subdirs, log_errors
+from lobaflex.tools.manifest import get_manifest
+from lobaflex.tools.result_store import (
+    find_result_files,
+    get_reader_options,
+    parse_time_index,
+    read_result_files,
+    write_result_file,
+)
+from lobaflex.tools.tools import get_config, log_errors
 
 if __name__ == "__main__":
     logger = logging.getLogger("lobaflex.opt." + __name__)
@@ -17,6 +24,119 @@ else:
     logger = logging.getLogger(__name__)
 
 
+def get_result_file_mapping(path, parameters=None):
+    """
+    List all result files of the dispatch optimization once, see
+    :func:`lobaflex.tools.result_store.find_result_files`, e.g.
+    `charging_ev_1111-01_iteration_3.csv` or
+    `charging_ev_1111-01_part_0.parquet`.
+
+    Parameters
+    ----------
+    path : PosixPath
+        Path to directory containing results of dispatch optimization
+    parameters : list of str, optional
+        List of parameters to be selected. If None, all parameters are
+        selected.
+
+    Returns
+    -------
+    mapping : pd.DataFrame
+        Files with columns parameter, grid, feeder, iteration and file,
+        sorted by grid, parameter, feeder and iteration
+
+    """
+    mapping = find_result_files(
+        path,
+        kind=["iteration", "part"],
+        parameters=None if parameters is None else list(parameters),
+    )
+    mapping = mapping[["parameter", "grid", "feeder", "iteration", "file"]]
+    mapping = mapping.astype({"iteration": int})
+
+    return mapping.sort_values(by=["grid", "parameter", "feeder", "iteration"])
+
+
+def _concat_feeders(df_feeders, grid, parameter, fillna=None):
+    """Concat results of all feeders of one grid and parameter at once."""
+
+    # slack_initial is only one timestep
+    if "slack_initial" in parameter:
+        df_feeders = [df.T for df in df_feeders]
+
+    df_grid_parameter = pd.concat(df_feeders, axis=1)
+
+    if df_grid_parameter.isna().any().any():
+        logger.warning(f"There are NaN values in {grid}/{parameter}")
+
+        if fillna is not None:
+            df_grid_parameter = df_grid_parameter.fillna(**fillna)
+            logger.warning(
+                f"Nan Values replace in {grid}/{parameter}"
+                f" by {fillna.get('value', 'not specified')}"
+            )
+
+    return df_grid_parameter
+
+
+def iter_concat_results(
+    path, parameters=None, fillna=None, workers=None, engine=None
+):
+    """
+    Concat results of all iterations and feeders of one grid per parameter.
+    Only the results of one parameter are held in memory at once.
+
+    Parameters
+    ----------
+    path : PosixPath
+        Path to directory containing results of dispatch
+        optimization with pattern `iteration_*.csv` or `part_*.parquet`
+    parameters : list of str, optional
+        List of parameters to be collected. If None, all parameters are
+        collected.
+    fillna : dict, optional
+        kwargs from `pandas.core.frame.DataFrame.fillna`
+    workers : int, optional
+        Number of threads reading the files. If None, the config value
+        `reader_workers` is used.
+    engine : str, optional
+        Csv engine, e.g. 'c' or 'pyarrow'. If None, the config value
+        `csv_engine` is used.
+
+    Yields
+    ------
+    tuple
+        (grid, parameter) and concatenated results
+
+    """
+    mapping = get_result_file_mapping(path, parameters=parameters)
+    workers, engine = get_reader_options(workers=workers, engine=engine)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for (grid, parameter), grid_param in mapping.groupby(
+            ["grid", "parameter"]
+        ):
+            # files are read in order of feeder and iteration
+            df_files = read_result_files(
+                grid_param.file, executor=executor, engine=engine
+            )
+
+            # concat all iterations of one feeder, the time index is parsed
+            # once per feeder instead of once per file
+            feeders = grid_param.groupby("feeder", sort=False).indices
+            df_feeders = [
+                parse_time_index(
+                    pd.concat([df_files[i] for i in positions], axis=0)
+                )
+                for positions in feeders.values()
+            ]
+            del df_files
+
+            yield (grid, parameter), _concat_feeders(
+                df_feeders, grid, parameter, fillna=fillna
+            )
+
+
 def concat_results(path, timeframe=None, parameters=None, fillna=None):
     """
     Concat results of all iterations and feeders of one grid and
@@ -26,7 +146,7 @@ def concat_results(path, timeframe=None, parameters=None, fillna=None):
     ----------
     path : PosixPath
         Path to directory containing results of dispatch
-        optimization with pattern `iteration_*.csv`
+        optimization with pattern `iteration_*.csv` or `part_*.parquet`
     timeframe : pd.DatetimeIndex
         Timeframe to be selected, if None all times steps are selected
     parameters : list of str, optional
@@ -40,85 +160,94 @@ def concat_results(path, timeframe=None, parameters=None, fillna=None):
         Dictionary with parameter as key and concatinated results as value
 
     """
-    # get list of all iteration_*.csv
-    list_of_files = pd.Series(
-        get_files_in_subdirs(path, pattern="*iteration_*.csv")
+    return dict(
+        iter_concat_results(path, parameters=parameters, fillna=fillna)
     )
 
-    # identify file by filename pattern:
-    pattern = r"\d+/.*/\d+/(.*)_(\d+)-(\d+)_iteration_(\d+).csv"
-    mapping = pd.DataFrame(
-        [re.search(pattern, string=i).groups() for i in list_of_files],
-        columns=["parameter", "grid", "feeder", "iteration"],
-    )
-    mapping = mapping.sort_values(
-        by=["grid", "parameter", "feeder", "iteration"]
-    )
 
-    # select parameters from list of csv files
-    if parameters is not None:
-        parameters if isinstance(parameters, list) else list(parameters)
-        mapping = mapping.loc[mapping.parameter.isin(parameters)]
+def concat_feeder_results(feeder_results, grid_id, fillna=None):
+    """
+    Concat results of all feeders of one grid which are already collected in
+    memory, e.g. by :func:`run_dispatch_optimization_parallel`.
+
+    Parameters
+    ----------
+    feeder_results : dict
+        Dictionary with feeder id as key and a dictionary with parameter as
+        key and results of all iterations as value
+    grid_id : int
+    fillna : dict, optional
+        kwargs from `pandas.core.frame.DataFrame.fillna`
+
+    Returns
+    -------
+    collected_results : dict
+        Dictionary with (grid, parameter) as key and concatinated results as
+        value
+
+    """
+    parameters = sorted(
+        {parameter for res in feeder_results.values() for parameter in res}
+    )
 
-    # concat iterations and feeder per grid and parameter
     collected_results = {}
-    for group, grid_param in mapping.groupby(["grid", "parameter"]):
+    for parameter in parameters:
+
+        df_feeders = [
+            feeder_results[feeder][parameter]
+            for feeder in sorted(feeder_results)
+            if parameter in feeder_results[feeder]
+        ]
+        collected_results.update(
+            {
+                (str(grid_id), parameter): _concat_feeders(
+                    df_feeders, grid_id, parameter, fillna=fillna
+                )
+            }
+        )
 
-        df_grid_parameter = pd.DataFrame()
+    return collected_results
 
-        for (grid, parameter, feeder), grid_param_feeder in grid_param.groupby(
-            ["grid", "parameter", "feeder"]
-        ):
-            # concat all iterations of one feeder
-            df_all_iterations = pd.concat(
-                map(
-                    functools.partial(
-                        pd.read_csv, index_col=0, parse_dates=True
-                    ),
-                    list_of_files[grid_param_feeder.index],
-                ),
-                axis=0,
-            )
 
-            # slack_initial is only one timestep
-            if "slack_initial" in parameter:
-                df_all_iterations = df_all_iterations.T
-            # elif "slack" in parameter:
-            #     # all other slacks only contain timesteps with values
-            #     pass
-            # else:
-            #     # only select defined timeframe
-            #     logger.debug(
-            #         f"Select timesteps of {grid}/{feeder}" f"/{parameter}."
-            #     )
-            #     df_all_iterations = df_all_iterations.loc[timeframe]
-            # concat all feeder
-            df_grid_parameter = pd.concat(
-                [df_grid_parameter, df_all_iterations], axis=1
-            )
+def export_concatenated_results(results, export_path):
+    """Save concatenated results in the configured result format.
 
-        if df_grid_parameter.isna().any().any():
-            logger.warning(
-                f"There are NaN values in {grid}/{feeder}/{parameter}"
-            )
+    Parameters
+    ----------
+    results : dict
+        Dictionary with (grid, parameter) as key and concatinated results as
+        value
+    export_path : PosixPath
 
-            if fillna is not None:
-                df_grid_parameter = df_grid_parameter.fillna(**fillna)
-                logger.warning(
-                    f"Nan Values replace in {grid}/{parameter}"
-                    f" by {fillna.get('value', 'not specified')}"
-                )
+    Returns
+    -------
+
+    """
+    os.makedirs(export_path, exist_ok=True)
 
-        collected_results.update({group: df_grid_parameter})
+    records = []
+    for (grid, parameter), df in results.items():
+        filename = write_result_file(df, export_path / f"{grid}_{parameter}")
+        logger.info(f"Save concatenated results to {filename}.")
+        records.append(
+            {
+                "file": filename,
+                "grid": grid,
+                "parameter": parameter,
+                "kind": "concat",
+            }
+        )
 
-    return collected_results
+    manifest = get_manifest(export_path, create=True)
+    if manifest is not None:
+        manifest.add(records)
 
 
 @log_errors
 def save_concatenated_results(
     grid_id, path, objective=None, run_id=None, version_db=None
 ):
-    """Concatenate all results of one grid and save them to csv.
+    """Concatenate all results of one grid and save them to csv or parquet.
 
     Parameters
     ----------
@@ -157,21 +286,16 @@ def save_concatenated_results(
     #     freq="1h",
     # )
 
-    results = concat_results(
-        path=path,
-        parameters=None,
-        fillna={"value": 0},
-    )
-
     # export_path = Path(str(path).split("_results")[0] + "_concat")
     export_path = path.parent / "concat"
 
-    os.makedirs(export_path, exist_ok=True)
-
-    for (grid, parameter), df in results.items():
-        filename = export_path / f"{grid}_{parameter}.csv"
-        df.to_csv(filename, index=True)
-        logger.info(f"Save concatenated results to {filename}.")
+    # save every parameter right away to keep memory bounded
+    for group, df in iter_concat_results(
+        path=path,
+        parameters=None,
+        fillna={"value": 0},
+    ):
+        export_concatenated_results({group: df}, export_path)
 
     if version_db is not None:
         return version_db["db"]
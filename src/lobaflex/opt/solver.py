@@ -0,0 +1,252 @@
+import logging
+
+from contextlib import contextmanager
+
+import pyomo.environ as pm
+
+if __name__ == "__main__":
+    logger = logging.getLogger("lobaflex.opt." + __name__)
+else:
+    logger = logging.getLogger(__name__)
+
+# sets of all time steps of the model, see edisgo.opf.lopf.setup_model
+TIME_SETS = ("time_set", "timeindex")
+
+
+class SolverWrapper:
+    """Keeps one solver instance alive which is returned by every
+    :class:`pyomo.opt.SolverFactory` call of its registered name.
+
+    Parameters
+    ----------
+    solver : str
+        Name of the solver, e.g. 'gurobi'
+    warm_start : bool
+        Pass the current variable values as start solution to the solver if
+        it is capable of warm starts (default=False).
+
+    """
+
+    def __init__(self, solver, warm_start=False):
+        self.solver = solver
+        self.warm_start = warm_start
+        self.name = f"lobaflex_{solver}_{id(self)}"
+        self._solver = pm.SolverFactory(solver)
+
+    def __call__(self, **kwargs):
+        # used as factory by the SolverFactory
+        return self
+
+    def __getattr__(self, name):
+        if name.startswith("__") or name == "_solver":
+            raise AttributeError(name)
+        return getattr(self._solver, name)
+
+    @property
+    def options(self):
+        return self._solver.options
+
+    @options.setter
+    def options(self, options):
+        self._solver.options = options
+
+    def available(self, exception_flag=False):
+        try:
+            return bool(self._solver.available())
+        except Exception:
+            if exception_flag:
+                raise
+            return False
+
+    def warm_start_capable(self):
+        warm_start_capable = getattr(self._solver, "warm_start_capable", None)
+        return warm_start_capable is not None and warm_start_capable()
+
+    def solve(self, model, **kwargs):
+        if self.warm_start and self.warm_start_capable():
+            kwargs["warmstart"] = True
+        return self._solver.solve(model, **kwargs)
+
+
+class PersistentSolver(SolverWrapper):
+    """Keeps one persistent APPSI solver instance alive.
+
+    Solving the same model again only pushes changed variables, bounds,
+    parameters and constraints to the solver instead of re-writing and
+    re-loading the whole model. The solution and basis of the last solve stay
+    in the solver. A new model, e.g. of the next era, is loaded completely.
+
+    Parameters
+    ----------
+    solver : str
+        Name of the solver, e.g. 'gurobi' or 'highs'. The APPSI interface
+        'appsi_<solver>' is used.
+    warm_start : bool
+        See :class:`SolverWrapper`
+
+    """
+
+    def __init__(self, solver, warm_start=False):
+        super().__init__(f"appsi_{solver}", warm_start=warm_start)
+
+    def solve(self, model, logfile=None, **kwargs):
+        """Solve model with the persistent solver instance.
+
+        The APPSI legacy interface doesn't accept a logfile, it is set to the
+        solver config if supported.
+        """
+        if logfile is not None:
+            if hasattr(self._solver.config, "logfile"):
+                self._solver.config.logfile = str(logfile)
+            else:
+                logger.warning(
+                    f"Solver logs are not supported by {self.solver}."
+                )
+        return super().solve(model, **kwargs)
+
+
+@contextmanager
+def solver_context(solver, persistent=False, warm_start=False):
+    """Context to get the solver name for :func:`edisgo.opf.lopf.optimize`.
+
+    If persistent or warm_start is True, a :class:`PersistentSolver` or
+    :class:`SolverWrapper` is registered to the
+    :class:`pyomo.opt.SolverFactory` for the lifetime of the context and its
+    name is given. Otherwise or if the solver is not available, the solver
+    name is given unchanged.
+
+    Parameters
+    ----------
+    solver : str
+        Name of the solver, e.g. 'gurobi'
+    persistent : bool
+        Use a persistent solver (default=False)
+    warm_start : bool
+        Warm start the solver from the current variable values, see
+        :func:`set_warm_start_values` (default=False)
+
+    Yields
+    ------
+    str
+        Name of the solver to be used
+    """
+    if persistent:
+        solver_wrapper = PersistentSolver(solver, warm_start=warm_start)
+    elif warm_start:
+        solver_wrapper = SolverWrapper(solver, warm_start=warm_start)
+    else:
+        yield solver
+        return
+
+    if not solver_wrapper.available():
+        logger.warning(
+            f"Solver {solver_wrapper.solver} is not available. Use {solver}."
+        )
+        yield solver
+        return
+
+    logger.info(f"Use solver {solver_wrapper.solver}.")
+    pm.SolverFactory.register(
+        solver_wrapper.name, doc=f"lobaflex {solver_wrapper.solver}"
+    )(solver_wrapper)
+    try:
+        yield solver_wrapper.name
+    finally:
+        pm.SolverFactory.unregister(solver_wrapper.name)
+
+
+def _get_time_set_name(model):
+    """Name of the set of all time steps of the model, see
+    :func:`edisgo.opf.lopf.setup_model`, or None if there is none."""
+    for name in TIME_SETS:
+        if model.find_component(name) is not None:
+            return name
+    return None
+
+
+def _get_time_position(var, time_set_name):
+    """Position of the time dimension in the index of a variable and the
+    sets of the index."""
+    if time_set_name is None or not var.is_indexed():
+        return None, []
+    subsets = list(var.index_set().subsets())
+    for position, subset in enumerate(subsets):
+        if subset.local_name == time_set_name:
+            return position, subsets
+    return None, subsets
+
+
+def get_warm_start_values(model):
+    """Values of all time indexed variables of the solved model.
+
+    Parameters
+    ----------
+    model : :pyomo:`ConcreteModel`
+
+    Returns
+    -------
+    warm_start_values : dict
+        Dictionary with variable name as key and a tuple of the position of
+        the time dimension, the ordered time steps and the variable values
+        as value
+
+    """
+    time_set_name = _get_time_set_name(model)
+    warm_start_values = {}
+    for var in model.component_objects(pm.Var, active=True):
+        position, subsets = _get_time_position(var, time_set_name)
+        if position is None:
+            continue
+        timesteps = list(subsets[position])
+        values = {
+            index if isinstance(index, tuple) else (index,): v.value
+            for index, v in var.items()
+            if v.value is not None
+        }
+        warm_start_values[var.name] = (position, timesteps, values)
+    return warm_start_values
+
+
+def set_warm_start_values(model, warm_start_values, shift):
+    """Set the values of the previous solution as start values of the updated
+    model. Time steps are shifted by `shift` and time steps exceeding the
+    previous time steps are padded with the last value. Fixed variables keep
+    their value, as it is part of the model.
+
+    Parameters
+    ----------
+    model : :pyomo:`ConcreteModel`
+    warm_start_values : dict
+        See :func:`get_warm_start_values`
+    shift : int
+        Number of time steps the window moved, e.g. timesteps_per_iteration
+
+    Returns
+    -------
+
+    """
+    time_set_name = _get_time_set_name(model)
+    for name, (position, timesteps, values) in warm_start_values.items():
+        var = model.find_component(name)
+        if var is None or not timesteps:
+            continue
+        new_position, subsets = _get_time_position(var, time_set_name)
+        if new_position != position:
+            continue
+
+        # map new time steps to shifted previous time steps
+        new_timesteps = subsets[position]
+        mapping = {
+            timestep: timesteps[min(i + shift, len(timesteps) - 1)]
+            for i, timestep in enumerate(new_timesteps)
+        }
+
+        for index, v in var.items():
+            key = index if isinstance(index, tuple) else (index,)
+            if v.fixed or len(key) != len(subsets):
+                continue
+            previous_key = list(key)
+            previous_key[position] = mapping[key[position]]
+            value = values.get(tuple(previous_key))
+            if value is not None:
+                v.set_value(value, skip_validation=True)
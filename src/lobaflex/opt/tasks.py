@@ -7,14 +7,19 @@ from datetime import datetime
 from lobaflex import config_dir, data_dir, logs_dir, results_dir
 from lobaflex.analysis.grid_analysis import create_grids_notebook
 from lobaflex.opt.dispatch_integration import integrate_dispatch
-from lobaflex.opt.dispatch_optimization import run_dispatch_optimization
+from lobaflex.opt.dispatch_optimization import (
+    POTENTIAL_OBJECTIVES,
+    run_dispatch_optimization,
+    run_dispatch_optimization_parallel,
+)
 from lobaflex.opt.expansion_scenario import run_expansion_scenario
 from lobaflex.opt.feeder_extraction import run_feeder_extraction
 from lobaflex.opt.grid_reinforcement import reinforce_grid
 from lobaflex.opt.result_concatination import save_concatenated_results
 from lobaflex.opt.timeframe_selection import run_timeframe_selection
+from lobaflex.tools.ledger import measure_resources
 from lobaflex.tools.logger import setup_logging
-from lobaflex.tools.pydoit import opt_uptodate
+from lobaflex.tools.pydoit import content_uptodate, opt_uptodate
 from lobaflex.tools.tools import get_config
 
 logger = logging.getLogger("lobaflex.opt." + __name__)
@@ -23,6 +28,67 @@ cfg_o = get_config(path=config_dir / ".opt.yaml")
 logfile = logs_dir / f"opt_tasks_{date}.log"
 setup_logging(file_name=logfile)
 
+# opt config values the results of each stage depend on
+STAGE_CONFIG_KEYS = {
+    "timeframe_selection": ["timeframe_selection", "dump_format"],
+    "feeder_extraction": ["flexible_loads", "dump_format"],
+    "dispatch_optimization": [
+        "solver",
+        "options",
+        "n-1",
+        "flexible_loads",
+        "start_datetime",
+        "total_timesteps",
+        "timesteps_per_iteration",
+        "overlap_iterations",
+        "iterations_per_era",
+        "rolling_horizon",
+        "result_format",
+    ],
+    "result_concatenation": [
+        "start_datetime",
+        "total_timesteps",
+        "result_format",
+    ],
+    "dispatch_integration": [
+        "flexible_loads",
+        "start_datetime",
+        "total_timesteps",
+        "dump_format",
+    ],
+    "grid_reinforcement": ["dump_format"],
+    "expansion_scenario": ["dump_format"],
+}
+
+
+def get_uptodate(stage, paths, action):
+    """Uptodate checks of a task depending on the config value `uptodate`.
+
+    Parameters
+    ----------
+    stage : str
+        Stage of the task, see :attr:`STAGE_CONFIG_KEYS`
+    paths : list of PosixPath
+        Inputs of the task
+    action : callable
+        Action of the task
+
+    Returns
+    -------
+    list
+        :class:`lobaflex.tools.pydoit.content_uptodate` if the value is
+        'content' else :func:`lobaflex.tools.pydoit.opt_uptodate`
+    """
+    if cfg_o["uptodate"] == "content":
+        return [
+            content_uptodate(
+                paths=paths,
+                config_keys=STAGE_CONFIG_KEYS[stage],
+                functions=[action],
+            )
+        ]
+    return [opt_uptodate]
+
 
 def timeframe_selection_task(mvgd, import_path, run_id, version_db):
     """"""
@@ -32,7 +98,7 @@ def timeframe_selection_task(mvgd, import_path, run_id, version_db):
         "name": f"timeframe_{mvgd}",
         "actions": [
             (
-                run_timeframe_selection,
+                measure_resources(run_timeframe_selection),
                 [],  # args
                 {  # kwargs
                     "obj_or_path": import_path,
@@ -43,7 +109,13 @@ def timeframe_selection_task(mvgd, import_path, run_id, version_db):
             )
         ],
         "doc": "per mvgd",
-        "uptodate": [True] if fix else [opt_uptodate],
+        "uptodate": (
+            [True]
+            if fix
+            else get_uptodate(
+                "timeframe_selection", [import_path], run_timeframe_selection
+            )
+        ),
         "verbosity": 2,
     }
 
@@ -58,7 +130,7 @@ def feeder_extraction_task(mvgd, objective, source, run_id, version_db, dep):
         "name": f"{objective}_feeder_{mvgd}",
         "actions": [
             (
-                run_feeder_extraction,
+                measure_resources(run_feeder_extraction),
                 [],  # args
                 {  # kwargs
                     "obj_or_path": import_path,
@@ -73,7 +145,9 @@ def feeder_extraction_task(mvgd, objective, source, run_id, version_db, dep):
         "doc": "per mvgd",
         "task_dep": dep,
         # "uptodate": [True] if fix else [opt_uptodate],
-        "uptodate": [opt_uptodate],
+        "uptodate": get_uptodate(
+            "feeder_extraction", [import_path], run_feeder_extraction
+        ),
         "verbosity": 2,
     }
 
@@ -130,7 +204,7 @@ def optimization_task(
         "name": extra + f"{objective}_{mvgd}/{int(feeder):02}",
         "actions": [
             (
-                run_dispatch_optimization,
+                measure_resources(run_dispatch_optimization),
                 [],
                 {
                     "obj_or_path": import_path,
@@ -146,7 +220,64 @@ def optimization_task(
         ],
         "doc": "per feeder",
         "task_dep": dep,
-        "uptodate": [opt_uptodate],
+        "uptodate": get_uptodate(
+            "dispatch_optimization", [import_path], run_dispatch_optimization
+        ),
+        "verbosity": 2,
+    }
+
+
+def parallel_optimization_task(
+    mvgd,
+    feeders,
+    objective,
+    rolling_horizon,
+    directory,
+    run_id,
+    version_db,
+    dep,
+):
+    """Generator to define optimization task for all feeders of a mvgd
+
+    Replaces the optimization tasks per feeder and the concatenation task.
+    The task is named like the concatenation task so that following tasks
+    keep their dependencies."""
+
+    if objective in POTENTIAL_OBJECTIVES:
+        extra = directory.parent.name + "_"
+    else:
+        extra = ""
+
+    import_paths = [
+        results_dir / run_id / str(mvgd) / directory / f"{int(feeder):02}"
+        for feeder in feeders
+    ]
+
+    return {
+        "name": extra + f"concat_{objective}_{mvgd}",
+        "actions": [
+            (
+                measure_resources(run_dispatch_optimization_parallel),
+                [],
+                {
+                    "grid_id": mvgd,
+                    "feeders": feeders,
+                    "objective": objective,
+                    "directory": directory,
+                    "rolling_horizon": rolling_horizon,
+                    "workers": cfg_o["feeder_workers"],
+                    "version_db": version_db,
+                    "run_id": run_id,
+                },
+            )
+        ],
+        "doc": "per mvgd",
+        "task_dep": dep,
+        "uptodate": get_uptodate(
+            "dispatch_optimization",
+            import_paths,
+            run_dispatch_optimization_parallel,
+        ),
         "verbosity": 2,
     }
 
@@ -172,7 +303,7 @@ def result_concatenation_task(
         "name": extra + f"concat_{objective}_{mvgd}",
         "actions": [
             (
-                save_concatenated_results,
+                measure_resources(save_concatenated_results),
                 [],
                 {
                     "grid_id": mvgd,
@@ -187,11 +318,81 @@ def result_concatenation_task(
         # create dependency for every feeder in grid not only opt
         # results if not all opt succeeded
         "task_dep": dep,
-        "uptodate": [opt_uptodate],
+        "uptodate": get_uptodate(
+            "result_concatenation", [path], save_concatenated_results
+        ),
         # "teardown": [teardown(path)],
     }
 
 
+def feeder_optimization_tasks(
+    basename,
+    mvgd,
+    feeders,
+    objective,
+    rolling_horizon,
+    directory,
+    concat_directory,
+    run_id,
+    version_db,
+    dep,
+):
+    """Generator of the optimization tasks of all feeders of a mvgd and the
+    concatenation of their results. If the config value `feeder_workers` is
+    set, one task optimizes all feeders in parallel processes instead, see
+    :func:`parallel_optimization_task`.
+
+    Parameters
+    ----------
+    basename : str
+        Name of the task group, e.g. 'min_pot'
+    concat_directory : PosixPath
+        Directory of the concatenation task, e.g. potential / reference
+    feeders : list of str
+        Feeder ids in directory
+
+    """
+    cfg_o = get_config(path=config_dir / ".opt.yaml")
+    if cfg_o["feeder_workers"]:
+        # all feeders in one task, replaces concatenation
+        yield parallel_optimization_task(
+            mvgd=mvgd,
+            feeders=sorted(feeders),
+            objective=objective,
+            rolling_horizon=rolling_horizon,
+            directory=directory,
+            run_id=run_id,
+            version_db=version_db,
+            dep=dep,
+        )
+        return
+
+    dependencies = []
+    for feeder in sorted(feeders):
+        task = optimization_task(
+            mvgd=mvgd,
+            feeder=feeder,
+            objective=objective,
+            rolling_horizon=rolling_horizon,
+            directory=directory,
+            run_id=run_id,
+            version_db=version_db,
+            dep=dep,
+        )
+        # generate dependency list for concatenation task
+        dependencies.append(f"{basename}:{task['name']}")
+        yield task
+
+    yield result_concatenation_task(
+        mvgd=mvgd,
+        objective=objective,
+        directory=concat_directory,
+        run_id=run_id,
+        version_db=version_db,
+        dep=dependencies,
+    )
+
+
 def dispatch_integration_task(mvgd, objective, run_id, version_db, dep):
     """"""
     obj_path = data_dir / cfg_o["import_dir"] / str(mvgd)
@@ -201,7 +402,7 @@ def dispatch_integration_task(mvgd, objective, run_id, version_db, dep):
         "name": f"add_ts_{mvgd}",
         "actions": [
             (
-                integrate_dispatch,
+                measure_resources(integrate_dispatch),
                 [],
                 {
                     "obj_or_path": obj_path,
@@ -217,7 +418,9 @@ def dispatch_integration_task(mvgd, objective, run_id, version_db, dep):
         # create dependency for every feeder in grid not only opt
         # results if not all opt succeeded
         "task_dep": dep,
-        "uptodate": [opt_uptodate],
+        "uptodate": get_uptodate(
+            "dispatch_integration", [obj_path, import_path], integrate_dispatch
+        ),
     }
 
 
@@ -233,7 +436,7 @@ def grid_reinforcement_task(mvgd, objective, run_id, version_db, dep):
         "name": f"reinforce_{mvgd}",
         "actions": [
             (
-                reinforce_grid,
+                measure_resources(reinforce_grid),
                 [],
                 {
                     "obj_or_path": obj_path,
@@ -248,7 +451,9 @@ def grid_reinforcement_task(mvgd, objective, run_id, version_db, dep):
         # create dependency for every feeder in grid not only opt
         # results if not all opt succeeded
         "task_dep": dep,
-        "uptodate": [opt_uptodate],
+        "uptodate": get_uptodate(
+            "grid_reinforcement", [obj_path], reinforce_grid
+        ),
     }
 
 
@@ -263,7 +468,7 @@ def expansion_scenario_task(mvgd, percentage, source, run_id, version_db, dep):
         "name": f"{percentage}_pct_reinforced_{mvgd}",
         "actions": [
             (
-                run_expansion_scenario,
+                measure_resources(run_expansion_scenario),
                 [],
                 {
                     "obj_or_path": obj_path,
@@ -278,7 +483,9 @@ def expansion_scenario_task(mvgd, percentage, source, run_id, version_db, dep):
         # create dependency for every feeder in grid not only opt
         # results if not all opt succeeded
         "task_dep": dep,
-        "uptodate": [opt_uptodate],
+        "uptodate": get_uptodate(
+            "expansion_scenario", [obj_path], run_expansion_scenario
+        ),
     }
 
 
@@ -291,7 +498,7 @@ def papermill_task(mvgd, name, template, period, run_id, version_db, dep):
         "name": f"{task_name}_{mvgd}",
         "actions": [
             (
-                create_grids_notebook,
+                measure_resources(create_grids_notebook),
                 [],
                 {
                     "template": template,
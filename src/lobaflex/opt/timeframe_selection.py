@@ -4,13 +4,15 @@ import warnings
 
 from datetime import datetime
 
+import numpy as np
 import pandas as pd
 
-from edisgo.edisgo import EDisGo, import_edisgo_from_files
+from edisgo.edisgo import EDisGo
 from edisgo.network.timeseries import TimeSeries
 
 from lobaflex import config_dir, data_dir, logs_dir, results_dir
 from lobaflex.tools.logger import setup_logging
+from lobaflex.tools.snapshot import load_stage_edisgo, save_edisgo
 from lobaflex.tools.tools import get_config, log_errors
 
 if __name__ == "__main__":
@@ -19,32 +21,236 @@ else:
     logger = logging.getLogger(__name__)
 
 
-def determine_observation_periods(
-    edisgo_obj, window_days, idx="min", absolute=False
+def _select_non_overlapping(order, starts, steps, n_periods):
+    """Select the first n_periods windows in order which don't overlap
+    with a previously selected window."""
+    selected = []
+    for i in order:
+        if all(abs(starts[i] - starts[j]) >= steps for j in selected):
+            selected.append(i)
+            if len(selected) == n_periods:
+                break
+    return selected
+
+
+def find_observation_periods(
+    edisgo_obj,
+    window_days,
+    criteria=("max", "min", "abs_min"),
+    n_periods=1,
+    step=24,
 ):
-    if absolute:
-        residual_load = edisgo_obj.timeseries.residual_load.abs()
-    else:
-        residual_load = edisgo_obj.timeseries.residual_load
-    residual_load = residual_load.rolling(
-        window=window_days * 24, closed="both"
-    ).mean()
-    residual_load = residual_load.loc[::24]
-
-    if idx == "min":
-        timestep = residual_load.idxmin()
-    elif idx == "max":
-        timestep = residual_load.idxmax()
-    else:
-        raise NotImplementedError
+    """Search observation periods of several window lengths and criteria at
+    once. The mean residual load of all candidate windows is computed from
+    cumulative sums of the residual load, so every window length costs one
+    vectorized difference instead of a rolling mean.
+
+    Parameters
+    ----------
+    edisgo_obj : :class:`edisgo.EDisGo`
+    window_days : int or list of int
+        Window lengths in days
+    criteria : list of str
+        'max' or 'min' mean residual load or 'abs_max' or 'abs_min' mean
+        absolute residual load (default=('max', 'min', 'abs_min'))
+    n_periods : int
+        Number of windows per window length and criterion (default=1)
+    step : int
+        Time steps between the starts of candidate windows, e.g. 24 for
+        windows starting at the first hour of a day (default=24)
+
+    Returns
+    -------
+    pd.DataFrame
+        Selected windows with columns window_days, criterion, rank, start,
+        end and value (mean of the window). Windows of one window length and
+        criterion are ranked and don't overlap.
+    """
+    residual_load = edisgo_obj.timeseries.residual_load
+    values = residual_load.to_numpy(dtype=float)
+    cumsums = {
+        False: np.concatenate([[0], np.cumsum(values)]),
+        True: np.concatenate([[0], np.cumsum(np.abs(values))]),
+    }
+
+    if isinstance(window_days, int):
+        window_days = [window_days]
+
+    records = []
+    for days in window_days:
+        steps = days * 24
+        starts = np.arange(0, len(values) - steps + 1, step)
+        if not len(starts):
+            logger.warning(f"Time series is shorter than {days} days.")
+            continue
+
+        for criterion in criteria:
+            absolute = criterion.startswith("abs_")
+            cumsum = cumsums[absolute]
+            means = (cumsum[starts + steps] - cumsum[starts]) / steps
+
+            if criterion.endswith("max"):
+                order = np.argsort(-means, kind="stable")
+            elif criterion.endswith("min"):
+                order = np.argsort(means, kind="stable")
+            else:
+                raise ValueError(f"Unknown criterion: {criterion}")
+
+            selected = _select_non_overlapping(order, starts, steps, n_periods)
+            records += [
+                (
+                    days,
+                    criterion,
+                    rank,
+                    residual_load.index[starts[i]],
+                    residual_load.index[starts[i] + steps - 1],
+                    means[i],
+                )
+                for rank, i in enumerate(selected)
+            ]
+
+    return pd.DataFrame(
+        records,
+        columns=["window_days", "criterion", "rank", "start", "end", "value"],
+    )
+
 
-    timestep = timestep - pd.DateOffset(days=window_days)
+def get_periods_timeframe(periods, freq="h"):
+    """Time steps of the periods found by :func:`find_observation_periods`.
 
-    timeframe = pd.date_range(
-        start=timestep, periods=window_days * 24, freq="h"
+    Parameters
+    ----------
+    periods : pd.DataFrame
+        Periods with columns start and end
+    freq : str
+        Frequency of the time series (default='h')
+
+    Returns
+    -------
+    pd.DatetimeIndex
+    """
+    return pd.DatetimeIndex(
+        np.concatenate(
+            [
+                pd.date_range(start=start, end=end, freq=freq)
+                for start, end in zip(periods.start, periods.end)
+            ]
+        )
     )
 
-    return timeframe
+
+def classify_grid(edisgo_obj):
+    """Classify the grid by its residual load of the whole year.
+
+    Parameters
+    ----------
+    edisgo_obj : :class:`edisgo.EDisGo`
+
+    Returns
+    -------
+    str
+        'load' if the load exceeds the feed-in, otherwise 'feedin'
+    """
+    if edisgo_obj.timeseries.residual_load.sum() > 0:
+        return "load"
+    return "feedin"
+
+
+def get_grid_type(edisgo_obj, grid_id, selection):
+    """Grid type by the config value `timeframe_selection`.
+
+    Parameters
+    ----------
+    edisgo_obj : :class:`edisgo.EDisGo`
+    grid_id : int
+    selection : dict
+        Config value `timeframe_selection`
+
+    Returns
+    -------
+    str or None
+        'load' or 'feedin', None if no timeframe is selected for the grid
+    """
+    method = selection["method"]
+    if method == "grid_mapping":
+        if int(grid_id) in selection["load_grids"]:
+            return "load"
+        if int(grid_id) in selection["feedin_grids"]:
+            return "feedin"
+        logger.info(f"Grid {grid_id} not mapped, classify by residual load.")
+        return classify_grid(edisgo_obj)
+    if method == "observation_periods":
+        return classify_grid(edisgo_obj)
+    if method is None:
+        return None
+    raise ValueError(f"Unknown timeframe selection method: {method}")
+
+
+def get_timeframe_positions(index, timeframe):
+    """Positions of the timeframe in the index.
+
+    Parameters
+    ----------
+    index : pd.Index
+        Unique index of the time series
+    timeframe : pd.DatetimeIndex
+
+    Returns
+    -------
+    slice or np.ndarray
+        Slice if the timeframe is one contiguous block in the index,
+        otherwise the positions
+    """
+    positions = index.get_indexer(timeframe)
+    if (positions < 0).any():
+        raise KeyError("Timeframe is not contained in the index.")
+    if len(positions) > 0 and (np.diff(positions) == 1).all():
+        return slice(positions[0], positions[-1] + 1)
+    return positions
+
+
+def select_timeframe(df, timeframe, cache=None, copy=False):
+    """Select the timeframe of a time series positionally. A contiguous
+    timeframe is sliced, which gives a view instead of a copy, otherwise the
+    rows are taken at once.
+
+    Parameters
+    ----------
+    df : pd.DataFrame or pd.Series
+    timeframe : pd.DatetimeIndex
+    cache : dict or None
+        Positions of already used indexes, to determine the positions only
+        once for time series with the same index
+    copy : bool
+        Copy the selected time series instead of giving a view
+        (default=False)
+
+    Returns
+    -------
+    pd.DataFrame or pd.Series
+    """
+    if not df.index.is_unique:
+        return df.loc[timeframe]
+
+    cache = {} if cache is None else cache
+    index, positions = cache.get(id(df.index), (None, None))
+    if index is not df.index:
+        # equal indexes don't share the object, e.g. columns of a DataFrame
+        positions = next(
+            (
+                positions
+                for index, positions in cache.values()
+                if index.equals(df.index)
+            ),
+            None,
+        )
+        if positions is None:
+            positions = get_timeframe_positions(df.index, timeframe)
+        cache[id(df.index)] = (df.index, positions)
+
+    if isinstance(positions, slice):
+        return df.iloc[positions].copy() if copy else df.iloc[positions]
+    return df.take(positions)
 
 
 def extract_timeframe(
@@ -56,6 +262,7 @@ def extract_timeframe(
     ts=True,
     bev=True,
     hp=True,
+    copy=False,
 ):
     """Extracts a given time frame from the edisgo object for all time series
     which are defined in the edisgo object and flagged.
@@ -78,6 +285,9 @@ def extract_timeframe(
         Extract battery electric vehicle time series, default True
     hp :
         Extract heat pump time series, default True
+    copy : bool
+        Copy the extracted time series, e.g. if the edisgo object shares
+        them with another one. Only the timeframe is copied, default False
 
     Returns
     -------
@@ -102,6 +312,9 @@ def extract_timeframe(
             "Edisgo object does not contain all the given timeindex"
         )
 
+    # positions per index, time series mostly share their index
+    cache = {}
+
     # adapt timeseries
     if ts:
         attributes = TimeSeries()._attributes
@@ -111,14 +324,19 @@ def extract_timeframe(
                 setattr(
                     edisgo_obj.timeseries,
                     attr,
-                    getattr(edisgo_obj.timeseries, attr).loc[timeframe],
+                    select_timeframe(
+                        getattr(edisgo_obj.timeseries, attr),
+                        timeframe,
+                        cache=cache,
+                        copy=copy,
+                    ),
                 )
         # logger.info("")
     # Battery electric vehicle timeseries
     if bev:
         for key, df in edisgo_obj.electromobility.flexibility_bands.items():
             if not df.empty:
-                df = df.loc[timeframe]
+                df = select_timeframe(df, timeframe, cache=cache, copy=copy)
                 edisgo_obj.electromobility.flexibility_bands.update({key: df})
     # Heat pumps timeseries
     if hp:
@@ -127,7 +345,12 @@ def extract_timeframe(
                 setattr(
                     edisgo_obj.heat_pump,
                     attr,
-                    getattr(edisgo_obj.heat_pump, attr).loc[timeframe],
+                    select_timeframe(
+                        getattr(edisgo_obj.heat_pump, attr),
+                        timeframe,
+                        cache=cache,
+                        copy=copy,
+                    ),
                 )
 
     # logger.info(
@@ -144,8 +367,17 @@ def run_timeframe_selection(
     run_id=None,
     version_db=None,
 ):
-    """Extract timeframe from edisgo object or dump. Currently using timeindex
-    generate from config file input.
+    """Extract timeframe from edisgo object or dump. The period with max or
+    min residual load for load or feed-in dominated grids and the period with
+    min absolute residual load are selected. The grid type is given by the
+    config value `timeframe_selection`:
+
+    * 'grid_mapping': the grids listed in `load_grids` or `feedin_grids`,
+      all other grids are classified by their residual load, see
+      :func:`classify_grid`.
+    * 'observation_periods': every grid is classified by its residual load,
+      see :func:`classify_grid`.
+    * None: the whole time series is kept.
 
     Parameters
     ----------
@@ -186,56 +418,36 @@ def run_timeframe_selection(
 
         logger.info(f"Import Grid from file: {obj_or_path}")
 
-        edisgo_obj = import_edisgo_from_files(
+        edisgo_obj = load_stage_edisgo(
             obj_or_path,
-            import_topology=True,
-            import_timeseries=True,
-            import_heat_pump=True,
-            import_electromobility=True,
+            "timeframe_selection",
         )
 
     export_path = results_dir / run_id / str(grid_id) / "initial" / "mvgd"
     os.makedirs(export_path, exist_ok=True)
 
-    if grid_id in [2534, 177, 1056, 176, 1690, 1811]:
-        # timeframe for load intensive areas
-        # max residual load
-        if int(grid_id) in [2534, 177]:
-            timeframe = determine_observation_periods(
-                edisgo_obj, window_days=7, idx="max", absolute=False
-            )
-
-        # timeframe for pv or wind intensive areas
-        # min residual load
-        elif int(grid_id) in [1056, 176, 1690, 1811]:
-
-            timeframe = determine_observation_periods(
-                edisgo_obj, window_days=7, idx="min", absolute=False
-            )
-
-        else:
-            raise NotImplementedError
-
-        # timeframe for potential analysis
-        # min absolute residual load
-        timeframe = timeframe.append(
-            determine_observation_periods(
-                edisgo_obj, window_days=7, idx="min", absolute=True
-            )
+    selection = cfg_o["timeframe_selection"]
+    window_days = selection["window_days"]
+    grid_type = get_grid_type(edisgo_obj, grid_id, selection)
+
+    if grid_type is not None:
+        logger.info(f"Grid {grid_id} is {grid_type} dominated.")
+        # max residual load for load intensive areas, min residual load for
+        # pv or wind intensive areas and min absolute residual load for the
+        # potential analysis
+        periods = find_observation_periods(
+            edisgo_obj,
+            window_days=window_days,
+            criteria=["max" if grid_type == "load" else "min", "abs_min"],
         )
-        timeframe = timeframe.sort_values()
+        logger.info(f"Observation periods:\n{periods}")
+        timeframe = get_periods_timeframe(periods).sort_values()
 
         if any(timeframe.duplicated()):
             raise ValueError("There is a duplicated timeindex!")
 
         logger.info("Extract timeframe")
-        edisgo_obj = extract_timeframe(
-            edisgo_obj,
-            timeframe=timeframe,
-            # start_datetime=cfg_o["start_datetime"],
-            # periods=cfg_o["total_timesteps"],
-            # freq="1h",
-        )
+        edisgo_obj = extract_timeframe(edisgo_obj, timeframe=timeframe)
     else:
         logger.warning(
             "You are in experimental mode. Timeframe selection is "
@@ -243,7 +455,8 @@ def run_timeframe_selection(
         )
 
     logger.info(f"Save reduced grid to {export_path}")
-    edisgo_obj.save(
+    save_edisgo(
+        edisgo_obj,
         export_path,
         save_topology=True,
         save_timeseries=True,
@@ -0,0 +1,654 @@
+import hashlib
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import quote, unquote
+
+from doit.task import dict_to_task
+
+from lobaflex.opt.dispatch_optimization import (
+    run_dispatch_optimization,
+    run_dispatch_optimization_parallel,
+)
+from lobaflex.opt.result_concatination import save_concatenated_results
+from lobaflex.tools.ledger import RuntimeLedger, measure_resources
+from lobaflex.tools.manifest import (
+    apply_manifest_changes,
+    record_manifest_changes,
+)
+from lobaflex.tools.pydoit import content_uptodate
+
+if __name__ == "__main__":
+    logger = logging.getLogger("lobaflex.opt." + __name__)
+else:
+    logger = logging.getLogger(__name__)
+
+# actions of the doit tasks which can be executed by workers
+JOB_FUNCTIONS = {
+    func.__name__: func
+    for func in [
+        run_dispatch_optimization,
+        run_dispatch_optimization_parallel,
+        save_concatenated_results,
+    ]
+}
+
+QUEUE_STATES = ("pending", "running", "done", "failed")
+
+
+def _encode(value):
+    """Json serializable value, paths are tagged to be restored."""
+    if isinstance(value, Path):
+        return {"__path__": str(value)}
+    if isinstance(value, dict):
+        return {key: _encode(v) for key, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict):
+        if set(value) == {"__path__"}:
+            return Path(value["__path__"])
+        return {key: _decode(v) for key, v in value.items()}
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
+
+
+class WorkQueue:
+    """Queue of jobs in a directory of a filesystem shared by all nodes.
+
+    Every job is a json file in the directory of its state, see
+    :attr:`QUEUE_STATES`. Jobs change their state by atomic renames, so
+    every job is claimed by one worker only, without a lock or database
+    server. Jobs are claimed in order of their priority once all their
+    dependencies are done.
+
+    Workers only write to the queue. Results, resources and manifest
+    changes of a job are saved in its file and written to the doit DB, the
+    ledger and the manifest by :func:`collect_jobs`.
+
+    Parameters
+    ----------
+    path : str or PosixPath
+        Directory of the queue, e.g. results_dir / run_id / 'queue'
+
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        for state in QUEUE_STATES:
+            os.makedirs(self.path / state, exist_ok=True)
+        # last change of the running jobs seen by this process
+        self._observed = {}
+
+    @staticmethod
+    def _file_name(job_id, priority):
+        return f"{priority:06d}_{quote(job_id, safe='')}.json"
+
+    @staticmethod
+    def _job_id(file):
+        return unquote(file.stem.split("_", 1)[1])
+
+    def _files(self, state):
+        return sorted((self.path / state).glob("*.json"))
+
+    def job_ids(self, state):
+        """Ids of all jobs in state."""
+        return {self._job_id(file) for file in self._files(state)}
+
+    def _write(self, file, job):
+        # write to a temporary file first, so no incomplete job is read
+        tmp_file = file.parent / f".{file.name}.{os.getpid()}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(job, f, indent=1, default=str)
+        os.replace(tmp_file, file)
+
+    @staticmethod
+    def _read(file):
+        with open(file) as f:
+            return json.load(f)
+
+    def publish(self, jobs):
+        """Add jobs to the queue. Jobs which are already queued, running or
+        done with the same digest are skipped. Failed jobs and jobs with
+        another digest, e.g. of changed inputs, are replaced. Jobs running
+        with another digest are published once they finished.
+
+        Parameters
+        ----------
+        jobs : list of dict
+            Jobs with keys id, digest, function, kwargs and deps, see
+            :func:`task_to_job`. The position in the list is the priority.
+
+        Returns
+        -------
+        int
+            Number of published jobs
+        """
+        queued = {}
+        for state in QUEUE_STATES:
+            for file in self._files(state):
+                try:
+                    job = self._read(file)
+                except (FileNotFoundError, json.JSONDecodeError):
+                    continue
+                queued.setdefault(job["id"], []).append((state, file, job))
+        published = 0
+        for priority, job in enumerate(jobs):
+            entries = queued.get(job["id"], [])
+            if any(
+                state != "failed" and queued_job["digest"] == job["digest"]
+                for state, _, queued_job in entries
+            ):
+                continue
+            if any(state == "running" for state, _, _ in entries):
+                logger.warning(
+                    f"Job {job['id']} is running with other inputs, publish "
+                    "it again after it finished."
+                )
+                continue
+            for _, file, _ in entries:
+                file.unlink(missing_ok=True)
+            job = {
+                **job,
+                "priority": priority,
+                "published": datetime.now().isoformat(timespec="seconds"),
+            }
+            file = self.path / "pending" / self._file_name(job["id"], priority)
+            self._write(file, job)
+            published += 1
+        logger.info(f"Published {published} jobs to {self.path}.")
+        return published
+
+    def claim(self, worker):
+        """Claim the pending job with the highest priority whose
+        dependencies are done. Jobs with failed dependencies are failed.
+
+        Parameters
+        ----------
+        worker : str
+            Name of the worker, e.g. host and process id
+
+        Returns
+        -------
+        dict or None
+            Claimed job or None if no job is ready
+        """
+        done = self.job_ids("done")
+        failed = self.job_ids("failed")
+        for file in self._files("pending"):
+            try:
+                job = self._read(file)
+            except (FileNotFoundError, json.JSONDecodeError):
+                # claimed by another worker in the meantime
+                continue
+            if any(dep in failed for dep in job["deps"]):
+                self._move(file, "failed", job, error="unmet dependency")
+                failed.add(job["id"])
+                continue
+            if not all(dep in done for dep in job["deps"]):
+                continue
+            running_file = self.path / "running" / file.name
+            try:
+                os.rename(file, running_file)
+                # renaming keeps the time of publication
+                os.utime(running_file)
+            except FileNotFoundError:
+                continue
+            job.update(
+                {
+                    "worker": worker,
+                    "started": datetime.now().isoformat(timespec="seconds"),
+                }
+            )
+            self._write(running_file, job)
+            return job
+        return None
+
+    def _move(self, file, state, job, **values):
+        job = {**job, **values}
+        self._write(self.path / state / file.name, job)
+        file.unlink(missing_ok=True)
+
+    def _running_file(self, job):
+        return (
+            self.path / "running" / self._file_name(job["id"], job["priority"])
+        )
+
+    def heartbeat(self, job):
+        """Mark a running job as alive, see :meth:`requeue_stale`."""
+        os.utime(self._running_file(job))
+
+    def _finish(self, job, state, **values):
+        """Move a running job of this worker to state. The job is kept if it
+        was queued again and claimed by another worker in the meantime.
+
+        Returns
+        -------
+        bool
+            True if the job was moved
+        """
+        running_file = self._running_file(job)
+        # take the job file, so it isn't queued again while it is moved
+        own_file = running_file.with_name(
+            f".{running_file.name}.{quote(job['worker'], safe='')}"
+        )
+        try:
+            os.rename(running_file, own_file)
+        except FileNotFoundError:
+            logger.warning(f"Job {job['id']} isn't running anymore.")
+            return False
+        worker = self._read(own_file).get("worker")
+        if worker != job["worker"]:
+            os.rename(own_file, running_file)
+            logger.warning(
+                f"Job {job['id']} was claimed by {worker} in the meantime."
+            )
+            return False
+        self._write(self.path / state / running_file.name, {**job, **values})
+        own_file.unlink()
+        return True
+
+    def complete(self, job, result, resources=None, manifest=None):
+        """Move a running job to done with its result, resource usage and
+        manifest changes, see :func:`collect_jobs`.
+
+        Returns
+        -------
+        bool
+            False if the job isn't owned by the worker anymore
+        """
+        return self._finish(
+            job,
+            "done",
+            result=_encode(result),
+            resources=resources or {},
+            manifest=manifest or [],
+            finished=datetime.now().isoformat(timespec="seconds"),
+        )
+
+    def fail(self, job, error):
+        """Move a running job to failed with its error.
+
+        Returns
+        -------
+        bool
+            False if the job isn't owned by the worker anymore
+        """
+        return self._finish(
+            job,
+            "failed",
+            error=error,
+            finished=datetime.now().isoformat(timespec="seconds"),
+        )
+
+    def requeue_stale(self, timeout):
+        """Queue running jobs again whose worker didn't send a heartbeat for
+        timeout seconds, e.g. because its node died.
+
+        Heartbeats are observed as changes of the job file with the clock of
+        this process, so the clocks of the nodes don't need to be in sync.
+        A job is queued again after it was observed unchanged for timeout
+        seconds.
+
+        Parameters
+        ----------
+        timeout : float
+
+        Returns
+        -------
+        int
+            Number of jobs queued again
+        """
+        now = time.monotonic()
+        running = self._files("running")
+        self._observed = {
+            file.name: self._observed[file.name]
+            for file in running
+            if file.name in self._observed
+        }
+        requeued = 0
+        for file in running:
+            try:
+                stat = file.stat()
+            except FileNotFoundError:
+                continue
+            change = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+            observed = self._observed.get(file.name)
+            if observed is None or observed[0] != change:
+                self._observed[file.name] = (change, now)
+                continue
+            if now - observed[1] < timeout:
+                continue
+            try:
+                os.rename(file, self.path / "pending" / file.name)
+            except FileNotFoundError:
+                continue
+            del self._observed[file.name]
+            logger.warning(f"Queue stale job {self._job_id(file)} again.")
+            requeued += 1
+        return requeued
+
+    def mark_collected(self, job):
+        """Mark a done job as collected by :func:`collect_jobs`."""
+        file = self.path / "done" / self._file_name(job["id"], job["priority"])
+        self._write(
+            file,
+            {**job, "collected": datetime.now().isoformat(timespec="seconds")},
+        )
+
+    def status(self):
+        """Number of jobs per state."""
+        return {state: len(self._files(state)) for state in QUEUE_STATES}
+
+    def jobs(self, state):
+        """All jobs in state."""
+        return [self._read(file) for file in self._files(state)]
+
+
+def get_input_digests(task, values=None):
+    """Digests of the inputs of a task by its
+    :class:`lobaflex.tools.pydoit.content_uptodate` checks.
+
+    Parameters
+    ----------
+    task : dict
+        doit task definition
+    values : dict or None
+        Saved values of the task in the doit DB, checksums of unchanged
+        input files are taken from them
+
+    Returns
+    -------
+    list of str
+    """
+    saved_files = (values or {}).get("_content_files", {})
+    return [
+        checker.get_digest(checker.get_files(saved_files))
+        for checker in task.get("uptodate", [])
+        if isinstance(checker, content_uptodate)
+    ]
+
+
+def get_job_function(task):
+    """Name of the job function of a doit task definition.
+
+    Parameters
+    ----------
+    task : dict
+
+    Returns
+    -------
+    str or None
+        None if the action of the task can't be executed by workers, see
+        :attr:`JOB_FUNCTIONS`
+    """
+    (function, args, kwargs), *other = task["actions"]
+    if other or args or function.__name__ not in JOB_FUNCTIONS:
+        return None
+    return function.__name__
+
+
+def task_to_job(basename, task, values=None):
+    """Job of a doit task definition of :mod:`lobaflex.opt.tasks`.
+
+    The job is keyed by a digest of its function, arguments and inputs, see
+    :func:`get_input_digests`, so jobs of changed tasks are replaced in the
+    queue.
+
+    Parameters
+    ----------
+    basename : str
+        Name of the task group, e.g. 'min_pot'
+    task : dict
+    values : dict or None
+        Saved values of the task in the doit DB
+
+    Returns
+    -------
+    dict or None
+        None if the action of the task can't be executed by workers, see
+        :attr:`JOB_FUNCTIONS`
+    """
+    function = get_job_function(task)
+    if function is None:
+        return None
+    (_, _, kwargs), *_ = task["actions"]
+    job = {
+        "id": f"{basename}:{task['name']}",
+        "function": function,
+        "kwargs": _encode(kwargs),
+        "deps": list(task.get("task_dep", [])),
+    }
+    content = [
+        job["function"],
+        job["kwargs"],
+        get_input_digests(task, values),
+    ]
+    job["digest"] = hashlib.md5(
+        json.dumps(content, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+    return job
+
+
+def publish_tasks(path, basename, tasks, dep_manager=None):
+    """Publish the optimization and concatenation tasks of a task group to
+    the work queue. Dependencies on tasks which aren't published have to be
+    done before.
+
+    Parameters
+    ----------
+    path : str or PosixPath
+        Directory of the queue
+    basename : str
+        Name of the task group, e.g. 'min_pot'
+    tasks : list of dict
+        doit task definitions in order of their priority
+    dep_manager : :class:`doit.dependency.Dependency` or None
+        If given, tasks which are uptodate aren't published
+
+    Returns
+    -------
+    int
+        Number of published jobs
+    """
+    jobs = []
+    for task in tasks:
+        name = f"{basename}:{task['name']}"
+        values = None
+        if dep_manager is not None:
+            status = dep_manager.get_status(
+                dict_to_task({**task, "name": name}), {}
+            )
+            if status.status == "up-to-date":
+                logger.debug(f"Task {name} is uptodate.")
+                continue
+            values = dep_manager.get_values(name)
+        if get_job_function(task) is None:
+            logger.warning(
+                f"Task {name} can't be executed by workers and isn't "
+                "published."
+            )
+            continue
+        jobs.append(task_to_job(basename, task, values))
+    ids = {job["id"] for job in jobs}
+    for job in jobs:
+        job["deps"] = [dep for dep in job["deps"] if dep in ids]
+    return WorkQueue(path).publish(jobs)
+
+
+def collect_jobs(path, basename, tasks, dep_manager):
+    """Save the results of done jobs to the doit dep DB as if the tasks had
+    been executed by doit, so they are uptodate in following runs. The
+    resources of the jobs are added to the runtime ledger and their result
+    files to the manifest. Jobs whose task changed since they were published
+    are skipped.
+
+    Parameters
+    ----------
+    path : str or PosixPath
+        Directory of the queue
+    basename : str
+        Name of the task group, e.g. 'min_pot'
+    tasks : list of dict
+        doit task definitions of the jobs
+    dep_manager : :class:`doit.dependency.Dependency`
+
+    Returns
+    -------
+    dict
+        Number of collected and failed jobs
+    """
+    work_queue = WorkQueue(path)
+    tasks = {f"{basename}:{task['name']}": task for task in tasks}
+    ledger = RuntimeLedger()
+
+    collected = 0
+    for job in work_queue.jobs("done"):
+        if job["id"] not in tasks or "collected" in job:
+            continue
+        values = dep_manager.get_values(job["id"])
+        current_job = task_to_job(basename, tasks[job["id"]], values)
+        if current_job is None or current_job["digest"] != job["digest"]:
+            logger.warning(f"Task of job {job['id']} changed, not collected.")
+            continue
+        apply_manifest_changes(job.get("manifest", []))
+        task = dict_to_task({**tasks[job["id"]], "name": job["id"]})
+        task.result = _decode(job["result"])
+        task.save_extra_values()
+        dep_manager.save_success(task)
+        resources = job.get("resources", {})
+        current = job["kwargs"].get("version_db", {}).get("current", {})
+        ledger.add(
+            [
+                {
+                    "run_id": current.get("run_id"),
+                    "version": current.get("version"),
+                    "task": job["id"],
+                    "status": "success",
+                    "start": job["started"],
+                    **resources,
+                }
+            ]
+        )
+        work_queue.mark_collected(job)
+        collected += 1
+
+    failed = [job for job in work_queue.jobs("failed") if job["id"] in tasks]
+    for job in failed:
+        logger.warning(f"Job {job['id']} failed: {job['error']}")
+    logger.info(f"Collected {collected} jobs, {len(failed)} failed.")
+    return {"collected": collected, "failed": len(failed)}
+
+
+def run_worker(
+    path,
+    poll_interval=10,
+    heartbeat_interval=60,
+    stale_timeout=600,
+    max_jobs=None,
+):
+    """Claim and execute jobs of the work queue until all jobs are done or
+    failed. Workers on several nodes can work on the same queue.
+
+    Parameters
+    ----------
+    path : str or PosixPath
+        Directory of the queue
+    poll_interval : float
+        Seconds to wait if no job is ready (default=10)
+    heartbeat_interval : float
+        Seconds between heartbeats of a running job (default=60)
+    stale_timeout : float
+        Seconds without heartbeat after which running jobs of other workers
+        are queued again (default=600)
+    max_jobs : int or None
+        Stop after max_jobs jobs (default=None)
+
+    Returns
+    -------
+    int
+        Number of executed jobs
+    """
+    work_queue = WorkQueue(path)
+    worker = f"{socket.gethostname()}-{os.getpid()}"
+    logger.info(f"Worker {worker} started on {work_queue.path}.")
+
+    executed = 0
+    while max_jobs is None or executed < max_jobs:
+        job = work_queue.claim(worker)
+        if job is None:
+            status = work_queue.status()
+            if not status["pending"] and not status["running"]:
+                break
+            work_queue.requeue_stale(stale_timeout)
+            time.sleep(poll_interval)
+            continue
+
+        logger.info(f"Worker {worker} executes {job['id']}.")
+        stop_heartbeat = threading.Event()
+
+        def heartbeat():
+            while not stop_heartbeat.wait(heartbeat_interval):
+                try:
+                    work_queue.heartbeat(job)
+                except FileNotFoundError:
+                    break
+
+        thread = threading.Thread(target=heartbeat, daemon=True)
+        thread.start()
+        try:
+            function = measure_resources(JOB_FUNCTIONS[job["function"]])
+            # manifests are written by collect_jobs
+            with record_manifest_changes() as manifest_changes:
+                result, resources = function.measure(**_decode(job["kwargs"]))
+        except Exception:
+            logger.exception(f"Job {job['id']} failed.")
+            work_queue.fail(job, traceback.format_exc())
+        else:
+            work_queue.complete(job, result, resources, manifest_changes)
+        finally:
+            stop_heartbeat.set()
+            thread.join()
+        executed += 1
+
+    logger.info(f"Worker {worker} finished after {executed} jobs.")
+    return executed
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    from lobaflex import logs_dir
+    from lobaflex.tools.logger import setup_logging
+    from lobaflex.tools.tools import split_model_config_in_subconfig
+
+    parser = argparse.ArgumentParser(
+        description="Execute jobs of a lobaflex work queue."
+    )
+    parser.add_argument("path", help="directory of the work queue")
+    parser.add_argument("--poll-interval", type=float, default=10)
+    parser.add_argument("--max-jobs", type=int, default=None)
+    args = parser.parse_args()
+
+    split_model_config_in_subconfig()
+
+    logger = logging.getLogger("lobaflex.__main__")
+    date = datetime.now().date().isoformat()
+    logfile = logs_dir / f"worker_{socket.gethostname()}_{date}.log"
+    setup_logging(file_name=logfile)
+
+    run_worker(
+        args.path, poll_interval=args.poll_interval, max_jobs=args.max_jobs
+    )
@@ -0,0 +1,408 @@
+import inspect
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from contextlib import closing, contextmanager
+from datetime import datetime
+from functools import update_wrapper
+from urllib.parse import quote
+
+import doit
+import pandas as pd
+import psutil
+
+from lobaflex import results_dir
+
+logger = logging.getLogger(__name__)
+
+LEDGER_FILE = results_dir / "ledger.sqlite"
+
+# resource usage of measured task actions until it is added to the ledger
+MEASUREMENT_DIR = results_dir / "measurements"
+
+COLUMNS = [
+    "run_id",
+    "version",
+    "task",
+    "status",
+    "start",
+    "wall_time",
+    "cpu_time",
+    "peak_rss",
+    "solver_time",
+]
+
+# seconds spent in the solver by this process, see :func:`solver_timer`
+_solver_time = 0.0
+
+
+@contextmanager
+def solver_timer():
+    """Context adding its duration to the solver time of the process."""
+    global _solver_time
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _solver_time += time.perf_counter() - start
+
+
+class PeakMemory(threading.Thread):
+    """Samples the resident memory of the process and its children, e.g.
+    solver or worker processes, in a background thread.
+
+    Parameters
+    ----------
+    interval : float
+        Seconds between two samples (default=0.5)
+
+    """
+
+    def __init__(self, interval=0.5):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = 0
+        self._stop_event = threading.Event()
+        self._process = psutil.Process(os.getpid())
+
+    def sample(self):
+        rss = self._process.memory_info().rss
+        for child in self._process.children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+            except psutil.Error:
+                # child finished in the meantime
+                continue
+        self.peak = max(self.peak, rss)
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.sample()
+
+    def __enter__(self):
+        self.sample()
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop_event.set()
+        self.join()
+        self.sample()
+
+
+def _cpu_time(process):
+    cpu_times = process.cpu_times()
+    return (
+        cpu_times.user
+        + cpu_times.system
+        + cpu_times.children_user
+        + cpu_times.children_system
+    )
+
+
+def _measurement_file(task_name, directory=None):
+    directory = MEASUREMENT_DIR if directory is None else directory
+    return directory / f"{quote(task_name, safe='')}.json"
+
+
+def save_measurement(task_name, measurement, directory=None):
+    """Save the resource usage of a task until it is added to the ledger, see
+    :func:`pop_measurement`. Tasks can be executed in other processes than
+    the reporter.
+
+    Parameters
+    ----------
+    task_name : str
+    measurement : dict
+        Resource usage, see :meth:`MeasuredAction.measure`
+    directory : PosixPath or None
+        Default: :attr:`MEASUREMENT_DIR`
+
+    Returns
+    -------
+
+    """
+    file = _measurement_file(task_name, directory)
+    os.makedirs(file.parent, exist_ok=True)
+    tmp_file = file.with_name(f".{file.name}.{os.getpid()}")
+    with open(tmp_file, "w") as f:
+        json.dump(measurement, f)
+    os.replace(tmp_file, file)
+
+
+def pop_measurement(task_name, directory=None):
+    """Resource usage saved for a task by :func:`save_measurement`, which is
+    removed.
+
+    Returns
+    -------
+    dict
+        Empty if no measurement was saved
+    """
+    file = _measurement_file(task_name, directory)
+    try:
+        with open(file) as f:
+            measurement = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+    file.unlink(missing_ok=True)
+    return measurement
+
+
+class MeasuredAction:
+    """Task action measuring wall time, cpu time, peak memory and solver
+    time of the process executing it. The result of the action is returned
+    unchanged. The measurement is saved by :func:`save_measurement` and
+    written to the ledger by :class:`LedgerReporterMixin`.
+
+    Cpu time of child processes is included after they are joined, solver
+    time only if the solver runs in the process executing the action.
+
+    Parameters
+    ----------
+    func : callable
+        Action of the task
+
+    """
+
+    def __init__(self, func):
+        self.func = func
+        # signature, name and module of func for doit and the schedulers
+        update_wrapper(self, func)
+
+    @property
+    def __signature__(self):
+        # doit passes the task to actions with a task parameter
+        signature = inspect.signature(self.func)
+        if "task" in signature.parameters:
+            return signature
+        parameters = list(signature.parameters.values())
+        position = len(parameters)
+        if parameters and parameters[-1].kind == parameters[-1].VAR_KEYWORD:
+            position -= 1
+        parameters.insert(
+            position, inspect.Parameter("task", inspect.Parameter.KEYWORD_ONLY)
+        )
+        return signature.replace(parameters=parameters)
+
+    def measure(self, *args, **kwargs):
+        """Execute the action and measure its resources.
+
+        Returns
+        -------
+        tuple
+            Result of the action and dict of its resource usage
+        """
+        process = psutil.Process(os.getpid())
+        start_cpu = _cpu_time(process)
+        start_solver = _solver_time
+        start = time.perf_counter()
+        with PeakMemory() as memory:
+            result = self.func(*args, **kwargs)
+        measurement = {
+            "wall_time": time.perf_counter() - start,
+            "cpu_time": _cpu_time(process) - start_cpu,
+            "peak_rss": memory.peak / 2**20,
+            "solver_time": _solver_time - start_solver,
+        }
+        return result, measurement
+
+    def __call__(self, *args, **kwargs):
+        if "task" in inspect.signature(self.func).parameters:
+            task = kwargs.get("task")
+        else:
+            task = kwargs.pop("task", None)
+        result, measurement = self.measure(*args, **kwargs)
+        if task is not None:
+            save_measurement(task.name, measurement)
+        return result
+
+
+def measure_resources(func):
+    """Task action measuring its resources, see :class:`MeasuredAction`."""
+    return MeasuredAction(func)
+
+
+class RuntimeLedger:
+    """SQLite ledger of the runtime and memory of pipeline tasks keyed by
+    run_id and version.
+
+    Parameters
+    ----------
+    file : PosixPath
+        Default: results_dir / 'ledger.sqlite'
+    timeout : float
+        Seconds to wait for the lock of another process (default=60)
+
+    """
+
+    def __init__(self, file=LEDGER_FILE, timeout=60):
+        self.file = file
+        self.timeout = timeout
+
+    def _connect(self):
+        connection = sqlite3.connect(self.file, timeout=self.timeout)
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS tasks ("
+            "run_id TEXT, version INTEGER, task TEXT, status TEXT, "
+            "start TEXT, wall_time REAL, cpu_time REAL, peak_rss REAL, "
+            "solver_time REAL)"
+        )
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS tasks_run ON tasks (run_id, version)"
+        )
+        return connection
+
+    def exists(self):
+        return self.file.is_file()
+
+    def add(self, records):
+        """Add records of tasks.
+
+        Parameters
+        ----------
+        records : list of dict
+            Dictionaries with the keys of :attr:`COLUMNS`, missing values
+            are None
+
+        Returns
+        -------
+
+        """
+        rows = [
+            tuple(record.get(column) for column in COLUMNS)
+            for record in records
+        ]
+        os.makedirs(self.file.parent, exist_ok=True)
+        with closing(self._connect()) as connection, connection:
+            connection.executemany(
+                f"INSERT INTO tasks VALUES ({', '.join('?' * len(COLUMNS))})",
+                rows,
+            )
+
+    def query(self, run_id=None, version=None, status=None):
+        """Records of the tasks, all records if no value is given.
+
+        Parameters
+        ----------
+        run_id : str, optional
+        version : int, optional
+        status : str, optional
+            'success' or 'fail'
+
+        Returns
+        -------
+        pd.DataFrame
+            Records with columns :attr:`COLUMNS` in order of their start
+        """
+        if not self.exists():
+            return pd.DataFrame(columns=COLUMNS)
+        filters = {"run_id": run_id, "version": version, "status": status}
+        filters = {k: v for k, v in filters.items() if v is not None}
+        conditions = [f"{key} = ?" for key in filters]
+        params = list(filters.values())
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        with closing(self._connect()) as connection:
+            return pd.read_sql_query(
+                f"SELECT * FROM tasks{where} ORDER BY start",
+                connection,
+                params=params,
+            )
+
+    def summary(self, run_id=None, version=None):
+        """Resource usage per task group, e.g. 'min_pot'.
+
+        Parameters
+        ----------
+        run_id : str, optional
+        version : int, optional
+
+        Returns
+        -------
+        pd.DataFrame
+            Number of tasks and failures, total and maximum wall time, total
+            cpu and solver time and the maximum peak memory per group
+        """
+        df = self.query(run_id=run_id, version=version)
+        df["group"] = df["task"].str.split(":").str[0]
+        df["failed"] = df["status"] != "success"
+        return df.groupby(["run_id", "version", "group"]).agg(
+            tasks=("task", "count"),
+            failed=("failed", "sum"),
+            wall_time=("wall_time", "sum"),
+            max_wall_time=("wall_time", "max"),
+            cpu_time=("cpu_time", "sum"),
+            solver_time=("solver_time", "sum"),
+            peak_rss=("peak_rss", "max"),
+        )
+
+    def latest_runtimes(self):
+        """Wall time in seconds of the latest successful run of each task.
+
+        Returns
+        -------
+        dict
+        """
+        df = self.query(status="success")
+        return df.groupby("task")["wall_time"].last().dropna().to_dict()
+
+
+class LedgerReporterMixin:
+    """Mixin of doit reporters which writes the runtime and memory of every
+    executed task to the :class:`RuntimeLedger`.
+
+    Wall time is measured by the reporter. Cpu time, peak memory and solver
+    time are taken from the measurement of actions decorated with
+    :func:`measure_resources`, see :func:`pop_measurement`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ledger = RuntimeLedger()
+        self.ledger_start = {}
+        self.ledger_version = {"run_id": None, "version": None}
+
+    def initialize(self, tasks, selected_tasks):
+        super().initialize(tasks, selected_tasks)
+        version_db = doit.Globals.dep_manager.get_result("_set_opt_version")
+        if isinstance(version_db, dict) and "current" in version_db:
+            self.ledger_version = version_db["current"]
+
+    def execute_task(self, task):
+        super().execute_task(task)
+        if task.actions:
+            self.ledger_start[task.name] = (
+                datetime.now(),
+                time.perf_counter(),
+            )
+
+    def _add_to_ledger(self, task, status):
+        # ignore private tasks and tasks without actions
+        if task.name not in self.ledger_start or task.name[0] == "_":
+            return
+        start, start_counter = self.ledger_start.pop(task.name)
+        record = {
+            "task": task.name,
+            "status": status,
+            "start": start.isoformat(timespec="seconds"),
+            "wall_time": time.perf_counter() - start_counter,
+            **self.ledger_version,
+        }
+        # measurement of the process executing the task if available
+        record.update(pop_measurement(task.name))
+        try:
+            self.ledger.add([record])
+        except sqlite3.Error as e:
+            logger.warning(f"Task {task.name} not added to ledger: {e}")
+
+    def add_success(self, task):
+        super().add_success(task)
+        self._add_to_ledger(task, "success")
+
+    def add_failure(self, task, fail):
+        super().add_failure(task, fail)
+        self._add_to_ledger(task, "fail")
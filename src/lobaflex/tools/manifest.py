@@ -0,0 +1,490 @@
+import hashlib
+import logging
+import sqlite3
+
+from contextlib import closing, contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+from lobaflex import config_dir, results_dir
+from lobaflex.tools.tools import get_config
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.sqlite"
+
+# kinds of result files, results per iteration (csv), parts of iterations
+# (parquet) and concatenated results of all feeders of a grid
+RESULT_KINDS = ("iteration", "part", "concat")
+
+COLUMNS = [
+    "file",
+    "grid",
+    "feeder",
+    "objective",
+    "parameter",
+    "iteration",
+    "kind",
+    "size",
+    "mtime_ns",
+    "checksum",
+]
+
+# changes of the manifests are recorded instead of written while set, see
+# :func:`record_manifest_changes`
+_recorded_changes = None
+
+
+def file_checksum(file, chunk_size=2**20):
+    """MD5 checksum of a file."""
+    checksum = hashlib.md5()
+    with open(file, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            checksum.update(chunk)
+    return checksum.hexdigest()
+
+
+def get_objective(file, root):
+    """Objective of a result file, the directory above the 'results' or
+    'concat' directory, e.g. `<grid>/<objective>/results/<feeder>/<file>`.
+
+    Parameters
+    ----------
+    file : str or PosixPath
+    root : str or PosixPath
+        Root of the results tree, e.g. results_dir / run_id
+
+    Returns
+    -------
+    str or None
+    """
+    parts = Path(file).resolve().relative_to(Path(root).resolve()).parts[:-1]
+    for i in reversed(range(1, len(parts))):
+        if parts[i] in ("results", "concat"):
+            return parts[i - 1]
+    return parts[-1] if parts else None
+
+
+def get_manifest_root(path):
+    """Root of the results tree of path. Results in results_dir are indexed
+    per run id, e.g. results_dir / run_id.
+
+    Parameters
+    ----------
+    path : str or PosixPath
+
+    Returns
+    -------
+    PosixPath or None
+        None if the path is not in a run directory of results_dir
+    """
+    try:
+        relative = Path(path).resolve().relative_to(results_dir.resolve())
+    except ValueError:
+        return None
+    if not relative.parts:
+        return None
+    return results_dir.resolve() / relative.parts[0]
+
+
+class ResultManifest:
+    """SQLite index of the result files of one results tree.
+
+    The exporters record every result file with grid, feeder, objective,
+    parameter, iteration, kind, size and modification time, so result files
+    can be looked up without walking the results tree. Paths are stored
+    relative to the root of the tree. Checksums are only computed on
+    request, see :meth:`update_checksums`.
+
+    The modification times of the directories of the files are recorded,
+    too. Adding or removing a file changes the modification time of its
+    directory, so :meth:`is_current` detects files changed without the
+    manifest by a stat of the recorded directories.
+
+    Parameters
+    ----------
+    root : PosixPath
+        Root of the results tree, the manifest is stored in it
+    timeout : float
+        Seconds to wait for the lock of another process (default=60)
+
+    """
+
+    def __init__(self, root, timeout=60):
+        self.root = Path(root)
+        self.file = self.root / MANIFEST_NAME
+        self.timeout = timeout
+
+    def _connect(self):
+        connection = sqlite3.connect(self.file, timeout=self.timeout)
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "path TEXT PRIMARY KEY, grid TEXT, feeder TEXT, objective TEXT, "
+            "parameter TEXT, iteration INTEGER, kind TEXT, size INTEGER, "
+            "mtime_ns INTEGER, checksum TEXT)"
+        )
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS directories ("
+            "path TEXT PRIMARY KEY, mtime_ns INTEGER)"
+        )
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS results_parameter "
+            "ON results (parameter)"
+        )
+        return connection
+
+    def _relative(self, path):
+        return Path(path).resolve().relative_to(self.root.resolve()).as_posix()
+
+    def exists(self):
+        return self.file.is_file()
+
+    def _directories(self, files):
+        """Directories of the files and their parents below the root. The
+        root holds the manifest itself and is therefore excluded."""
+        root = self.root.resolve()
+        directories = set()
+        for file in files:
+            for parent in Path(file).resolve().parents:
+                if parent == root or root not in parent.parents:
+                    break
+                directories.add(parent)
+        return directories
+
+    def add(self, records):
+        """Add or replace result files. Size and modification time are
+        determined from the files, the modification time of their
+        directories is recorded, see :meth:`is_current`.
+
+        Parameters
+        ----------
+        records : list of dict
+            Dictionaries with keys file, grid, feeder, parameter, iteration
+            and kind
+
+        Returns
+        -------
+
+        """
+        rows = [
+            (
+                self._relative(record["file"]),
+                str(record["grid"]),
+                record.get("feeder"),
+                get_objective(record["file"], self.root),
+                record["parameter"],
+                record.get("iteration"),
+                record["kind"],
+                *self._stat(record["file"]),
+                None,
+            )
+            for record in records
+        ]
+        directories = [
+            (self._relative(directory), directory.stat().st_mtime_ns)
+            for directory in self._directories(
+                record["file"] for record in records
+            )
+        ]
+        self.root.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as connection, connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO results VALUES "
+                "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            connection.executemany(
+                "INSERT OR REPLACE INTO directories VALUES (?, ?)",
+                directories,
+            )
+        logger.debug(f"Added {len(rows)} files to {self.file}.")
+
+    @staticmethod
+    def _stat(file):
+        stat = Path(file).stat()
+        return stat.st_size, stat.st_mtime_ns
+
+    def _where(self, path=None, include_path=False, **filters):
+        """SQL condition and parameters of a query."""
+        conditions, params = [], []
+        if path is not None:
+            relative = self._relative(path)
+            if relative != ".":
+                # range of all paths in directory, uses the primary key index
+                condition = "path >= ? AND path < ?"
+                params += [relative + "/", relative + "0"]
+                if include_path:
+                    # the directory itself, e.g. of the recorded directories
+                    condition = f"(path = ? OR {condition})"
+                    params = params[:-2] + [relative] + params[-2:]
+                conditions.append(condition)
+        for column, value in filters.items():
+            if value is None:
+                continue
+            values = [value] if isinstance(value, (str, int)) else list(value)
+            conditions.append(f"{column} IN ({', '.join('?' * len(values))})")
+            params += [str(v) if column == "grid" else v for v in values]
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        return where, params
+
+    def query(
+        self,
+        path=None,
+        grid=None,
+        feeder=None,
+        objective=None,
+        parameter=None,
+        iteration=None,
+        kind=None,
+    ):
+        """Result files in path matching all given values. Every value can
+        be a single value or a list of values.
+
+        Parameters
+        ----------
+        path : str or PosixPath or None
+            Directory the files are in. If None, all files are selected.
+        grid : int or str or list, optional
+        feeder : str or list, optional
+        objective : str or list, optional
+        parameter : str or list, optional
+        iteration : int or list, optional
+        kind : str or list, optional
+            See :attr:`RESULT_KINDS`
+
+        Returns
+        -------
+        pd.DataFrame
+            Files with absolute path in column file and the recorded values
+            in the other columns, sorted by path
+        """
+        if not self.exists():
+            return pd.DataFrame(columns=COLUMNS)
+
+        where, params = self._where(
+            path,
+            grid=grid,
+            feeder=feeder,
+            objective=objective,
+            parameter=parameter,
+            iteration=iteration,
+            kind=kind,
+        )
+        with closing(self._connect()) as connection:
+            df = pd.read_sql_query(
+                f"SELECT * FROM results{where} ORDER BY path",
+                connection,
+                params=params,
+            )
+        df.insert(0, "file", [str(self.root.resolve() / p) for p in df.path])
+        return df.drop(columns="path")
+
+    def remove(self, path):
+        """Remove all result files in path, e.g. before the results of a
+        feeder are computed again.
+
+        Parameters
+        ----------
+        path : str or PosixPath
+            Directory of the files
+
+        Returns
+        -------
+
+        """
+        if not self.exists():
+            return
+        where, params = self._where(path)
+        directories_where, directories_params = self._where(
+            path, include_path=True
+        )
+        # parents aren't current anymore until files are added again
+        parents = [
+            (self._relative(directory),)
+            for directory in self._directories([Path(path) / "_"])
+        ]
+        with closing(self._connect()) as connection, connection:
+            connection.execute(f"DELETE FROM results{where}", params)
+            connection.execute(
+                f"DELETE FROM directories{directories_where}",
+                directories_params,
+            )
+            connection.executemany(
+                "DELETE FROM directories WHERE path = ?", parents
+            )
+
+    def is_current(self, path):
+        """Check if the manifest lists all result files in path. The
+        recorded directories in path are compared with their modification
+        time, so no files are read or listed.
+
+        Parameters
+        ----------
+        path : str or PosixPath
+            Directory of the files
+
+        Returns
+        -------
+        bool
+            False if no directory in path is recorded or a recorded
+            directory was changed or removed since it was recorded
+        """
+        if not self.exists():
+            return False
+        where, params = self._where(path, include_path=True)
+        with closing(self._connect()) as connection:
+            directories = connection.execute(
+                f"SELECT path, mtime_ns FROM directories{where}", params
+            ).fetchall()
+        if not directories:
+            return False
+        for directory, mtime_ns in directories:
+            try:
+                current = (self.root / directory).stat().st_mtime_ns
+            except FileNotFoundError:
+                return False
+            if current != mtime_ns:
+                logger.debug(f"{directory} changed since it was recorded.")
+                return False
+        return True
+
+    def update_checksums(self, path=None):
+        """Compute the checksums of the result files in path which have no
+        checksum yet or were changed since it was computed.
+
+        Parameters
+        ----------
+        path : str or PosixPath or None
+            Directory of the files. If None, all files are selected.
+
+        Returns
+        -------
+        int
+            Number of computed checksums
+        """
+        if not self.exists():
+            return 0
+        where, params = self._where(path)
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                f"SELECT path, size, mtime_ns, checksum FROM results{where}",
+                params,
+            ).fetchall()
+        updates = []
+        for relative, size, mtime_ns, checksum in rows:
+            file = self.root / relative
+            if not file.is_file():
+                continue
+            stat = self._stat(file)
+            if checksum is None or stat != (size, mtime_ns):
+                updates.append((*stat, file_checksum(file), relative))
+        with closing(self._connect()) as connection, connection:
+            connection.executemany(
+                "UPDATE results SET size = ?, mtime_ns = ?, checksum = ? "
+                "WHERE path = ?",
+                updates,
+            )
+        return len(updates)
+
+
+class ManifestRecorder(ResultManifest):
+    """Manifest which records added and removed files instead of writing
+    them, e.g. in work queue workers on other nodes. The changes are applied
+    by :func:`apply_manifest_changes`. Queries read the manifest.
+
+    Parameters
+    ----------
+    root : PosixPath
+        Root of the results tree
+    changes : list
+        Recorded changes, appended in place
+
+    """
+
+    def __init__(self, root, changes):
+        super().__init__(root)
+        self.changes = changes
+
+    def add(self, records):
+        self.changes.append(
+            {
+                "root": str(self.root),
+                "add": [
+                    {**record, "file": str(record["file"])}
+                    for record in records
+                ],
+            }
+        )
+
+    def remove(self, path):
+        self.changes.append({"root": str(self.root), "remove": str(path)})
+
+
+@contextmanager
+def record_manifest_changes():
+    """Context in which the manifests given by :func:`get_manifest` record
+    their changes instead of writing them, see :class:`ManifestRecorder`.
+
+    Yields
+    ------
+    list
+        Recorded changes
+    """
+    global _recorded_changes
+    _recorded_changes = []
+    try:
+        yield _recorded_changes
+    finally:
+        _recorded_changes = None
+
+
+def apply_manifest_changes(changes):
+    """Write the changes recorded by :class:`ManifestRecorder`."""
+    for change in changes:
+        manifest = ResultManifest(change["root"])
+        if "add" in change:
+            manifest.add(change["add"])
+        else:
+            manifest.remove(change["remove"])
+
+
+def get_manifest(path, create=False):
+    """Manifest of the results tree of path.
+
+    Parameters
+    ----------
+    path : str or PosixPath
+        Path in the results tree
+    create : bool
+        If True, the manifest is given even if it doesn't exist yet, e.g. to
+        add files (default=False).
+
+    Returns
+    -------
+    :class:`ResultManifest` or None
+        :class:`ManifestRecorder` while changes are recorded. None if
+        manifests are disabled by the config value `result_manifest`,
+        the path is not in a run directory of results_dir or the manifest
+        doesn't exist and create is False.
+    """
+    cfg_o = get_config(path=config_dir / ".opt.yaml")
+    if not cfg_o["result_manifest"]:
+        return None
+    root = get_manifest_root(path)
+    if root is None:
+        return None
+    if _recorded_changes is None:
+        manifest = ResultManifest(root)
+    else:
+        manifest = ManifestRecorder(root, _recorded_changes)
+    if create or manifest.exists():
+        return manifest
+    return None
+
+
+def remove_from_manifest(path):
+    """Remove all result files in path from its manifest if it exists."""
+    manifest = get_manifest(path)
+    if manifest is not None:
+        manifest.remove(path)
@@ -0,0 +1,217 @@
+import hashlib
+import logging
+import os
+
+from collections import OrderedDict
+from copy import deepcopy
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from lobaflex import config_dir
+from lobaflex.tools.tools import get_config
+
+logger = logging.getLogger(__name__)
+
+
+def get_dump_fingerprint(path):
+    """Fingerprint of all files in a directory by their relative path, size
+    and modification time. Rewritten files change the fingerprint without
+    reading them.
+
+    Parameters
+    ----------
+    path : str or PosixPath
+
+    Returns
+    -------
+    str or None
+        Hex digest or None if the directory doesn't exist
+    """
+    path = Path(path)
+    if not path.is_dir():
+        return None
+    hasher = hashlib.sha256()
+    for directory, _, files in sorted(os.walk(path)):
+        for file in sorted(files):
+            file_path = Path(directory) / file
+            stat = file_path.stat()
+            hasher.update(
+                f"{file_path.relative_to(path)}:{stat.st_size}:"
+                f"{stat.st_mtime_ns};".encode()
+            )
+    return hasher.hexdigest()
+
+
+def estimate_size(obj, max_depth=4):
+    """Estimate the memory of an object by the pandas and numpy data it
+    references through attributes, dictionaries and lists.
+
+    Parameters
+    ----------
+    obj : object
+    max_depth : int
+        Maximum depth of references followed (default=4)
+
+    Returns
+    -------
+    int
+        Size in bytes
+    """
+    visited = set()
+
+    def size(obj, depth):
+        if id(obj) in visited or depth > max_depth:
+            return 0
+        visited.add(id(obj))
+        if isinstance(obj, pd.Index):
+            return obj.memory_usage()
+        if isinstance(obj, (pd.DataFrame, pd.Series)):
+            usage = obj.memory_usage(index=True)
+            return int(usage.sum() if hasattr(usage, "sum") else usage)
+        if isinstance(obj, np.ndarray):
+            return obj.nbytes
+        if isinstance(obj, dict):
+            values = obj.values()
+        elif isinstance(obj, (list, tuple)):
+            values = obj
+        elif hasattr(obj, "__dict__") and not isinstance(obj, type):
+            values = vars(obj).values()
+        else:
+            return 0
+        return sum(size(value, depth + 1) for value in values)
+
+    return size(obj, 0)
+
+
+class ObjectCache:
+    """Least recently used cache of objects imported from or saved to a
+    directory, e.g. edisgo objects handed over between pipeline tasks in one
+    process. Entries are valid as long as the fingerprint of the directory
+    is unchanged, see :func:`get_dump_fingerprint`.
+
+    Objects are copied on :meth:`put` and :meth:`get`, so tasks can change
+    them without changing the cache. An entry can be stored with a key
+    describing its content, e.g. the components saved with an edisgo
+    object, and is only given for the same key.
+
+    Parameters
+    ----------
+    max_bytes : int
+        Memory budget of all cached objects, see :func:`estimate_size`
+
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _key(path):
+        return str(Path(path).resolve())
+
+    def get(self, path, key=None):
+        """Copy of the object cached for path if the directory is unchanged.
+
+        Parameters
+        ----------
+        path : str or PosixPath
+        key : hashable or None
+            Key of the content the object was cached with
+
+        Returns
+        -------
+        object or None
+        """
+        entry = self._entries.get(self._key(path))
+        if entry is None:
+            return None
+        fingerprint, obj, _, content_key = entry
+        if content_key != key:
+            logger.debug(f"Cached object of {path} has different content.")
+            return None
+        if fingerprint != get_dump_fingerprint(path):
+            logger.debug(f"Cached object of {path} is outdated.")
+            self.remove(path)
+            return None
+        self._entries.move_to_end(self._key(path))
+        logger.debug(f"Take object of {path} from cache.")
+        return deepcopy(obj)
+
+    def put(self, path, obj, key=None):
+        """Cache a copy of the object for path. Least recently used objects
+        are dropped until the object fits in the memory budget.
+
+        Parameters
+        ----------
+        path : str or PosixPath
+            Directory the object was imported from or saved to
+        obj : object
+        key : hashable or None
+            Key of the content, see :meth:`get`
+
+        Returns
+        -------
+        object or None
+            Cached copy of the object or None if it exceeds the memory
+            budget
+        """
+        self.remove(path)
+        # size of the original, so objects exceeding the budget aren't copied
+        size = estimate_size(obj)
+        if size > self.max_bytes:
+            logger.debug(
+                f"Object of {path} with {size / 2**20:.0f} MB exceeds the "
+                "object cache."
+            )
+            return None
+        obj = deepcopy(obj)
+        while self._size + size > self.max_bytes:
+            _, (_, _, dropped_size, _) = self._entries.popitem(last=False)
+            self._size -= dropped_size
+        self._entries[self._key(path)] = (
+            get_dump_fingerprint(path),
+            obj,
+            size,
+            key,
+        )
+        self._size += size
+        return obj
+
+    def remove(self, path):
+        entry = self._entries.pop(self._key(path), None)
+        if entry is not None:
+            self._size -= entry[2]
+
+    def clear(self):
+        self._entries.clear()
+        self._size = 0
+
+
+_object_cache = None
+
+
+def get_object_cache():
+    """Object cache of the process with the memory budget of the config
+    value `object_cache_mb`.
+
+    Returns
+    -------
+    :class:`ObjectCache` or None
+        None if the budget is 0, the default. The cache holds a copy of
+        every saved object, so it is opt-in for runs with spare memory.
+    """
+    global _object_cache
+    cfg_o = get_config(path=config_dir / ".opt.yaml")
+    max_bytes = int(cfg_o["object_cache_mb"] * 2**20)
+    if max_bytes <= 0:
+        return None
+    if _object_cache is None:
+        _object_cache = ObjectCache(max_bytes)
+    _object_cache.max_bytes = max_bytes
+    return _object_cache
@@ -6,10 +6,10 @@ import pandas as pd
 import plotly.graph_objs as go
 import plotly.io as pio
 
-from edisgo.edisgo import import_edisgo_from_files
 from plotly.subplots import make_subplots
 import plotly.express as px
-from lobaflex.tools.tools import get_files_in_subdirs
+from lobaflex.tools.result_store import find_result_files, read_result_file
+from lobaflex.tools.snapshot import load_edisgo
 
 # comment to make plots interactive
 # pio.renderers.default = "svg"
@@ -103,8 +103,9 @@ def get_all_attribute_values_for_keyword(results_path, keyword):
 
     data = dict().fromkeys(objectives)
 
-    list_of_results = get_files_in_subdirs(path=results_path, pattern="*.csv")
-    selected_list = [i for i in list_of_results if "concat" in i]
+    selected_list = find_result_files(
+        results_path, kind="concat"
+    ).file.tolist()
 
     if "initial" in keyword:
         keyword_files = [i for i in selected_list if keyword in i]
@@ -121,8 +122,8 @@ def get_all_attribute_values_for_keyword(results_path, keyword):
 
         obj_dict = {}
         for i, file in enumerate(files):
-            attr = re.findall(rf"{keyword}_(.*).csv", file)[0]
-            df = pd.read_csv(file, index_col=0, parse_dates=True)
+            attr = re.findall(rf"{keyword}_(.*)\.(?:csv|parquet)", file)[0]
+            df = read_result_file(file)
             df = df.sum(axis=1).rename(f"{keyword} {attr} [MW]")
             obj_dict[attr] = df
         data[obj] = obj_dict
@@ -153,8 +154,9 @@ def plot_all_attributes_for_keyword(
     -------
 
     """
-    list_of_results = get_files_in_subdirs(path=results_path, pattern="*.csv")
-    selected_list = [i for i in list_of_results if "concat" in i]
+    selected_list = find_result_files(
+        results_path, kind="concat"
+    ).file.tolist()
 
     if edisgo_obj is not None:
 
@@ -245,8 +247,8 @@ def plot_all_attributes_for_keyword(
                 continue
 
             for i, file in enumerate(files):
-                attr = re.findall(rf"{keyword}_(.*).csv", file)[0]
-                df = pd.read_csv(file, index_col=0, parse_dates=True)
+                attr = re.findall(rf"{keyword}_(.*)\.(?:csv|parquet)", file)[0]
+                df = read_result_file(file)
                 df = df.sum(axis=1).rename(f"{keyword} {attr} [MW]")
 
                 if timeframe is None:
@@ -360,8 +362,9 @@ def heatmap_energy_level(results_path, keyword, edisgo_obj=None, title=None):
     -------
 
     """
-    list_of_results = get_files_in_subdirs(path=results_path, pattern="*.csv")
-    selected_list = [i for i in list_of_results if "concat" in i]
+    selected_list = find_result_files(
+        results_path, kind="concat"
+    ).file.tolist()
     keyword_files = [
         i for i in selected_list if keyword in i and "slack_initial" not in i
     ]
@@ -371,7 +374,10 @@ def heatmap_energy_level(results_path, keyword, edisgo_obj=None, title=None):
 
     else:
 
-        pattern = rf"potential/\w+/(.*)/concat/\d+_energy_level_(.*).csv"
+        pattern = (
+            rf"potential/\w+/(.*)/concat/\d+_energy_level_(.*)"
+            r"\.(?:csv|parquet)"
+        )
         keys = [re.search(pattern, string=i).groups() for i in keyword_files]
 
         files = pd.DataFrame(
@@ -390,8 +396,8 @@ def heatmap_energy_level(results_path, keyword, edisgo_obj=None, title=None):
 
         traces = []
         for i, file in enumerate(files.index):
-            attr = re.findall(rf"{keyword}_(.*).csv", file)[0]
-            df = pd.read_csv(file, index_col=0, parse_dates=True)
+            attr = re.findall(rf"{keyword}_(.*)\.(?:csv|parquet)", file)[0]
+            df = read_result_file(file)
             df = df.sum(axis=1).rename(f"{keyword} {attr} [MW]")
 
             # correct values to first timestep of lower band
@@ -598,7 +604,7 @@ def plot_scenario_potential(
 
     # #     # add opt disptach
     # # import opimized grid
-    edisgo_obj = import_edisgo_from_files(
+    edisgo_obj = load_edisgo(
         potential_path.parent / "minimize_loading" / "mvgd",
         import_topology=True,
         import_timeseries=True,
@@ -640,9 +646,9 @@ def plot_scenario_potential(
         for i, scenario in enumerate(scenarios):
             scenario_path = potential_path / scenario / objective / "concat"
             if os.path.isdir(scenario_path):
-                files_in_path = get_files_in_subdirs(
-                    path=scenario_path, pattern="*.csv"
-                )
+                files_in_path = find_result_files(
+                    scenario_path, kind="concat"
+                ).file.tolist()
 
                 keyword_files = [
                     i
@@ -655,8 +661,8 @@ def plot_scenario_potential(
                 if len(file) == 0:
                     continue
                 file = file[0]
-                attr = re.findall(rf"{keyword}_(.*).csv", file)[0]
-                df = pd.read_csv(file, index_col=0, parse_dates=True)
+                attr = re.findall(rf"{keyword}_(.*)\.(?:csv|parquet)", file)[0]
+                df = read_result_file(file)
                 df = df.sum(axis=1).rename(f"{keyword} {attr} [MW]")
                 df = df.loc[timeframe]
 
@@ -769,7 +775,7 @@ def plot_compare_optimization_to_reference(grid_path, timeframe):
 
     """
     # import opimized grid
-    edisgo_obj = import_edisgo_from_files(
+    edisgo_obj = load_edisgo(
         grid_path / "minimize_loading" / "mvgd",
         import_topology=True,
         import_timeseries=True,
@@ -806,7 +812,7 @@ def plot_compare_optimization_to_reference(grid_path, timeframe):
     #    ev_optimized = ev_optimized + hp_optimized.values
     hp_optimized = hp_optimized + ev_optimized.values
     # import reference grid
-    edisgo_obj = import_edisgo_from_files(
+    edisgo_obj = load_edisgo(
         grid_path / "initial" / "mvgd",
         import_topology=False,
         import_timeseries=True,
@@ -1213,7 +1219,7 @@ def get_all_reinforcement_measures(grid_path):
             continue
         if len(os.listdir(edisgo_path)) == 0:
             continue
-        edisgo_obj = import_edisgo_from_files(
+        edisgo_obj = load_edisgo(
                edisgo_path,
                import_topology=False,
                import_timeseries=False,
@@ -1295,9 +1301,9 @@ def get_power_diff(grid_path, timeframe, technology=["hp", "ev"]):
             file_path = scenario_path / objective / "concat"
             if len(os.listdir(file_path)) == 0:
                 continue
-            files_in_path = get_files_in_subdirs(
-                path=file_path, pattern="*.csv"
-            )
+            files_in_path = find_result_files(
+                file_path, kind="concat"
+            ).file.tolist()
 
             # filter for keyword
             keyword_files = [
@@ -1310,7 +1316,7 @@ def get_power_diff(grid_path, timeframe, technology=["hp", "ev"]):
 
                 # filter for technology
                 file = [i for i in keyword_files if tech in i]
-                df = pd.read_csv(file[0], index_col=0, parse_dates=True)
+                df = read_result_file(file[0])
                 
                 if "ev" in tech:
                     ts = ts + df.loc[timeframe].sum(axis=1)
@@ -1342,7 +1348,7 @@ def plot_power_potential(grid_path, timeframe, technology=["hp", "ev"]):
     fig = go.Figure()
 
     # import opimized grid
-    edisgo_obj = import_edisgo_from_files(
+    edisgo_obj = load_edisgo(
         grid_path / "minimize_loading" / "mvgd",
         import_topology=True,
         import_timeseries=False,
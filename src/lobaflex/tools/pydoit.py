@@ -1,11 +1,22 @@
+import fnmatch
+import hashlib
+import importlib.metadata
+import json
 import logging
 import os
+import sys
 
 from datetime import datetime
+from pathlib import Path
 
 import doit
+import pandas as pd
+
+import lobaflex
 
 from lobaflex import config_dir, results_dir
+from lobaflex.tools.ledger import RuntimeLedger
+from lobaflex.tools.manifest import file_checksum
 from lobaflex.tools.tools import (
     dump_yaml,
     get_config,
@@ -15,6 +26,14 @@ from lobaflex.tools.tools import (
 
 logger = logging.getLogger(__name__)
 
+# files derived from the inputs by the tasks themselves, e.g. the cached
+# downstream nodes matrix next to the feeder dumps
+DERIVED_FILES = ("downstream_nodes_matrix_*.npz",)
+
+# sources of the actions, see :func:`get_source_version`
+SOURCE_DIR = Path(lobaflex.__file__).parent
+_source_checksums = {}
+
 
 def task__split_model_config_in_subconfig():
     """This body is always executed to keep the respective configs uptodate"""
@@ -147,6 +166,141 @@ def opt_uptodate(task):
         return False
 
 
+def get_source_checksum(file):
+    """Checksum of a source file, reused while its size and modification
+    time are unchanged."""
+    stat = file.stat()
+    saved = _source_checksums.get(file)
+    if saved is None or saved[:2] != (stat.st_size, stat.st_mtime_ns):
+        saved = (stat.st_size, stat.st_mtime_ns, file_checksum(file))
+        _source_checksums[file] = saved
+    return saved[2]
+
+
+def get_source_version(functions):
+    """Version of the lobaflex distribution and checksum of all source files
+    of the lobaflex package, so changes of modules called by the actions
+    re-run the tasks, too. Modules of functions outside of the package are
+    included.
+
+    Parameters
+    ----------
+    functions : list of callable
+
+    Returns
+    -------
+    str
+    """
+    try:
+        version = importlib.metadata.version("lobaflex")
+    except importlib.metadata.PackageNotFoundError:
+        version = "unknown"
+    files = set(SOURCE_DIR.rglob("*.py"))
+    files |= {
+        Path(sys.modules[function.__module__].__file__)
+        for function in functions
+        if getattr(sys.modules.get(function.__module__), "__file__", None)
+    }
+    checksums = [
+        f"{file.name}:{get_source_checksum(file)}" for file in sorted(files)
+    ]
+    return ":".join([version] + checksums)
+
+
+class content_uptodate:
+    """doit uptodate check by the content of the task inputs.
+
+    The task is uptodate if the checksum of the input files, the config
+    values and the source version didn't change since its last successful
+    run. The checksum is saved in the doit dep DB after the task ran, so
+    files written into the inputs by the task itself are included. The
+    checksums of the single files are saved with their size and modification
+    time and only files with changed size or modification time are read
+    again.
+
+    Parameters
+    ----------
+    paths : list of str or PosixPath
+        Input files or directories
+    config_keys : list of str
+        Keys of the opt config the task depends on. The run_id and version
+        are always included, so bumping the version still re-runs the task.
+    functions : list of callable
+        Actions of the task, see :func:`get_source_version`
+    exclude : tuple of str
+        Patterns of file names derived by the tasks, see
+        :attr:`DERIVED_FILES`
+
+    """
+
+    def __init__(
+        self, paths, config_keys=(), functions=(), exclude=DERIVED_FILES
+    ):
+        self.paths = [Path(path) for path in paths]
+        self.config_keys = list(config_keys)
+        self.functions = list(functions)
+        self.exclude = exclude
+        self.files = {}
+
+    def configure_task(self, task):
+        task.value_savers.append(self.save_values)
+
+    def get_files(self, saved_files):
+        """Checksums of all input files, reuses the saved checksums of
+        unchanged files."""
+        files = {}
+        for path in self.paths:
+            if path.is_file():
+                candidates = [path]
+            elif path.is_dir():
+                candidates = sorted(p for p in path.rglob("*") if p.is_file())
+            else:
+                candidates = []
+            for file in candidates:
+                if any(fnmatch.fnmatch(file.name, p) for p in self.exclude):
+                    continue
+                stat = file.stat()
+                saved = saved_files.get(str(file))
+                if saved is not None and saved[:2] == [
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                ]:
+                    checksum = saved[2]
+                else:
+                    checksum = file_checksum(file)
+                files[str(file)] = [stat.st_size, stat.st_mtime_ns, checksum]
+        return files
+
+    def get_digest(self, files):
+        cfg_o = get_config(path=config_dir / ".opt.yaml")
+        content = {
+            "files": {file: value[2] for file, value in files.items()},
+            "config": {
+                key: cfg_o.get(key)
+                for key in ["run_id", "version"] + self.config_keys
+            },
+            "source": get_source_version(self.functions),
+        }
+        data = json.dumps(content, sort_keys=True, default=str)
+        return hashlib.md5(data.encode("utf-8")).hexdigest()
+
+    def save_values(self):
+        files = self.get_files(self.files)
+        return {
+            "_content_files": files,
+            "_content_uptodate": self.get_digest(files),
+        }
+
+    def __call__(self, task, values):
+        """Returns True if the inputs are unchanged."""
+        self.files = values.get("_content_files", {})
+        last_success = values.get("_content_uptodate")
+        if last_success is None:
+            return False
+        self.files = self.get_files(self.files)
+        return last_success == self.get_digest(self.files)
+
+
 def grids_uptodate(task):
     """This function compares the version number of each task with the
     dataset version. If it's smaller, the task is not uptodate"""
@@ -242,3 +396,57 @@ def task__get_grids_version():
     return {
         "actions": [get_dataset_version],
     }
+
+
+def task__ledger_summary():
+    """Prints the runtime and memory of the tasks per group from the ledger.
+    Run id and version can be passed via parameters -r and -v, default are
+    the current ones."""
+
+    def ledger_summary(run_id, version):
+        dep_manager = doit.Globals.dep_manager
+        version_db = dep_manager.get_result("_set_opt_version")
+        current = (version_db or {}).get("current", {})
+        run_id = run_id or current.get("run_id")
+        version = current.get("version") if version < 0 else version
+
+        summary = RuntimeLedger().summary(run_id=run_id, version=version)
+        if summary.empty:
+            print(f"No tasks in ledger for run {run_id} version {version}.")
+            return None
+
+        summary = summary.reset_index(["run_id", "version"], drop=True)
+        times = ["wall_time", "max_wall_time", "cpu_time", "solver_time"]
+        summary[times] = summary[times].apply(
+            lambda column: pd.to_timedelta(column.round(), "s")
+        )
+        summary["peak_rss"] = summary["peak_rss"].round().astype("Int64")
+        print(f"Run: {run_id} - Version: {version}")
+        with pd.option_context(
+            "display.max_columns", None, "display.width", 0
+        ):
+            print(summary.rename(columns={"peak_rss": "peak_rss [MB]"}))
+        return None
+
+    return {
+        "actions": [(ledger_summary,)],
+        "params": [
+            {
+                "name": "run_id",
+                "short": "r",
+                "long": "run_id",
+                "type": str,
+                "default": "",
+                "help": "Run id, default is the current run id",
+            },
+            {
+                "name": "version",
+                "short": "v",
+                "long": "version",
+                "type": int,
+                "default": -1,
+                "help": "Version, default is the current version",
+            },
+        ],
+        "verbosity": 2,
+    }
@@ -0,0 +1,546 @@
+import io
+import logging
+import os
+import queue
+import threading
+
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+from pathlib import Path
+
+import pandas as pd
+
+from lobaflex import config_dir
+from lobaflex.tools.manifest import (
+    get_manifest,
+    get_manifest_root,
+    get_objective,
+)
+from lobaflex.tools.tools import get_config, get_files_in_subdirs
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+RESULT_FORMATS = {"csv": ".csv", "parquet": ".parquet"}
+
+# datetime dtype of read_csv(parse_dates=True), resolutions inferred by
+# to_datetime or pyarrow can differ
+DATETIME_DTYPE = pd.read_csv(
+    io.StringIO(",0\n2011-01-01 00:00:00,0"), index_col=0, parse_dates=True
+).index.dtype
+
+
+def get_result_format(result_format=None):
+    """Result format of the config if not given.
+
+    Parameters
+    ----------
+    result_format : str or None
+        'csv' or 'parquet'
+
+    Returns
+    -------
+    str
+    """
+    if result_format is None:
+        cfg_o = get_config(path=config_dir / ".opt.yaml")
+        result_format = cfg_o["result_format"]
+    if result_format not in RESULT_FORMATS:
+        raise ValueError(
+            f"Result format {result_format} not in {list(RESULT_FORMATS)}."
+        )
+    if result_format == "parquet" and pq is None:
+        raise ImportError(
+            "pyarrow is required for result format 'parquet'. Install "
+            "lobaflex[parquet]."
+        )
+    return result_format
+
+
+class ResultSink(ABC):
+    """Base class of the result sinks of one feeder. Sinks implement
+    :meth:`get_file_path` and :meth:`write`.
+
+    Parameters
+    ----------
+    export_path : PosixPath
+        Directory the results are stored to
+    grid_id : int
+        Grid id of the MVGD
+    feeder_id : str
+        Feeder id of the feeder of the MVGD, e.g. '01'
+    manifest : :class:`lobaflex.tools.manifest.ResultManifest` or None
+        Manifest the written files are recorded to on close
+
+    """
+
+    def __init__(self, export_path, grid_id, feeder_id, manifest=None):
+        self.export_path = export_path
+        self.grid_id = grid_id
+        self.feeder_id = feeder_id
+        self.manifest = manifest
+        self._records = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @abstractmethod
+    def get_file_path(self, res_name, iteration):
+        """Path of the file of a result of one iteration."""
+
+    @abstractmethod
+    def write(self, res_name, iteration, res):
+        """Write results of one iteration.
+
+        Parameters
+        ----------
+        res_name : str
+            Name of the result, e.g. 'charging_ev'
+        iteration : int
+        res : pd.DataFrame
+
+        Returns
+        -------
+
+        """
+
+    def _record(self, res_name, iteration, kind):
+        self._records.append(
+            {
+                "file": self.get_file_path(res_name, iteration),
+                "grid": self.grid_id,
+                "feeder": self.feeder_id,
+                "parameter": res_name,
+                "iteration": iteration,
+                "kind": kind,
+            }
+        )
+
+    def close(self):
+        if self.manifest is not None and self._records:
+            self.manifest.add(self._records)
+        self._records = []
+
+
+class CsvResultSink(ResultSink):
+    """Writes one csv file per result and iteration."""
+
+    def get_file_path(self, res_name, iteration):
+        return self.export_path / (
+            f"{res_name}_{self.grid_id}-{self.feeder_id}"
+            f"_iteration_{iteration}.csv"
+        )
+
+    def write(self, res_name, iteration, res):
+        res.to_csv(self.get_file_path(res_name, iteration))
+        self._record(res_name, iteration, "iteration")
+
+
+class ParquetResultSink(ResultSink):
+    """Appends all iterations of one result to a parquet file. If the columns
+    of a result change, e.g. for slacks, a new part is started. Parts are
+    named by the iteration they start with."""
+
+    def __init__(self, export_path, grid_id, feeder_id, manifest=None):
+        get_result_format("parquet")
+        super().__init__(export_path, grid_id, feeder_id, manifest=manifest)
+        self._writers = {}
+
+    def get_file_path(self, res_name, iteration):
+        return self.export_path / (
+            f"{res_name}_{self.grid_id}-{self.feeder_id}"
+            f"_part_{iteration}.parquet"
+        )
+
+    def write(self, res_name, iteration, res):
+        res = res.rename(columns=str)
+        table = pa.Table.from_pandas(res, preserve_index=True)
+
+        writer = self._writers.get(res_name)
+        if writer is not None and not writer.schema.equals(
+            table.schema, check_metadata=False
+        ):
+            writer.close()
+            writer = None
+
+        if writer is None:
+            writer = pq.ParquetWriter(
+                self.get_file_path(res_name, iteration), table.schema
+            )
+            self._writers[res_name] = writer
+            self._record(res_name, iteration, "part")
+
+        writer.write_table(table)
+
+    def close(self):
+        for writer in self._writers.values():
+            writer.close()
+        self._writers = {}
+        super().close()
+
+
+class BackgroundResultWriter(ResultSink):
+    """Writes results of another sink in a background thread, so the next
+    iteration is built and solved while results are written.
+
+    Results are queued in a bounded queue. If the queue is full, writing
+    blocks until the thread caught up. Errors of the thread are raised on the
+    next write or on close, or logged if the context exits with an
+    exception. On close all queued results are written.
+
+    Parameters
+    ----------
+    sink : :class:`ResultSink`
+        Sink which writes the results
+    maxsize : int
+        Maximum number of queued results (default=16)
+
+    """
+
+    _stop = object()
+
+    def __init__(self, sink, maxsize=16):
+        super().__init__(sink.export_path, sink.grid_id, sink.feeder_id)
+        self.sink = sink
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._error = None
+        self._thread = threading.Thread(
+            target=self._run, name=f"result_writer_{self.feeder_id}"
+        )
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is self._stop:
+                    return
+                if self._error is None:
+                    self.sink.write(*item)
+            except Exception as e:
+                logger.exception("Writing results failed.")
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+            return
+        # don't mask the exception of the with block by errors of writing
+        try:
+            self.close()
+        except Exception as e:
+            logger.error(
+                f"Results of feeder {self.feeder_id} not written: {e}"
+            )
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
+
+    def get_file_path(self, res_name, iteration):
+        return self.sink.get_file_path(res_name, iteration)
+
+    def write(self, res_name, iteration, res):
+        self._raise_error()
+        # snapshot, results might be changed while queued
+        self._queue.put((res_name, iteration, res.copy()))
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(self._stop)
+            self._thread.join()
+        self.sink.close()
+        self._raise_error()
+
+
+def get_result_sink(
+    export_path, grid_id, feeder_id, result_format=None, background=None
+):
+    """Result sink of the configured result format.
+
+    Parameters
+    ----------
+    export_path : PosixPath or None
+        Directory the results are stored to. If None, an empty context is
+        returned which gives None as sink.
+    grid_id : int
+    feeder_id : str
+    result_format : str or None
+        'csv' or 'parquet'. If None, the config value `result_format` is
+        used.
+    background : bool or None
+        If True, results are written by a :class:`BackgroundResultWriter`.
+        If None, the config value `async_export` is used.
+
+    Written files are recorded to the manifest of the results tree if the
+    config value `result_manifest` is True.
+
+    Returns
+    -------
+    :class:`ResultSink` or :class:`contextlib.nullcontext`
+    """
+    if export_path is None:
+        return nullcontext()
+    manifest = get_manifest(export_path, create=True)
+    if get_result_format(result_format) == "parquet":
+        sink = ParquetResultSink(
+            export_path, grid_id, feeder_id, manifest=manifest
+        )
+    else:
+        sink = CsvResultSink(
+            export_path, grid_id, feeder_id, manifest=manifest
+        )
+
+    if background is None:
+        cfg_o = get_config(path=config_dir / ".opt.yaml")
+        background = cfg_o["async_export"]
+    if background:
+        sink = BackgroundResultWriter(sink)
+    return sink
+
+
+def get_result_files_in_subdirs(path, pattern="*"):
+    """Creates a list of all csv and parquet result files with pattern in its
+    subdirectories"""
+    return [
+        file
+        for extension in RESULT_FORMATS.values()
+        for file in get_files_in_subdirs(path, pattern=pattern + extension)
+    ]
+
+
+def parse_result_file_name(file):
+    """Identify a result file by its name and directory, e.g.
+    `results/01/charging_ev_1111-01_iteration_3.csv`,
+    `results/01/charging_ev_1111-01_part_0.parquet` or
+    `concat/1111_charging_ev.csv`.
+
+    Parameters
+    ----------
+    file : str or PosixPath
+
+    Returns
+    -------
+    dict or None
+        Dictionary with keys grid, feeder, parameter, iteration and kind or
+        None if the file is no result file
+    """
+    directory = os.path.basename(os.path.dirname(file))
+    name = os.path.splitext(os.path.basename(file))[0]
+
+    if directory == "concat":
+        grid, _, parameter = name.partition("_")
+        if not grid.isdigit() or not parameter:
+            return None
+        return {
+            "grid": grid,
+            "feeder": None,
+            "parameter": parameter,
+            "iteration": None,
+            "kind": "concat",
+        }
+
+    # <parameter>_<grid>-<feeder>_<iteration|part>_<number>
+    name, _, iteration = name.rpartition("_")
+    name, _, kind = name.rpartition("_")
+    if kind not in ("iteration", "part") or not iteration.isdigit():
+        return None
+    parameter, _, grid_feeder = name.rpartition("_")
+    grid, _, feeder = grid_feeder.partition("-")
+    return {
+        "grid": grid,
+        "feeder": feeder,
+        "parameter": parameter,
+        "iteration": int(iteration),
+        "kind": kind,
+    }
+
+
+def find_result_files(path, kind=None, parameters=None):
+    """Result files in path. The files are looked up in the manifest of the
+    results tree if it is current for path, see
+    :meth:`lobaflex.tools.manifest.ResultManifest.is_current`. Otherwise,
+    e.g. for files written without manifest or removed files, the directory
+    is scanned and the files are identified by their names.
+
+    Parameters
+    ----------
+    path : str or PosixPath
+        Directory of the results
+    kind : str or list of str, optional
+        'iteration', 'part' or 'concat'. If None, all kinds are selected.
+    parameters : list of str, optional
+        Parameters to be selected. If None, all parameters are selected.
+
+    Returns
+    -------
+    pd.DataFrame
+        Files with columns file, grid, feeder, objective, parameter,
+        iteration and kind, sorted by file
+    """
+    columns = [
+        "file",
+        "grid",
+        "feeder",
+        "objective",
+        "parameter",
+        "iteration",
+        "kind",
+    ]
+    kinds = [kind] if isinstance(kind, str) else kind
+
+    manifest = get_manifest(path)
+    if manifest is not None:
+        if manifest.is_current(path):
+            df = manifest.query(path, kind=kinds, parameter=parameters)
+            return df[columns]
+        logger.debug(f"Manifest isn't current for {path}, scan directory.")
+
+    root = get_manifest_root(path) or path
+    records = []
+    for file in get_result_files_in_subdirs(path):
+        record = parse_result_file_name(file)
+        if record is None:
+            continue
+        if kinds is not None and record["kind"] not in kinds:
+            continue
+        if parameters is not None and record["parameter"] not in parameters:
+            continue
+        record["file"] = file
+        record["objective"] = get_objective(file, root)
+        records.append(record)
+
+    return pd.DataFrame(records, columns=columns).sort_values(by="file")
+
+
+def get_reader_options(workers=None, engine=None):
+    """Reader options of the config if not given.
+
+    Parameters
+    ----------
+    workers : int or None
+        Number of threads reading result files. If None, the config value
+        `reader_workers` is used.
+    engine : str or None
+        Csv engine of :func:`pandas.read_csv`, e.g. 'c' or 'pyarrow'. If
+        None, the config value `csv_engine` is used. Falls back to 'c' if
+        pyarrow is not installed.
+
+    Returns
+    -------
+    workers : int
+    engine : str
+    """
+    cfg_o = get_config(path=config_dir / ".opt.yaml")
+    workers = cfg_o["reader_workers"] if workers is None else workers
+    engine = cfg_o["csv_engine"] if engine is None else engine
+    if engine == "pyarrow" and pa is None:
+        logger.debug("pyarrow is not installed, use csv engine 'c'.")
+        engine = "c"
+    return workers, engine
+
+
+def parse_time_index(df):
+    """Parse the index to datetime if possible, like `parse_dates=True` of
+    :func:`pandas.read_csv`."""
+    if not isinstance(df.index, pd.DatetimeIndex):
+        try:
+            df.index = pd.to_datetime(df.index)
+        except (ValueError, TypeError):
+            return df
+    df.index = df.index.astype(DATETIME_DTYPE)
+    return df
+
+
+def read_result_file(file, parse_dates=True, engine="c"):
+    """Read a csv or parquet result file with time index.
+
+    Parameters
+    ----------
+    file : str or PosixPath
+    parse_dates : bool
+        Parse the index of csv files to datetime (default=True)
+    engine : str
+        Csv engine of :func:`pandas.read_csv` (default='c')
+
+    Returns
+    -------
+    pd.DataFrame
+    """
+    if str(file).endswith(RESULT_FORMATS["parquet"]):
+        return pd.read_parquet(file)
+    df = pd.read_csv(file, index_col=0, engine=engine)
+    if engine == "pyarrow" and df.index.name == "":
+        # unnamed index like with engine 'c'
+        df.index.name = None
+    return parse_time_index(df) if parse_dates else df
+
+
+def read_result_files(files, executor=None, workers=None, engine=None):
+    """Read result files with a thread pool. The time index is not parsed,
+    use :func:`parse_time_index` once on the concatenated results.
+
+    Parameters
+    ----------
+    files : list of str or PosixPath
+    executor : :class:`concurrent.futures.Executor` or None
+        Executor to read the files with. If None, a thread pool with
+        `workers` threads is used.
+    workers : int or None
+        See :func:`get_reader_options`
+    engine : str or None
+        See :func:`get_reader_options`
+
+    Returns
+    -------
+    list of pd.DataFrame
+        Results in order of files
+    """
+    workers, engine = get_reader_options(workers=workers, engine=engine)
+    read = partial(read_result_file, parse_dates=False, engine=engine)
+
+    if executor is None:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(read, files))
+    return list(executor.map(read, files))
+
+
+def write_result_file(df, path, result_format=None):
+    """Write results to a csv or parquet file.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+    path : PosixPath
+        Path of the file without extension
+    result_format : str or None
+        'csv' or 'parquet'. If None, the config value `result_format` is
+        used.
+
+    Returns
+    -------
+    file_path : PosixPath
+    """
+    result_format = get_result_format(result_format)
+    file_path = path.parent / (path.name + RESULT_FORMATS[result_format])
+    os.makedirs(file_path.parent, exist_ok=True)
+
+    if result_format == "parquet":
+        df.rename(columns=str).to_parquet(file_path, index=True)
+    else:
+        df.to_csv(file_path, index=True)
+    return file_path
@@ -0,0 +1,292 @@
+import json
+import logging
+import os
+
+from copy import deepcopy
+from functools import wraps
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from lobaflex import config_dir, results_dir
+from lobaflex.tools.ledger import RuntimeLedger
+from lobaflex.tools.snapshot import SNAPSHOT_DIR
+from lobaflex.tools.tools import get_config
+
+logger = logging.getLogger(__name__)
+
+# flexible loads add storage, charging and power variables and constraints
+# per time step, a bus mainly voltage and power balance
+FLEXIBLE_LOAD_WEIGHT = 4
+
+# estimated costs of the feeder dumps by the state of their files
+COST_CACHE_FILE = results_dir / "task_costs.json"
+
+
+def get_timeseries_file(feeder_path):
+    """File of the dump the number of time steps is read from, the time
+    index of the snapshot or a time series csv."""
+    timeindex_file = Path(feeder_path) / SNAPSHOT_DIR / "timeindex.parquet"
+    if timeindex_file.is_file():
+        return timeindex_file
+    files = sorted(
+        file
+        for file in (Path(feeder_path) / "timeseries").glob("*.csv")
+        if file.name != "timeindex_worst_cases.csv"
+    )
+    return files[0] if files else None
+
+
+def get_dump_timesteps(feeder_path):
+    """Number of time steps of the time series of a feeder dump, which are
+    optimized by the pipeline.
+
+    Parameters
+    ----------
+    feeder_path : str or PosixPath
+        Directory of the feeder dump
+
+    Returns
+    -------
+    int or None
+        None if the dump has no time series
+    """
+    file = get_timeseries_file(feeder_path)
+    if file is None:
+        return None
+    if file.suffix == ".parquet":
+        return len(pd.read_parquet(file))
+    return len(pd.read_csv(file, usecols=[0]))
+
+
+def estimate_feeder_cost(feeder_path):
+    """Estimate the optimization cost of a feeder from the size of the
+    optimization problem, the number of buses and flexible loads times the
+    number of time steps of the dump.
+
+    Parameters
+    ----------
+    feeder_path : str or PosixPath
+        Directory of the feeder dump
+
+    Returns
+    -------
+    float or None
+        Cost in arbitrary units or None if the topology or time series of
+        the dump don't exist yet
+    """
+    topology_path = Path(feeder_path) / "topology"
+    try:
+        n_buses = len(pd.read_csv(topology_path / "buses.csv", usecols=[0]))
+        loads = pd.read_csv(topology_path / "loads.csv", usecols=["type"])
+        timesteps = get_dump_timesteps(feeder_path)
+    except (FileNotFoundError, ValueError):
+        return None
+    if not timesteps:
+        return None
+    n_flexible_loads = (
+        loads["type"].isin(["heat_pump", "charging_point"]).sum()
+    )
+    return float(
+        (n_buses + FLEXIBLE_LOAD_WEIGHT * n_flexible_loads) * timesteps
+    )
+
+
+def get_feeder_state(feeder_path):
+    """Size and modification time of the files the cost of a feeder is
+    estimated from, see :func:`estimate_feeder_cost`."""
+    topology_path = Path(feeder_path) / "topology"
+    state = []
+    for file in [
+        topology_path / "buses.csv",
+        topology_path / "loads.csv",
+        get_timeseries_file(feeder_path),
+    ]:
+        try:
+            stat = os.stat(file)
+        except (FileNotFoundError, TypeError):
+            state.append(None)
+        else:
+            state.append([str(file), stat.st_size, stat.st_mtime_ns])
+    return state
+
+
+def get_cached_feeder_cost(feeder_path, cache):
+    """Estimated cost of a feeder, see :func:`estimate_feeder_cost`. The
+    estimate is only computed if the files of the dump changed since it was
+    added to the cache.
+
+    Parameters
+    ----------
+    feeder_path : str or PosixPath
+    cache : dict
+        Estimates and states of the feeder files by feeder path, updated in
+        place
+
+    Returns
+    -------
+    float or None
+    """
+    state = get_feeder_state(feeder_path)
+    entry = cache.get(str(feeder_path))
+    if entry is not None and entry["state"] == state:
+        return entry["cost"]
+    cost = estimate_feeder_cost(feeder_path)
+    cache[str(feeder_path)] = {"state": state, "cost": cost}
+    return cost
+
+
+def load_cost_cache(file=COST_CACHE_FILE):
+    """Feeder cost cache of previous runs, see
+    :func:`get_cached_feeder_cost`."""
+    try:
+        with open(file) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_cost_cache(cache, file=COST_CACHE_FILE):
+    os.makedirs(Path(file).parent, exist_ok=True)
+    tmp_file = Path(file).with_name(f".{Path(file).name}.{os.getpid()}")
+    with open(tmp_file, "w") as f:
+        json.dump(cache, f)
+    os.replace(tmp_file, file)
+
+
+def estimate_task_cost(task, cache=None):
+    """Estimate the cost of an optimization task by its feeder dumps, see
+    :func:`estimate_feeder_cost`. The cost of a task optimizing all feeders of
+    a grid is the sum of its feeders.
+
+    Parameters
+    ----------
+    task : dict
+        doit task definition, see :mod:`lobaflex.opt.tasks`
+    cache : dict or None
+        Feeder cost cache, see :func:`get_cached_feeder_cost`
+
+    Returns
+    -------
+    float or None
+        None if the task is no optimization task
+    """
+    if cache is None:
+        cache = {}
+    costs = []
+    for action in task.get("actions", []):
+        if not isinstance(action, tuple) or len(action) < 3:
+            continue
+        function, _, kwargs = action[:3]
+        if function.__name__ == "run_dispatch_optimization":
+            costs.append(get_cached_feeder_cost(kwargs["obj_or_path"], cache))
+        elif function.__name__ == "run_dispatch_optimization_parallel":
+            import_path = (
+                results_dir
+                / kwargs["run_id"]
+                / str(kwargs["grid_id"])
+                / kwargs["directory"]
+            )
+            costs += [
+                get_cached_feeder_cost(
+                    import_path / f"{int(feeder):02}", cache
+                )
+                for feeder in kwargs["feeders"]
+            ]
+    costs = [cost for cost in costs if cost is not None]
+    return sum(costs) if costs else None
+
+
+def get_task_costs(basename, tasks, runtimes=None):
+    """Cost of the optimization tasks in seconds.
+
+    Recorded runtimes of previous runs are used if available. Otherwise the
+    estimated cost is scaled to seconds by the median ratio of runtime and
+    estimate of the recorded tasks. Estimates are kept in
+    :attr:`COST_CACHE_FILE`, so only feeders with changed dumps are read
+    again when the tasks are loaded.
+
+    Parameters
+    ----------
+    basename : str
+        Name of the task group, e.g. 'min_pot'
+    tasks : list of dict
+        doit task definitions
+    runtimes : dict or None
+        Runtimes by task name. If None, the runtimes of the
+        :class:`lobaflex.tools.ledger.RuntimeLedger` are used.
+
+    Returns
+    -------
+    list of float or None
+        Cost of every task, None for tasks which aren't optimization tasks
+    """
+    if runtimes is None:
+        runtimes = RuntimeLedger().latest_runtimes()
+
+    cache = load_cost_cache()
+    saved_cache = deepcopy(cache)
+    estimates = [estimate_task_cost(task, cache) for task in tasks]
+    if cache != saved_cache:
+        save_cost_cache(cache)
+    recorded = [
+        runtimes.get(f"{basename}:{task['name']}") if estimate else None
+        for task, estimate in zip(tasks, estimates)
+    ]
+    ratios = [
+        runtime / estimate
+        for runtime, estimate in zip(recorded, estimates)
+        if runtime is not None and estimate
+    ]
+    scale = float(np.median(ratios)) if ratios else 1.0
+
+    return [
+        runtime if runtime is not None else estimate and estimate * scale
+        for runtime, estimate in zip(recorded, estimates)
+    ]
+
+
+def longest_first(task_generator):
+    """Decorator of a doit task generator which yields the optimization
+    tasks in descending order of their cost, see :func:`get_task_costs`.
+
+    Parallel runs dispatch tasks in the order they are yielded, so the
+    longest tasks start first and don't finish alone at the end of the run.
+    All other tasks are yielded afterwards in their order. Disabled if the
+    config value `task_scheduling` isn't 'cost'.
+
+    Parameters
+    ----------
+    task_generator : callable
+        Task creator, e.g. task_min_pot
+
+    Returns
+    -------
+    callable
+    """
+    basename = task_generator.__name__[len("task_") :]
+
+    @wraps(task_generator)
+    def scheduled_task_generator(*args, **kwargs):
+        tasks = list(task_generator(*args, **kwargs))
+        cfg_o = get_config(path=config_dir / ".opt.yaml")
+        if cfg_o["task_scheduling"] != "cost":
+            yield from tasks
+            return
+
+        costs = get_task_costs(basename, tasks)
+        order = sorted(
+            (i for i, cost in enumerate(costs) if cost is not None),
+            key=lambda i: costs[i],
+            reverse=True,
+        )
+        if order:
+            logger.debug(
+                f"Longest task of {basename}: {tasks[order[0]]['name']} "
+                f"with cost {costs[order[0]]:.0f}."
+            )
+        yield from (tasks[i] for i in order)
+        yield from (task for task, cost in zip(tasks, costs) if cost is None)
+
+    return scheduled_task_generator
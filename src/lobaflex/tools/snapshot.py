@@ -0,0 +1,539 @@
+import logging
+import os
+import shutil
+
+from copy import copy, deepcopy
+from pathlib import Path
+
+import pandas as pd
+
+from edisgo.edisgo import import_edisgo_from_files
+from edisgo.network.results import Results
+from edisgo.network.timeseries import TimeSeries
+
+from lobaflex import config_dir
+from lobaflex.tools.object_cache import get_object_cache
+from lobaflex.tools.tools import get_config
+
+try:
+    import pyarrow  # noqa: F401
+except ImportError:
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+DUMP_FORMATS = ["csv", "parquet"]
+
+# directory of the parquet files in the edisgo dump
+SNAPSHOT_DIR = "snapshot"
+
+HEAT_PUMP_ATTRIBUTES = ["cop_df", "heat_demand_df", "thermal_storage_units_df"]
+
+ELECTROMOBILITY_ATTRIBUTES = [
+    "integrated_charging_parks_df",
+    "simbev_config_df",
+    "flexibility_bands",
+]
+
+# import flag of the components which can be imported lazily
+COMPONENTS = {
+    "timeseries": "import_timeseries",
+    "heat_pump": "import_heat_pump",
+    "electromobility": "import_electromobility",
+}
+
+# files of the components in the dump, relative to the dump and to the
+# snapshot directory
+COMPONENT_FILES = {
+    "timeseries": (["timeseries"], ["timeindex.parquet", "timeseries"]),
+    "heat_pump": (["heat_pump"], ["heat_pump"]),
+    "electromobility": (["electromobility"], ["flexibility_bands"]),
+}
+
+# components required by the pipeline stages, all other components are
+# imported on first access
+STAGE_COMPONENTS = {
+    "timeframe_selection": ["timeseries", "heat_pump", "electromobility"],
+    "feeder_extraction": ["timeseries", "heat_pump", "electromobility"],
+    "dnm_generation": [],
+    "dispatch_optimization": ["timeseries", "heat_pump", "electromobility"],
+    "dispatch_integration": ["timeseries", "heat_pump", "electromobility"],
+    "grid_reinforcement": ["timeseries"],
+    "expansion_scenario": ["timeseries"],
+}
+
+
+class LazyComponent:
+    """Proxy of a component of an edisgo object, e.g. heat_pump, which is
+    imported from the dump on first access. The imported component replaces
+    the proxy on the edisgo object.
+
+    If the component is saved by :func:`save_edisgo` before it was
+    accessed, its files are copied from the dump instead.
+
+    Parameters
+    ----------
+    edisgo_obj : :class:`edisgo.EDisGo`
+    name : str
+        Name of the component, see :attr:`COMPONENTS`
+    edisgo_path : PosixPath
+        Path of the dump
+
+    """
+
+    def __init__(self, edisgo_obj, name, edisgo_path):
+        self.__dict__.update(
+            _edisgo_obj=edisgo_obj,
+            _name=name,
+            _edisgo_path=Path(edisgo_path),
+            _component=None,
+        )
+
+    @property
+    def loaded(self):
+        return self._component is not None
+
+    def load(self):
+        """Import the component and set it to the edisgo object.
+
+        Returns
+        -------
+        Imported component
+        """
+        if self._component is None:
+            logger.debug(f"Import {self._name} from {self._edisgo_path}.")
+            imported = load_edisgo(
+                self._edisgo_path,
+                import_topology=False,
+                **{COMPONENTS[self._name]: True},
+            )
+            component = getattr(imported, self._name)
+            # components referencing the edisgo object, e.g. electromobility
+            if hasattr(component, "_edisgo_obj"):
+                component._edisgo_obj = self._edisgo_obj
+            self.__dict__["_component"] = component
+            setattr(self._edisgo_obj, self._name, component)
+        return self._component
+
+    def copy_files(self, directory):
+        """Copy the files of the component from the dump to directory."""
+        dump_dirs, snapshot_files = COMPONENT_FILES[self._name]
+        for source, destination in [
+            (self._edisgo_path / name, Path(directory) / name)
+            for name in dump_dirs
+        ] + [
+            (
+                self._edisgo_path / SNAPSHOT_DIR / name,
+                Path(directory) / SNAPSHOT_DIR / name,
+            )
+            for name in snapshot_files
+        ]:
+            if source.is_dir():
+                shutil.copytree(source, destination, dirs_exist_ok=True)
+            elif source.is_file():
+                os.makedirs(destination.parent, exist_ok=True)
+                shutil.copy2(source, destination)
+
+    def __getattr__(self, name):
+        # attributes of the proxy, e.g. while it is copied
+        if name.startswith("__") or name in (
+            "_edisgo_obj",
+            "_name",
+            "_edisgo_path",
+            "_component",
+        ):
+            raise AttributeError(name)
+        return getattr(self.load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.load(), name, value)
+
+    def __copy__(self):
+        return copy(self.load())
+
+    def __deepcopy__(self, memo):
+        if self.loaded:
+            return deepcopy(self._component, memo)
+        # the copy is imported to the copied edisgo object on first access
+        lazy_copy = LazyComponent.__new__(LazyComponent)
+        memo[id(self)] = lazy_copy
+        lazy_copy.__dict__.update(
+            _edisgo_obj=deepcopy(self._edisgo_obj, memo),
+            _name=self._name,
+            _edisgo_path=self._edisgo_path,
+            _component=None,
+        )
+        return lazy_copy
+
+
+def get_dump_format(dump_format=None):
+    """Dump format of the config if not given. Falls back to 'csv' if
+    pyarrow is not installed.
+
+    Parameters
+    ----------
+    dump_format : str or None
+        'csv' or 'parquet'
+
+    Returns
+    -------
+    str
+    """
+    if dump_format is None:
+        cfg_o = get_config(path=config_dir / ".opt.yaml")
+        dump_format = cfg_o["dump_format"]
+    if dump_format not in DUMP_FORMATS:
+        raise ValueError(f"Dump format {dump_format} not in {DUMP_FORMATS}.")
+    if dump_format == "parquet" and pyarrow is None:
+        logger.warning("pyarrow is not installed, save edisgo dump to csv.")
+        dump_format = "csv"
+    return dump_format
+
+
+def _write_frames(frames, directory):
+    """Write non empty frames to parquet files named by their key."""
+    for name, df in frames.items():
+        if df is None or df.empty:
+            continue
+        os.makedirs(directory, exist_ok=True)
+        df.to_parquet(directory / f"{name}.parquet")
+
+
+def _read_frames(directory):
+    """Read all parquet files of a directory with their name as key."""
+    if not directory.is_dir():
+        return {}
+    return {
+        file.stem: pd.read_parquet(file)
+        for file in sorted(directory.glob("*.parquet"))
+    }
+
+
+def save_edisgo(
+    edisgo_obj,
+    directory,
+    dump_format=None,
+    save_timeseries=True,
+    save_heatpump=False,
+    save_electromobility=False,
+    electromobility_attributes=None,
+    **kwargs,
+):
+    """Save the edisgo object like :meth:`edisgo.EDisGo.save`.
+
+    With dump format 'parquet' the time series, heat pump data and
+    flexibility bands are written to parquet files in
+    `directory/snapshot`, which keeps dtypes and the datetime index and
+    doesn't need parsing on import. All other data is saved by
+    :meth:`edisgo.EDisGo.save` to csv.
+
+    The saved edisgo object is kept in the object cache of the process, see
+    :func:`lobaflex.tools.object_cache.get_object_cache`. It must not be
+    changed after saving.
+
+    Parameters
+    ----------
+    edisgo_obj : :class:`edisgo.EDisGo`
+    directory : str or PosixPath
+    dump_format : str or None
+        'csv' or 'parquet'. If None, the config value `dump_format` is used.
+    save_timeseries : bool
+    save_heatpump : bool
+    save_electromobility : bool
+    electromobility_attributes : list of str or None
+        If None, :attr:`ELECTROMOBILITY_ATTRIBUTES` are saved.
+    kwargs :
+        Passed to :meth:`edisgo.EDisGo.save`, e.g. save_topology or
+        save_results
+
+    Returns
+    -------
+
+    """
+    directory = Path(directory)
+    dump_format = get_dump_format(dump_format)
+    attributes = electromobility_attributes
+    if attributes is None:
+        attributes = ELECTROMOBILITY_ATTRIBUTES
+
+    # components which were not accessed are copied from their dump
+    lazy = get_lazy_components(edisgo_obj)
+    for component in lazy.values():
+        if component._edisgo_path.resolve() == directory.resolve():
+            component.load()
+    lazy = get_lazy_components(edisgo_obj)
+    save = {
+        "timeseries": save_timeseries,
+        "heat_pump": save_heatpump,
+        "electromobility": save_electromobility,
+    }
+    save_timeseries, save_heatpump, save_electromobility = (
+        save[name] and name not in lazy for name in COMPONENTS
+    )
+
+    # a snapshot of a former dump would shadow the csv files
+    shutil.rmtree(directory / SNAPSHOT_DIR, ignore_errors=True)
+
+    if dump_format == "csv":
+        edisgo_obj.save(
+            directory,
+            save_timeseries=save_timeseries,
+            save_heatpump=save_heatpump,
+            save_electromobility=save_electromobility,
+            electromobility_attributes=attributes,
+            **kwargs,
+        )
+        _copy_lazy_components(lazy, save, directory)
+        _cache_edisgo(edisgo_obj, directory, save, attributes, kwargs)
+        return
+
+    csv_attributes = [
+        attr for attr in attributes if attr != "flexibility_bands"
+    ]
+    edisgo_obj.save(
+        directory,
+        save_timeseries=False,
+        save_heatpump=False,
+        save_electromobility=save_electromobility and bool(csv_attributes),
+        electromobility_attributes=csv_attributes,
+        **kwargs,
+    )
+
+    snapshot = directory / SNAPSHOT_DIR
+    os.makedirs(snapshot, exist_ok=True)
+
+    if save_timeseries:
+        timeseries = edisgo_obj.timeseries
+        pd.DataFrame(index=timeseries.timeindex).to_parquet(
+            snapshot / "timeindex.parquet"
+        )
+        _write_frames(
+            {
+                attr: getattr(timeseries, attr)
+                for attr in TimeSeries()._attributes
+            },
+            snapshot / "timeseries",
+        )
+
+    if save_heatpump:
+        _write_frames(
+            {
+                attr: getattr(edisgo_obj.heat_pump, attr, None)
+                for attr in HEAT_PUMP_ATTRIBUTES
+            },
+            snapshot / "heat_pump",
+        )
+
+    if save_electromobility and "flexibility_bands" in attributes:
+        _write_frames(
+            edisgo_obj.electromobility.flexibility_bands,
+            snapshot / "flexibility_bands",
+        )
+
+    _copy_lazy_components(lazy, save, directory)
+    _cache_edisgo(edisgo_obj, directory, save, attributes, kwargs)
+
+
+def get_dump_content(save, electromobility_attributes, kwargs):
+    """Parts of the edisgo object saved to a dump, used as key of the object
+    cache.
+
+    Parameters
+    ----------
+    save : dict
+        Save flag by component, see :attr:`COMPONENTS`
+    electromobility_attributes : list of str
+    kwargs : dict
+        Further arguments of :func:`save_edisgo`
+
+    Returns
+    -------
+    frozenset or None
+        None if the arguments are not known to the cache
+    """
+    if set(kwargs) - {"save_topology", "save_results"}:
+        return None
+    if save["electromobility"] and set(ELECTROMOBILITY_ATTRIBUTES) - set(
+        electromobility_attributes
+    ):
+        return None
+    saved = {name for name in COMPONENTS if save[name]}
+    for part in ["topology", "results"]:
+        if kwargs.get(f"save_{part}", True):
+            saved.add(part)
+    return frozenset(saved)
+
+
+def _cache_edisgo(edisgo_obj, directory, save, attributes, kwargs):
+    """Keep a copy of the saved edisgo object in the object cache. Its lazy
+    components are imported from the saved dump."""
+    cache = get_object_cache()
+    if cache is None:
+        return
+    content = get_dump_content(save, attributes, kwargs)
+    if content is None:
+        cache.remove(directory)
+        return
+    cached = cache.put(directory, edisgo_obj, key=content)
+    if cached is None:
+        return
+    for name, component in get_lazy_components(cached).items():
+        if save[name]:
+            component.__dict__["_edisgo_path"] = directory
+
+
+def get_lazy_components(edisgo_obj):
+    """Components of the edisgo object which were not imported yet.
+
+    Returns
+    -------
+    dict
+        Dictionary with name as key and :class:`LazyComponent` as value
+    """
+    return {
+        name: getattr(edisgo_obj, name)
+        for name in COMPONENTS
+        if isinstance(getattr(edisgo_obj, name, None), LazyComponent)
+        and not getattr(edisgo_obj, name).loaded
+    }
+
+
+def _copy_lazy_components(lazy, save, directory):
+    """Copy the files of the lazy components to be saved."""
+    for name, component in lazy.items():
+        if save[name]:
+            logger.debug(f"Copy {name} from {component._edisgo_path}.")
+            component.copy_files(directory)
+
+
+def load_edisgo(
+    edisgo_path,
+    import_topology=True,
+    import_timeseries=False,
+    import_heat_pump=False,
+    import_electromobility=False,
+    lazy=False,
+    **kwargs,
+):
+    """Import an edisgo dump saved by :func:`save_edisgo` or
+    :meth:`edisgo.EDisGo.save`. Components with parquet files in the
+    snapshot of the dump are imported from them, all others from csv.
+
+    Parameters
+    ----------
+    edisgo_path : str or PosixPath
+    import_topology : bool
+    import_timeseries : bool
+    import_heat_pump : bool
+    import_electromobility : bool
+    lazy : bool
+        If True, components which are not imported are set as
+        :class:`LazyComponent` and imported on first access (default=False)
+    kwargs :
+        Passed to :func:`edisgo.edisgo.import_edisgo_from_files`, e.g.
+        import_results
+
+    Returns
+    -------
+    :class:`edisgo.EDisGo`
+    """
+    edisgo_path = Path(edisgo_path)
+    snapshot = edisgo_path / SNAPSHOT_DIR
+    in_snapshot = {
+        "timeseries": (snapshot / "timeindex.parquet").is_file(),
+        "heat_pump": (snapshot / "heat_pump").is_dir(),
+        "electromobility": (snapshot / "flexibility_bands").is_dir(),
+    }
+
+    # remaining electromobility data is saved to csv
+    import_csv_electromobility = import_electromobility and (
+        not in_snapshot["electromobility"]
+        or (edisgo_path / "electromobility").is_dir()
+    )
+    edisgo_obj = import_edisgo_from_files(
+        edisgo_path,
+        import_topology=import_topology,
+        import_timeseries=import_timeseries and not in_snapshot["timeseries"],
+        import_heat_pump=import_heat_pump and not in_snapshot["heat_pump"],
+        import_electromobility=import_csv_electromobility,
+        **kwargs,
+    )
+
+    if import_timeseries and in_snapshot["timeseries"]:
+        edisgo_obj.timeseries.timeindex = pd.read_parquet(
+            snapshot / "timeindex.parquet"
+        ).index
+        for attr, df in _read_frames(snapshot / "timeseries").items():
+            setattr(edisgo_obj.timeseries, attr, df)
+
+    if import_heat_pump and in_snapshot["heat_pump"]:
+        for attr, df in _read_frames(snapshot / "heat_pump").items():
+            setattr(edisgo_obj.heat_pump, attr, df)
+
+    if import_electromobility and in_snapshot["electromobility"]:
+        edisgo_obj.electromobility.flexibility_bands = _read_frames(
+            snapshot / "flexibility_bands"
+        )
+
+    if lazy:
+        imported = {
+            "timeseries": import_timeseries,
+            "heat_pump": import_heat_pump,
+            "electromobility": import_electromobility,
+        }
+        for name in COMPONENTS:
+            if not imported[name]:
+                setattr(
+                    edisgo_obj,
+                    name,
+                    LazyComponent(edisgo_obj, name, edisgo_path),
+                )
+
+    return edisgo_obj
+
+
+def load_stage_edisgo(edisgo_path, stage, **kwargs):
+    """Import the components of an edisgo dump required by a pipeline stage,
+    see :attr:`STAGE_COMPONENTS`. All other components are imported on first
+    access. If the dump was saved in this process and is unchanged, a copy
+    of the cached edisgo object is given instead. The cached object is only
+    taken if it was saved with all components and the topology, so that it
+    has the same content as the import. Its results are dropped if they are
+    not imported.
+
+    Parameters
+    ----------
+    edisgo_path : str or PosixPath
+    stage : str
+        Name of the stage, e.g. 'grid_reinforcement'
+    kwargs :
+        Passed to :func:`load_edisgo`, e.g. import_results
+
+    Returns
+    -------
+    :class:`edisgo.EDisGo`
+    """
+    cache = get_object_cache()
+    if cache is not None and not set(kwargs) - {"import_results"}:
+        content = {"topology", *COMPONENTS}
+        import_results = kwargs.get("import_results", False)
+        for results in dict.fromkeys([import_results, True]):
+            edisgo_obj = cache.get(
+                edisgo_path,
+                key=frozenset(content | ({"results"} if results else set())),
+            )
+            if edisgo_obj is None:
+                continue
+            logger.info(f"Take edisgo object of {edisgo_path} from cache.")
+            if not import_results:
+                edisgo_obj.results = Results(edisgo_obj)
+            return edisgo_obj
+
+    components = STAGE_COMPONENTS[stage]
+    return load_edisgo(
+        edisgo_path,
+        import_topology=True,
+        lazy=True,
+        **{flag: name in components for name, flag in COMPONENTS.items()},
+        **kwargs,
+    )
@@ -2,7 +2,9 @@
 import csv
 import logging
 import os
+import queue
 import sys
+import threading
 import time
 
 from datetime import date, datetime
@@ -18,7 +20,7 @@ import yaml
 from doit.exceptions import BaseFail
 from dotenv import dotenv_values
 
-from lobaflex import config_dir, results_dir
+from lobaflex import config_dir, logs_dir, results_dir
 
 logger = logging.getLogger(__name__)
 
@@ -199,17 +201,212 @@ def init_versioning():
     return version_db, run_id
 
 
-def telegram_bot_sendtext(text):
-    """"""
+def telegram_bot_sendtext(text, timeout=10):
+    """Send text to the telegram chat of config/telegram.env
+
+    Parameters
+    ----------
+    text : str
+    timeout : float
+        Seconds to wait for the telegram api (default=10)
+
+    Returns
+    -------
+    requests.Response
+    """
     cfg_telegram = dotenv_values(dotenv_path=config_dir / "telegram.env")
     token = cfg_telegram.get("TOKEN")
     chat_id = cfg_telegram.get("CHAT_ID")
     params = {"chat_id": chat_id, "text": text}
     url = f"https://api.telegram.org/bot{token}/sendMessage"
-    message = requests.post(url, params=params)
+    message = requests.post(url, params=params, timeout=timeout)
+    message.raise_for_status()
     return message
 
 
+class FileSink:
+    """Appends notifications with a time stamp to a local file, used as
+    fallback of :class:`Notifier` or instead of telegram, e.g. in tests.
+
+    Parameters
+    ----------
+    path : PosixPath
+        Default: logs_dir / 'notifications.log'
+
+    """
+
+    def __init__(self, path=logs_dir / "notifications.log"):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def __call__(self, text):
+        current_time = datetime.now().isoformat(timespec="seconds")
+        with self._lock:
+            os.makedirs(self.path.parent, exist_ok=True)
+            with open(self.path, "a") as file:
+                file.write(f"[{current_time}]\n{text}\n")
+
+
+def split_text(text, max_length):
+    """Split text into parts of at most max_length characters, at the last
+    line break of a part if possible.
+
+    Parameters
+    ----------
+    text : str
+    max_length : int
+
+    Returns
+    -------
+    list of str
+    """
+    parts = []
+    while len(text) > max_length:
+        end = text.rfind("\n", 0, max_length + 1)
+        if end <= 0:
+            end = max_length
+        parts.append(text[:end])
+        text = text[end:].lstrip("\n")
+    return parts + [text]
+
+
+class Notifier:
+    """Delivers notifications in a background thread so that a slow or
+    unreachable chat api doesn't block the caller, e.g. the doit main loop.
+
+    Messages are buffered in a bounded queue and sent in batches. Messages
+    longer than a batch are split at line breaks. Messages which don't fit
+    into the buffer or fail to send are written to the fallback sink.
+
+    Parameters
+    ----------
+    send : callable
+        Sends the text of a batch, e.g. :func:`telegram_bot_sendtext`
+    fallback : callable
+        Sink of messages which couldn't be sent (default: :class:`FileSink`)
+    max_size : int
+        Maximum number of buffered messages (default=100)
+    batch_interval : float
+        Seconds to collect messages for one batch (default=1)
+    max_batch_length : int
+        Maximum characters of a batch, telegram allows 4096 (default=4000)
+
+    """
+
+    def __init__(
+        self,
+        send=telegram_bot_sendtext,
+        fallback=None,
+        max_size=100,
+        batch_interval=1,
+        max_batch_length=4000,
+    ):
+        self.send = send
+        self.fallback = FileSink() if fallback is None else fallback
+        self.batch_interval = batch_interval
+        self.max_batch_length = max_batch_length
+        self._queue = queue.Queue(maxsize=max_size)
+        self._pending = None
+        self._sending = None
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def __call__(self, text):
+        """Queue text for delivery, never blocks."""
+        if self._closed.is_set():
+            self.fallback(text)
+            return
+        for part in split_text(text, self.max_batch_length):
+            try:
+                self._queue.put_nowait(part)
+            except queue.Full:
+                logger.debug("Notification buffer is full, use fallback.")
+                self.fallback(part)
+
+    def _next_batch(self):
+        """Texts of the next batch, waits for the first text. None marks
+        the end of the delivery."""
+        if self._pending is not None:
+            texts, self._pending = [self._pending], None
+        else:
+            texts = [self._queue.get()]
+        length = len(texts[0] or "")
+        deadline = time.monotonic() + self.batch_interval
+        while texts[-1] is not None:
+            try:
+                text = self._queue.get(
+                    timeout=max(0, deadline - time.monotonic())
+                )
+            except queue.Empty:
+                break
+            if text is not None and length + len(text) > self.max_batch_length:
+                # keep it for the next batch
+                self._pending = text
+                break
+            texts.append(text)
+            length += len(text or "")
+        return texts
+
+    def _run(self):
+        stop = False
+        while not stop:
+            texts = self._next_batch()
+            stop = texts[-1] is None
+            text = "\n\n".join(texts[:-1] if stop else texts)
+            if not text:
+                continue
+            self._sending = text
+            try:
+                self.send(text=text)
+            except Exception as e:
+                logger.warning(f"Notification not sent: {e}")
+                self.fallback(text)
+            finally:
+                self._sending = None
+
+    def close(self, timeout=30):
+        """Deliver the buffered messages and stop the background thread.
+        Messages which aren't delivered within timeout seconds, including
+        the batch which is still sent, and messages after closing are logged
+        and written to the fallback sink.
+
+        Parameters
+        ----------
+        timeout : float
+            Seconds to wait for the delivery (default=30)
+
+        Returns
+        -------
+
+        """
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        try:
+            self._queue.put(None, timeout=timeout)
+            self._thread.join(timeout)
+        except queue.Full:
+            pass
+        if not self._thread.is_alive():
+            return
+        unsent = [self._sending, self._pending]
+        self._pending = None
+        while True:
+            try:
+                unsent.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        unsent = [text for text in unsent if text is not None]
+        logger.warning(
+            f"{len(unsent)} notifications not delivered in time, write them "
+            "to the fallback."
+        )
+        for text in unsent:
+            logger.warning(f"Notification not delivered:\n{text}")
+            self.fallback(text)
+
+
 class TelegramReporter(object):
     """ """
 
@@ -223,7 +420,7 @@ class TelegramReporter(object):
         self.runtime_errors = []
         self.failure_verbosity = options.get("failure_verbosity", 0)
         self.outstream = outstream
-        self.telegram = telegram_bot_sendtext
+        self.telegram = Notifier()
         self.start_time = {}
         self.status = {}
         self.run = set()
@@ -464,3 +661,6 @@ class TelegramReporter(object):
             self.telegram(text=statistic)
             # Deactivated as messages became to big
             # self.telegram(text=summary)
+
+        # deliver remaining notifications before doit exits
+        self.telegram.close()
@@ -0,0 +1,303 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+import scipy.sparse as sp
+
+pytest.importorskip("edisgo")
+
+from lobaflex.opt import dispatch_optimization  # noqa: E402
+
+CONFIG = {
+    "cache_dnm": False,
+    "feeder_workers": 2,
+    "options": {"threads": 2},
+    "timesteps_per_iteration": 2,
+    "iterations_per_era": 3,
+    "overlap_iterations": 1,
+    "solver": "gurobi",
+    "persistent_solver": False,
+    "warm_start": False,
+    "n-1": False,
+    "save_lp_files": False,
+    "save_solver_logs": False,
+}
+
+
+class ThreadExecutor(ThreadPoolExecutor):
+    """Executor running the feeders in threads of the test process."""
+
+    def __init__(self, max_workers=None, mp_context=None):
+        super().__init__(max_workers=max_workers)
+
+
+class FakeEDisGo:
+    timeseries = SimpleNamespace(timeindex=pd.date_range("2011", periods=4))
+
+    def analyze(self, timesteps=None):
+        pass
+
+
+@pytest.fixture
+def rolling_horizon_calls(monkeypatch, tmp_path):
+    calls = []
+
+    def rolling_horizon_optimization(edisgo_obj, grid_id, feeder_id, **kwargs):
+        calls.append(dict(kwargs, feeder_id=feeder_id))
+        if kwargs["collect_results"]:
+            return {
+                "charging_hp_el": pd.DataFrame(
+                    {f"hp_{feeder_id}": [1.0, 2.0]},
+                    index=pd.date_range("2011", periods=2, freq="h"),
+                )
+            }
+
+    def long_term_optimization(*args, **kwargs):
+        raise AssertionError("long-term optimization with rolling horizon")
+
+    monkeypatch.setattr(
+        dispatch_optimization,
+        "rolling_horizon_optimization",
+        rolling_horizon_optimization,
+    )
+    monkeypatch.setattr(
+        dispatch_optimization, "long_term_optimization", long_term_optimization
+    )
+    monkeypatch.setattr(
+        dispatch_optimization,
+        "load_stage_edisgo",
+        lambda *args, **kwargs: FakeEDisGo(),
+    )
+    monkeypatch.setattr(
+        dispatch_optimization, "get_config", lambda path: CONFIG
+    )
+    monkeypatch.setattr(
+        dispatch_optimization, "setup_logging", lambda **kwargs: None
+    )
+    monkeypatch.setattr(dispatch_optimization, "results_dir", tmp_path)
+    monkeypatch.setattr(dispatch_optimization, "logs_dir", tmp_path)
+    monkeypatch.setattr(
+        dispatch_optimization, "ProcessPoolExecutor", ThreadExecutor
+    )
+    return calls
+
+
+def test_rolling_horizon_returns_results(rolling_horizon_calls, tmp_path):
+    results = dispatch_optimization.run_dispatch_optimization(
+        obj_or_path=tmp_path / "reference" / "feeder" / "01",
+        grid_id=1111,
+        feeder_id=1,
+        objective="minimize_loading",
+        rolling_horizon={"pot": False, "load": True},
+        run_id="test",
+        solver_options={"threads": 1},
+        return_results=True,
+    )
+
+    assert list(results) == ["charging_hp_el"]
+    assert rolling_horizon_calls[0]["solver_options"] == {"threads": 1}
+
+
+def test_parallel_rolling_horizon(rolling_horizon_calls, monkeypatch):
+    exported = {}
+    monkeypatch.setattr(
+        dispatch_optimization,
+        "export_concatenated_results",
+        lambda results, export_path: exported.update(results),
+    )
+
+    dispatch_optimization.run_dispatch_optimization_parallel(
+        grid_id=1111,
+        feeders=[2, 1],
+        objective="minimize_loading",
+        directory=dispatch_optimization.Path("reference") / "feeder",
+        rolling_horizon={"pot": False, "load": True},
+        run_id="test",
+    )
+
+    assert sorted(call["feeder_id"] for call in rolling_horizon_calls) == [
+        "01",
+        "02",
+    ]
+    assert all(call["collect_results"] for call in rolling_horizon_calls)
+    threads = dispatch_optimization.get_worker_threads(2)
+    assert all(
+        call["solver_options"] == {"threads": threads}
+        for call in rolling_horizon_calls
+    )
+    df = exported[("1111", "charging_hp_el")]
+    assert list(df.columns) == ["hp_01", "hp_02"]
+
+
+@pytest.fixture
+def model_calls(monkeypatch):
+    calls = []
+
+    def setup_model(**kwargs):
+        calls.append(dict(kwargs, setup=True))
+        return "model"
+
+    def update_model(**kwargs):
+        calls.append(dict(kwargs, setup=False))
+        return "model"
+
+    monkeypatch.setattr(
+        dispatch_optimization,
+        "lopf",
+        SimpleNamespace(setup_model=setup_model, update_model=update_model),
+    )
+    monkeypatch.setattr(
+        dispatch_optimization, "get_config", lambda path: CONFIG
+    )
+    monkeypatch.setattr(
+        dispatch_optimization,
+        "get_result_sink",
+        lambda *args, **kwargs: nullcontext(),
+    )
+    monkeypatch.setattr(
+        dispatch_optimization,
+        "solver_context",
+        lambda solver, **kwargs: nullcontext(solver),
+    )
+    monkeypatch.setattr(
+        dispatch_optimization, "solve_iteration", lambda *args: {}
+    )
+    monkeypatch.setattr(
+        dispatch_optimization, "export_results", lambda **kwargs: {}
+    )
+    monkeypatch.setattr(
+        dispatch_optimization,
+        "update_start_values",
+        lambda result_dict, fixed_parameters: {
+            "energy_level_starts": "previous",
+            "charging_starts": "previous",
+        },
+    )
+    return calls
+
+
+def optimize_iterations(iterations, **kwargs):
+    return dispatch_optimization.optimize_rolling_horizon_iterations(
+        fixed_parameters=kwargs.pop("fixed_parameters", {}),
+        flexible_loads={},
+        timeframe=pd.date_range("2011", periods=12, freq="h"),
+        iterations=iterations,
+        grid_id=1111,
+        feeder_id="01",
+        objective="minimize_loading",
+        export_path=None,
+        options={},
+        **kwargs,
+    )
+
+
+def reset_iterations(calls, iterations):
+    return [
+        iteration
+        for iteration, call in zip(iterations, calls)
+        if call["energy_level_starts"] != "previous"
+    ]
+
+
+def test_serial_start_value_reset(model_calls):
+    optimize_iterations(range(6))
+
+    # reset every timesteps_per_iteration iterations as before
+    assert reset_iterations(model_calls, range(6)) == [0, 2, 4]
+    assert [call["setup"] for call in model_calls] == [True] + [False] * 5
+
+
+def test_era_setup_with_energy_level_end(model_calls, monkeypatch):
+    monkeypatch.setitem(CONFIG, "iterations_per_era", 1)
+
+    optimize_iterations(range(2, 3))
+
+    assert reset_iterations(model_calls, range(2, 3)) == [2]
+    assert model_calls[0]["setup"]
+    assert model_calls[0]["energy_level_end_tes"] is True
+    assert model_calls[0]["energy_level_end_ev"] is True
+
+
+@pytest.fixture
+def rolling_horizon_inputs(monkeypatch):
+    monkeypatch.setattr(
+        dispatch_optimization, "convert_impedances_to_mv", lambda obj: obj
+    )
+    monkeypatch.setattr(
+        dispatch_optimization,
+        "prepare_input_parameters",
+        lambda *args, **kwargs: (
+            {},
+            {},
+            12,
+            pd.date_range("2011", periods=12, freq="h"),
+        ),
+    )
+    monkeypatch.setattr(
+        dispatch_optimization, "ProcessPoolExecutor", ThreadExecutor
+    )
+
+
+def optimize_rolling_horizon(era_workers):
+    return dispatch_optimization.rolling_horizon_optimization(
+        edisgo_obj=None,
+        grid_id=1111,
+        feeder_id=1,
+        objective="minimize_loading",
+        era_workers=era_workers,
+    )
+
+
+def model_inputs(calls):
+    """Inputs of the model per iteration, independent of set up or update."""
+    return sorted(
+        (
+            str(call["timesteps"][0]),
+            len(call["timesteps"]),
+            call["energy_level_starts"],
+            call["energy_level_end_ev"],
+        )
+        for call in calls
+    )
+
+
+def test_parallel_eras_equal_serial(
+    model_calls, rolling_horizon_inputs, monkeypatch
+):
+    monkeypatch.setitem(CONFIG, "iterations_per_era", 2)
+
+    optimize_rolling_horizon(era_workers=0)
+    serial = model_inputs(model_calls)
+    model_calls.clear()
+    optimize_rolling_horizon(era_workers=3)
+
+    assert len(serial) == 6
+    assert model_inputs(model_calls) == serial
+
+
+def test_parallel_eras_with_other_reset_refused(
+    model_calls, rolling_horizon_inputs
+):
+    with pytest.raises(ValueError, match="iterations_per_era"):
+        optimize_rolling_horizon(era_workers=2)
+    assert not model_calls
+
+
+def test_era_worker_converts_sparse_matrix(model_calls):
+    buses = pd.Index(["station", "a"])
+
+    optimize_iterations(
+        range(1),
+        fixed_parameters={"grid_object": None},
+        downstream_nodes_matrix=(sp.csr_matrix([[1, 1], [0, 1]]), buses),
+    )
+
+    fixed_parameters = model_calls[0]["fixed_parameters"]
+    pd.testing.assert_frame_equal(
+        fixed_parameters["downstream_nodes_matrix"],
+        pd.DataFrame([[1, 1], [0, 1]], index=buses, columns=buses),
+        check_dtype=False,
+    )
+    assert "grid_object" in fixed_parameters
@@ -0,0 +1,256 @@
+import networkx as nx
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("edisgo")
+
+from lobaflex.opt import dnm_generation  # noqa: E402
+
+
+class Grid:
+    """Radial grid with the attributes of an edisgo LVGrid used for the
+    downstream nodes matrix."""
+
+    def __init__(self, lines, buses=None, slack="station"):
+        buses = buses or dict.fromkeys(
+            [slack] + [bus for line in lines for bus in line]
+        )
+        self.buses_df = pd.DataFrame(index=pd.Index(list(buses)))
+        self.lines_df = pd.DataFrame(
+            lines,
+            columns=["bus0", "bus1"],
+            index=[f"line_{i}" for i in range(len(lines))],
+        )
+        self.transformers_df = pd.DataFrame({"bus0": ["mv"], "bus1": [slack]})
+
+    @property
+    def graph(self):
+        graph = nx.Graph()
+        graph.add_nodes_from(self.buses_df.index)
+        graph.add_edges_from(self.lines_df[["bus0", "bus1"]].values)
+        return graph
+
+
+def dense_downstream_nodes_matrix(grid):
+    """Reference implementation by recursion on a dense DataFrame."""
+
+    def fill(current_bus, current_feeder):
+        current_feeder.append(current_bus)
+        for neighbor in tree.successors(current_bus):
+            if neighbor not in visited and neighbor not in current_feeder:
+                fill(neighbor, current_feeder)
+        matrix.loc[current_feeder, current_bus] = 1
+        visited.append(current_bus)
+        current_feeder.pop()
+
+    buses = grid.buses_df.index
+    tree = nx.bfs_tree(grid.graph, grid.transformers_df.bus1.iloc[0])
+    matrix = pd.DataFrame(0, index=buses, columns=buses)
+    visited = []
+    fill(grid.transformers_df.bus1.iloc[0], [])
+    return matrix
+
+
+@pytest.fixture
+def grid():
+    return Grid(
+        [
+            ("station", "a"),
+            ("a", "b"),
+            ("b", "c"),
+            ("a", "d"),
+            ("station", "e"),
+            ("e", "f"),
+            ("f", "g"),
+            ("f", "h"),
+        ]
+    )
+
+
+def random_tree(n_buses, seed=0):
+    rng = np.random.default_rng(seed)
+    buses = ["station"] + [f"bus_{i}" for i in range(1, n_buses)]
+    lines = [(buses[rng.integers(i)], buses[i]) for i in range(1, n_buses)]
+    # bus order of buses_df differs from the tree order
+    return Grid(lines, buses=dict.fromkeys(rng.permutation(buses)))
+
+
+def assert_matches_dense_recursion(grid):
+    matrix, buses = dnm_generation.get_downstream_nodes_matrix_sparse(grid)
+
+    expected = dense_downstream_nodes_matrix(grid)
+    assert list(buses) == list(expected.index)
+    np.testing.assert_array_equal(matrix.toarray(), expected.values)
+
+
+def test_sparse_matches_dense_recursion(grid):
+    assert_matches_dense_recursion(grid)
+
+
+@pytest.mark.parametrize("n_buses", [2, 60, 300])
+def test_sparse_matches_dense_recursion_random(n_buses):
+    assert_matches_dense_recursion(random_tree(n_buses))
+
+
+def test_frame_matches_dense_recursion(grid):
+    df = dnm_generation.get_downstream_nodes_matrix_iterative(grid)
+
+    pd.testing.assert_frame_equal(
+        df, dense_downstream_nodes_matrix(grid), check_dtype=False
+    )
+
+
+def test_subtree_intervals(grid):
+    buses, order, entry, exit, parents = dnm_generation.get_subtree_intervals(
+        grid
+    )
+
+    tree = nx.bfs_tree(grid.graph, "station")
+    for a, bus_a in enumerate(buses):
+        descendants = nx.descendants(tree, bus_a) | {bus_a}
+        interval = {buses[i] for i in order[entry[a] : exit[a]]}
+        assert interval == descendants
+    assert buses[order[0]] == "station"
+    assert parents[buses.get_loc("station")] == -1
+    assert buses[parents[buses.get_loc("c")]] == "b"
+
+
+def test_subtree_intervals_unconnected_bus():
+    grid = Grid(
+        [("station", "a")], buses=dict.fromkeys(["a", "station", "island"])
+    )
+
+    matrix, buses = dnm_generation.get_downstream_nodes_matrix_sparse(grid)
+
+    _, _, entry, exit, parents = dnm_generation.get_subtree_intervals(grid)
+    assert entry[2] == exit[2] == parents[2] == -1
+    np.testing.assert_array_equal(
+        matrix.toarray(), [[1, 0, 0], [1, 1, 0], [0, 0, 0]]
+    )
+
+
+def test_long_feeder_exceeds_recursion_limit():
+    n_buses = 5000
+    buses = ["station"] + [f"bus_{i}" for i in range(1, n_buses)]
+    grid = Grid(list(zip(buses[:-1], buses[1:])))
+
+    matrix, _ = dnm_generation.get_downstream_nodes_matrix_sparse(grid)
+
+    # every bus is descendant of all buses before it on the feeder
+    assert matrix.nnz == n_buses * (n_buses + 1) // 2
+    assert matrix[0].nnz == n_buses
+    assert matrix[n_buses - 1].nnz == 1
+
+
+def test_topology_fingerprint(grid):
+    fingerprint = dnm_generation.get_topology_fingerprint(grid)
+
+    # line parameters and names don't change the topology
+    grid.lines_df["s_nom"] = 0.4
+    grid.lines_df.index = grid.lines_df.index[::-1]
+    assert dnm_generation.get_topology_fingerprint(grid) == fingerprint
+
+    grid.lines_df.loc["line_0", "bus1"] = "b"
+    assert dnm_generation.get_topology_fingerprint(grid) != fingerprint
+
+
+def test_cached_downstream_nodes_matrix(grid, tmp_path, monkeypatch):
+    matrix, buses = dnm_generation.get_cached_downstream_nodes_matrix(
+        grid, cache_dir=tmp_path
+    )
+    cache_files = list(tmp_path.glob("downstream_nodes_matrix_*.npz"))
+    assert len(cache_files) == 1
+
+    def compute(grid):
+        raise AssertionError("matrix computed despite cache")
+
+    monkeypatch.setattr(
+        dnm_generation, "_get_downstream_nodes_matrix", compute
+    )
+    cached, cached_buses = dnm_generation.get_cached_downstream_nodes_matrix(
+        grid, cache_dir=tmp_path
+    )
+    assert (cached != matrix).nnz == 0
+    assert list(cached_buses) == list(buses)
+
+
+def test_stale_cache_file_is_replaced(grid, tmp_path):
+    dnm_generation.get_cached_downstream_nodes_matrix(grid, cache_dir=tmp_path)
+    (stale_file,) = tmp_path.glob("downstream_nodes_matrix_*.npz")
+
+    grid.lines_df.loc["line_3", "bus0"] = "c"
+    matrix, _ = dnm_generation.get_cached_downstream_nodes_matrix(
+        grid, cache_dir=tmp_path
+    )
+
+    (cache_file,) = tmp_path.glob("downstream_nodes_matrix_*.npz")
+    assert cache_file != stale_file
+    expected = dense_downstream_nodes_matrix(grid)
+    np.testing.assert_array_equal(matrix.toarray(), expected.values)
+
+
+def split_line(grid, line, bus):
+    """Splits the line by a new bus as after reinforcement."""
+    bus1 = grid.lines_df.at[line, "bus1"]
+    grid.buses_df = grid.buses_df.reindex(
+        grid.buses_df.index.append(pd.Index([bus]))
+    )
+    grid.lines_df.loc[line, "bus1"] = bus
+    grid.lines_df.loc[f"{line}_split"] = [bus, bus1]
+
+
+def move_subtree(grid):
+    """Connects the subtree of f to d instead of e."""
+    grid.lines_df.loc["line_5", "bus0"] = "d"
+
+
+def remove_leaf(grid):
+    grid.buses_df = grid.buses_df.drop("h")
+    grid.lines_df = grid.lines_df.drop("line_7")
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        lambda grid: split_line(grid, "line_1", "new"),
+        lambda grid: split_line(grid, "line_4", "new"),
+        move_subtree,
+        remove_leaf,
+    ],
+    ids=["split", "split_at_station", "move_subtree", "remove_leaf"],
+)
+def test_update_matches_rebuild(grid, change):
+    matrix, buses, parents = dnm_generation._get_downstream_nodes_matrix(grid)
+    parents = dnm_generation._get_parent_names(buses, parents)
+
+    change(grid)
+    updated, new_buses, _ = dnm_generation.update_downstream_nodes_matrix(
+        grid, matrix, buses, parents
+    )
+
+    expected = dense_downstream_nodes_matrix(grid)
+    assert list(new_buses) == list(expected.index)
+    np.testing.assert_array_equal(updated.toarray(), expected.values)
+
+
+def test_cache_miss_patches_base_file(grid, tmp_path, monkeypatch):
+    base_dir = tmp_path / "reference"
+    dnm_generation.get_cached_downstream_nodes_matrix(grid, cache_dir=base_dir)
+    base_files = list(base_dir.glob("*.npz"))
+
+    def compute(grid):
+        raise AssertionError("matrix computed instead of patched")
+
+    monkeypatch.setattr(
+        dnm_generation, "_get_downstream_nodes_matrix", compute
+    )
+    split_line(grid, "line_5", "new")
+    matrix, _ = dnm_generation.get_cached_downstream_nodes_matrix(
+        grid, cache_dir=tmp_path / "reinforced", base_files=base_files
+    )
+
+    # base file of the previous stage is kept
+    assert base_files[0].is_file()
+    expected = dense_downstream_nodes_matrix(grid)
+    np.testing.assert_array_equal(matrix.toarray(), expected.values)
@@ -0,0 +1,128 @@
+import pickle
+
+from types import SimpleNamespace
+
+import doit
+import pytest
+
+from doit.task import Stream, Task
+
+from lobaflex.tools import ledger
+
+
+@pytest.fixture
+def measurement_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(ledger, "MEASUREMENT_DIR", tmp_path / "measurements")
+    return tmp_path / "measurements"
+
+
+def optimize(grid_id, feeder_id):
+    return {"objective": grid_id + feeder_id}
+
+
+def optimize_task(task, grid_id):
+    return {"task": task.name}
+
+
+def test_result_is_unchanged(measurement_dir):
+    task = Task(
+        "min_pot:1111/01",
+        [
+            (
+                ledger.measure_resources(optimize),
+                [],
+                {"grid_id": 1111, "feeder_id": 1},
+            )
+        ],
+    )
+
+    assert task.execute(Stream(0)) is None
+
+    assert task.result == {"objective": 1112}
+    assert task.values == {"objective": 1112}
+    measurement = ledger.pop_measurement(task.name)
+    assert set(measurement) == {
+        "wall_time",
+        "cpu_time",
+        "peak_rss",
+        "solver_time",
+    }
+    assert measurement["peak_rss"] > 0
+    # removed after it was taken
+    assert ledger.pop_measurement(task.name) == {}
+
+
+def test_task_parameter_of_action(measurement_dir):
+    task = Task(
+        "min_pot:1111/01",
+        [(ledger.measure_resources(optimize_task), [], {"grid_id": 1111})],
+    )
+
+    task.execute(Stream(0))
+
+    assert task.result == {"task": "min_pot:1111/01"}
+    assert ledger.pop_measurement(task.name)
+
+
+def test_measured_action_outside_doit(measurement_dir):
+    action = pickle.loads(pickle.dumps(ledger.measure_resources(optimize)))
+
+    assert action(1111, 1) == {"objective": 1112}
+    result, measurement = action.measure(1111, feeder_id=1)
+    assert result == {"objective": 1112}
+    assert measurement["wall_time"] >= 0
+    assert not measurement_dir.exists()
+
+
+class Reporter:
+    def initialize(self, tasks, selected_tasks):
+        pass
+
+    def execute_task(self, task):
+        pass
+
+    def add_success(self, task):
+        pass
+
+    def add_failure(self, task, fail):
+        pass
+
+
+class LedgerReporter(ledger.LedgerReporterMixin, Reporter):
+    pass
+
+
+def test_reporter_adds_measurement_to_ledger(
+    tmp_path, measurement_dir, monkeypatch
+):
+    version_db = {"current": {"run_id": "test", "version": 2}}
+    monkeypatch.setattr(
+        doit.Globals,
+        "dep_manager",
+        SimpleNamespace(get_result=lambda name: version_db),
+    )
+    reporter = LedgerReporter()
+    reporter.ledger = ledger.RuntimeLedger(tmp_path / "ledger.sqlite")
+    task = Task(
+        "min_pot:1111/01",
+        [
+            (
+                ledger.measure_resources(optimize),
+                [],
+                {"grid_id": 1111, "feeder_id": 1},
+            )
+        ],
+    )
+
+    reporter.initialize([task], [task.name])
+    reporter.execute_task(task)
+    task.execute(Stream(0))
+    reporter.add_success(task)
+
+    (record,) = reporter.ledger.query().to_dict("records")
+    assert record["task"] == task.name
+    assert record["status"] == "success"
+    assert (record["run_id"], record["version"]) == ("test", 2)
+    assert record["peak_rss"] > 0
+    assert task.result == {"objective": 1112}
+    assert not list(measurement_dir.iterdir())
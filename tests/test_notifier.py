@@ -0,0 +1,63 @@
+import threading
+
+from lobaflex.tools.tools import FileSink, Notifier, split_text
+
+
+def test_split_text_at_line_breaks():
+    text = "\n".join(f"line {i:03d}" for i in range(100))
+
+    parts = split_text(text, max_length=100)
+
+    assert all(len(part) <= 100 for part in parts)
+    assert "\n".join(parts) == text
+    assert all(part.startswith("line") for part in parts)
+    assert split_text("x" * 250, max_length=100) == [
+        "x" * 100,
+        "x" * 100,
+        "x" * 50,
+    ]
+
+
+def test_long_message_is_split():
+    sent = []
+    notifier = Notifier(
+        send=lambda text: sent.append(text),
+        fallback=lambda text: None,
+        batch_interval=0,
+        max_batch_length=100,
+    )
+    text = "\n".join(f"error {i:03d}" for i in range(50))
+
+    notifier(text)
+    notifier.close()
+
+    assert all(len(batch) <= 100 for batch in sent)
+    assert "\n".join(sent).split() == text.split()
+
+
+def test_unsent_messages_written_to_fallback(tmp_path, caplog):
+    release = threading.Event()
+    sending = threading.Event()
+
+    def send(text):
+        sending.set()
+        release.wait()
+
+    sink = FileSink(tmp_path / "notifications.log")
+    notifier = Notifier(
+        send=send, fallback=sink, batch_interval=1, max_batch_length=12
+    )
+    # the second message doesn't fit into the batch and is kept for the next
+    notifier("first")
+    notifier("second-long")
+    sending.wait()
+    notifier("third")
+
+    notifier.close(timeout=0.2)
+    release.set()
+
+    assert notifier._pending is None
+    written = sink.path.read_text()
+    for text in ["first", "second-long", "third"]:
+        assert text in written
+        assert f"not delivered:\n{text}" in caplog.text
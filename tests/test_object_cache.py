@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+
+from lobaflex.tools import object_cache
+from lobaflex.tools.object_cache import ObjectCache
+
+
+def frame(n_rows=100):
+    return pd.DataFrame({"a": np.arange(n_rows, dtype=float)})
+
+
+def test_put_and_get_copy(tmp_path):
+    cache = ObjectCache(max_bytes=2**20)
+    obj = {"df": frame()}
+
+    cache.put(tmp_path, obj)
+    # changes after put and of the given copy don't change the cache
+    obj["df"].loc[0, "a"] = -1
+    cached = cache.get(tmp_path)
+    cached["df"].loc[1, "a"] = -1
+
+    assert cache.get(tmp_path)["df"].loc[0:1, "a"].tolist() == [0, 1]
+
+
+def test_key_mismatch(tmp_path):
+    cache = ObjectCache(max_bytes=2**20)
+    cache.put(tmp_path, {"df": frame()}, key=frozenset(["topology"]))
+
+    assert cache.get(tmp_path) is None
+    assert cache.get(tmp_path, key=frozenset(["results"])) is None
+    assert cache.get(tmp_path, key=frozenset(["topology"])) is not None
+
+
+def test_changed_directory_invalidates(tmp_path):
+    cache = ObjectCache(max_bytes=2**20)
+    cache.put(tmp_path, {"df": frame()})
+
+    (tmp_path / "buses.csv").write_text("name\n")
+
+    assert cache.get(tmp_path) is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_dropped(tmp_path):
+    size = frame().memory_usage(index=True).sum()
+    cache = ObjectCache(max_bytes=2.5 * size)
+    paths = [tmp_path / str(i) for i in range(3)]
+    for path in paths:
+        path.mkdir()
+
+    cache.put(paths[0], frame())
+    cache.put(paths[1], frame())
+    cache.get(paths[0])
+    cache.put(paths[2], frame())
+
+    assert cache.get(paths[1]) is None
+    assert cache.get(paths[0]) is not None
+    assert cache.get(paths[2]) is not None
+    assert cache.put(tmp_path, frame(1000)) is None
+
+
+def test_object_exceeding_budget_is_not_copied(tmp_path, monkeypatch):
+    cache = ObjectCache(max_bytes=2**10)
+
+    def fail(obj):
+        raise AssertionError("object copied")
+
+    monkeypatch.setattr(object_cache, "deepcopy", fail)
+
+    assert cache.put(tmp_path, frame(1000)) is None
+    assert len(cache) == 0
@@ -0,0 +1,130 @@
+import os
+
+import pytest
+
+from lobaflex.tools import pydoit
+
+CONFIG = {"run_id": "test", "version": 0, "objective": "minimize_loading"}
+
+
+@pytest.fixture
+def config(monkeypatch):
+    config = dict(CONFIG)
+    monkeypatch.setattr(pydoit, "get_config", lambda path: config)
+    return config
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    (tmp_path / "feeder").mkdir()
+    (tmp_path / "feeder" / "buses.csv").write_text("name\nbus_1\n")
+    (tmp_path / "config.yaml").write_text("a: 1\n")
+    return [tmp_path / "feeder", tmp_path / "config.yaml"]
+
+
+def run_task(uptodate):
+    """Check and save the values like doit for a task which ran."""
+    values = {}
+    assert not uptodate(None, values)
+    values.update(uptodate.save_values())
+    return values
+
+
+def is_uptodate(inputs, values):
+    # a new instance as in a new doit process
+    uptodate = pydoit.content_uptodate(
+        inputs, config_keys=["objective"], functions=[run_task]
+    )
+    return uptodate(None, values)
+
+
+def test_unchanged_inputs_are_uptodate(inputs, config):
+    uptodate = pydoit.content_uptodate(
+        inputs, config_keys=["objective"], functions=[run_task]
+    )
+    values = run_task(uptodate)
+
+    assert is_uptodate(inputs, values)
+    assert is_uptodate(inputs, values)
+
+
+def test_touched_file_is_uptodate(inputs, config):
+    values = run_task(
+        pydoit.content_uptodate(
+            inputs, config_keys=["objective"], functions=[run_task]
+        )
+    )
+
+    file = inputs[0] / "buses.csv"
+    os.utime(file, ns=(0, file.stat().st_mtime_ns + 10**9))
+
+    assert is_uptodate(inputs, values)
+
+
+def test_derived_files_are_ignored(inputs, config):
+    values = run_task(
+        pydoit.content_uptodate(
+            inputs, config_keys=["objective"], functions=[run_task]
+        )
+    )
+
+    (inputs[0] / "downstream_nodes_matrix_abc.npz").write_bytes(b"0")
+
+    assert is_uptodate(inputs, values)
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        lambda inputs, config: (inputs[0] / "buses.csv").write_text(
+            "name\nbus_2\n"
+        ),
+        lambda inputs, config: (inputs[0] / "lines.csv").write_text("name\n"),
+        lambda inputs, config: (inputs[0] / "buses.csv").unlink(),
+        lambda inputs, config: config.update(objective="minimize_energy"),
+        lambda inputs, config: config.update(version=1),
+    ],
+    ids=["changed", "added", "removed", "config_key", "version"],
+)
+def test_changed_inputs_are_not_uptodate(inputs, config, change):
+    values = run_task(
+        pydoit.content_uptodate(
+            inputs, config_keys=["objective"], functions=[run_task]
+        )
+    )
+
+    change(inputs, config)
+
+    assert not is_uptodate(inputs, values)
+
+
+def test_other_config_keys_are_ignored(inputs, config):
+    values = run_task(
+        pydoit.content_uptodate(
+            inputs, config_keys=["objective"], functions=[run_task]
+        )
+    )
+
+    config["solver"] = "highs"
+
+    assert is_uptodate(inputs, values)
+
+
+def test_changed_helper_module_is_not_uptodate(
+    inputs, config, tmp_path, monkeypatch
+):
+    source_dir = tmp_path / "lobaflex"
+    (source_dir / "opt").mkdir(parents=True)
+    helper = source_dir / "opt" / "solver.py"
+    helper.write_text("TIMEOUT = 1\n")
+    monkeypatch.setattr(pydoit, "SOURCE_DIR", source_dir)
+    values = run_task(
+        pydoit.content_uptodate(
+            inputs, config_keys=["objective"], functions=[run_task]
+        )
+    )
+    assert is_uptodate(inputs, values)
+
+    helper.write_text("TIMEOUT = 10\n")
+
+    assert not is_uptodate(inputs, values)
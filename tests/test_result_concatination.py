@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("edisgo")
+
+from lobaflex.opt import result_concatination  # noqa: E402
+from lobaflex.tools.result_store import CsvResultSink  # noqa: E402
+
+GRID = 1111
+
+
+def write_results(path, feeders=("01", "02"), iterations=4):
+    rng = np.random.default_rng(0)
+    for feeder in feeders:
+        export_path = path / "results" / feeder
+        export_path.mkdir(parents=True)
+        with CsvResultSink(export_path, GRID, feeder) as sink:
+            for iteration in range(iterations):
+                index = pd.date_range(
+                    "2011-01-01", periods=3, freq="h"
+                ) + pd.Timedelta(hours=3 * iteration)
+                sink.write(
+                    "charging_hp",
+                    iteration,
+                    pd.DataFrame(
+                        rng.random((3, 2)),
+                        index=index,
+                        columns=[f"hp_{feeder}_{i}" for i in range(2)],
+                    ),
+                )
+                # slacks only contain time steps with values
+                sink.write(
+                    "slack_v_pos",
+                    iteration,
+                    pd.DataFrame(
+                        {f"bus_{feeder}": rng.random(1)},
+                        index=index[[int(feeder) % 3]],
+                    ),
+                )
+                sink.write(
+                    "slack_initial",
+                    iteration,
+                    pd.DataFrame(
+                        {"slack_initial": rng.random(2)},
+                        index=[f"ev_{feeder}_{i}" for i in range(2)],
+                    ),
+                )
+    return path / "results"
+
+
+def old_concat_results(path, fillna=None):
+    """Reference implementation concatenating feeder by feeder."""
+    mapping = result_concatination.get_result_file_mapping(path)
+    collected_results = {}
+    for group, grid_param in mapping.groupby(["grid", "parameter"]):
+        df_grid_parameter = pd.DataFrame()
+        for feeder, grid_param_feeder in grid_param.groupby("feeder"):
+            df_all_iterations = pd.concat(
+                [
+                    pd.read_csv(file, index_col=0, parse_dates=True)
+                    for file in grid_param_feeder.file
+                ],
+                axis=0,
+            )
+            if "slack_initial" in group[1]:
+                df_all_iterations = df_all_iterations.T
+            df_grid_parameter = pd.concat(
+                [df_grid_parameter, df_all_iterations], axis=1
+            )
+        if fillna is not None:
+            df_grid_parameter = df_grid_parameter.fillna(**fillna)
+        collected_results[group] = df_grid_parameter
+    return collected_results
+
+
+def test_concat_matches_feeder_by_feeder(tmp_path):
+    path = write_results(tmp_path / str(GRID) / "minimize_loading")
+
+    results = result_concatination.concat_results(path, fillna={"value": 0})
+
+    expected = old_concat_results(path, fillna={"value": 0})
+    assert list(results) == list(expected)
+    assert list(results) == [
+        (str(GRID), "charging_hp"),
+        (str(GRID), "slack_initial"),
+        (str(GRID), "slack_v_pos"),
+    ]
+    for group, df in results.items():
+        pd.testing.assert_frame_equal(
+            df, expected[group], check_freq=False, check_dtype=False
+        )
+
+
+def test_concat_iterations_in_numeric_order(tmp_path):
+    path = write_results(tmp_path / "minimize_loading", iterations=12)
+
+    results = result_concatination.concat_results(
+        path, parameters=["charging_hp"]
+    )
+
+    (df,) = results.values()
+    assert df.index.is_monotonic_increasing
+    assert len(df) == 36
+    assert list(df.columns) == [
+        "hp_01_0",
+        "hp_01_1",
+        "hp_02_0",
+        "hp_02_1",
+    ]
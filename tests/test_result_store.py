@@ -0,0 +1,209 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from lobaflex.tools import result_store
+
+
+def iteration_results(iteration, columns=("hp_1", "hp_2")):
+    index = pd.date_range("2011-01-01", periods=3, freq="h") + pd.Timedelta(
+        hours=3 * iteration
+    )
+    return pd.DataFrame(
+        [[iteration + 0.5 * i] * len(columns) for i in range(3)],
+        index=index,
+        columns=list(columns),
+    )
+
+
+def read_results(files):
+    return result_store.parse_time_index(
+        pd.concat(
+            [result_store.read_result_file(file) for file in sorted(files)]
+        )
+    )
+
+
+@pytest.mark.parametrize(
+    "sink_class, extension",
+    [
+        (result_store.CsvResultSink, "csv"),
+        pytest.param(
+            result_store.ParquetResultSink,
+            "parquet",
+            marks=pytest.mark.skipif(
+                result_store.pq is None, reason="pyarrow not installed"
+            ),
+        ),
+    ],
+)
+def test_sink_round_trip(tmp_path, sink_class, extension):
+    with sink_class(tmp_path, 1111, "01") as sink:
+        for iteration in range(3):
+            sink.write("charging_hp", iteration, iteration_results(iteration))
+
+    files = list(tmp_path.glob(f"charging_hp_1111-01_*.{extension}"))
+    expected = pd.concat(iteration_results(i) for i in range(3))
+    pd.testing.assert_frame_equal(
+        read_results(files), expected, check_freq=False, check_index_type=False
+    )
+
+
+def test_sink_without_write_is_refused(tmp_path):
+    class Sink(result_store.ResultSink):
+        def get_file_path(self, res_name, iteration):
+            return tmp_path / f"{res_name}_{iteration}.csv"
+
+    with pytest.raises(TypeError):
+        Sink(tmp_path, 1111, "01")
+
+
+def test_parquet_sink_starts_part_on_new_columns(tmp_path):
+    pytest.importorskip("pyarrow")
+
+    with result_store.ParquetResultSink(tmp_path, 1111, "01") as sink:
+        sink.write("slack", 0, iteration_results(0))
+        sink.write("slack", 1, iteration_results(1))
+        sink.write("slack", 2, iteration_results(2, columns=["hp_1"]))
+
+    files = sorted(tmp_path.glob("*.parquet"))
+    assert [file.name for file in files] == [
+        "slack_1111-01_part_0.parquet",
+        "slack_1111-01_part_2.parquet",
+    ]
+    records = [result_store.parse_result_file_name(file) for file in files]
+    assert [record["iteration"] for record in records] == [0, 2]
+    assert len(result_store.read_result_file(files[0])) == 6
+
+
+class FailingSink(result_store.CsvResultSink):
+    def write(self, res_name, iteration, res):
+        raise OSError("disk full")
+
+
+def test_background_writer_round_trip(tmp_path):
+    sink = result_store.CsvResultSink(tmp_path, 1111, "01")
+    with result_store.BackgroundResultWriter(sink, maxsize=1) as writer:
+        for iteration in range(3):
+            res = iteration_results(iteration)
+            writer.write("charging_hp", iteration, res)
+            # queued results are snapshots
+            res.loc[:, :] = -1
+
+    expected = pd.concat(iteration_results(i) for i in range(3))
+    pd.testing.assert_frame_equal(
+        read_results(tmp_path.glob("*.csv")),
+        expected,
+        check_freq=False,
+        check_index_type=False,
+    )
+
+
+def test_background_writer_raises_error_on_close(tmp_path):
+    sink = FailingSink(tmp_path, 1111, "01")
+    with pytest.raises(OSError, match="disk full"):
+        with result_store.BackgroundResultWriter(sink) as writer:
+            writer.write("charging_hp", 0, iteration_results(0))
+
+
+def test_background_writer_keeps_exception_of_context(tmp_path, caplog):
+    sink = FailingSink(tmp_path, 1111, "01")
+    with pytest.raises(ValueError, match="Results not valid"):
+        with result_store.BackgroundResultWriter(sink) as writer:
+            writer.write("charging_hp", 0, iteration_results(0))
+            writer._queue.join()
+            raise ValueError("Results not valid")
+
+    assert "disk full" in caplog.text
+
+
+@pytest.fixture
+def run_dir(tmp_path, monkeypatch):
+    from lobaflex.tools import manifest
+
+    monkeypatch.setattr(manifest, "results_dir", tmp_path)
+    monkeypatch.setattr(
+        manifest, "get_config", lambda path: {"result_manifest": True}
+    )
+    export_path = tmp_path / "run" / "1111" / "minimize_loading" / "results"
+    (export_path / "01").mkdir(parents=True)
+    sink = result_store.CsvResultSink(
+        export_path / "01",
+        1111,
+        "01",
+        manifest=manifest.ResultManifest(tmp_path / "run"),
+    )
+    with sink:
+        for iteration in range(2):
+            sink.write("charging_hp", iteration, iteration_results(iteration))
+    return export_path
+
+
+def test_find_result_files_in_manifest(run_dir, monkeypatch):
+    def scan(path, pattern="*"):
+        raise AssertionError("directory scanned despite manifest")
+
+    monkeypatch.setattr(result_store, "get_result_files_in_subdirs", scan)
+    df = result_store.find_result_files(run_dir, kind="iteration")
+
+    assert [Path(file).name for file in df.file] == [
+        "charging_hp_1111-01_iteration_0.csv",
+        "charging_hp_1111-01_iteration_1.csv",
+    ]
+    assert set(df.objective) == {"minimize_loading"}
+
+
+def test_find_result_files_not_in_manifest(run_dir):
+    # written without manifest, e.g. by a previous version
+    iteration_results(2).to_csv(
+        run_dir / "01" / "charging_hp_1111-01_iteration_2.csv"
+    )
+
+    df = result_store.find_result_files(run_dir)
+
+    assert list(df.iteration) == [0, 1, 2]
+    assert set(df.objective) == {"minimize_loading"}
+
+
+def test_find_result_files_in_new_directory(run_dir):
+    (run_dir / "02").mkdir()
+    iteration_results(0).to_csv(
+        run_dir / "02" / "charging_hp_1111-02_iteration_0.csv"
+    )
+
+    df = result_store.find_result_files(run_dir)
+
+    assert list(df.feeder) == ["01", "01", "02"]
+
+
+def test_find_result_files_removed_from_disk(run_dir):
+    (run_dir / "01" / "charging_hp_1111-01_iteration_0.csv").unlink()
+
+    df = result_store.find_result_files(run_dir)
+
+    assert list(df.iteration) == [1]
+
+
+def test_find_result_files_of_recomputed_feeder(run_dir):
+    from lobaflex.tools import manifest
+
+    manifest.remove_from_manifest(run_dir / "01")
+    (run_dir / "01" / "charging_hp_1111-01_iteration_1.csv").unlink()
+
+    df = result_store.find_result_files(run_dir)
+
+    assert list(df.iteration) == [0]
+
+
+def test_manifest_checksums_on_request(run_dir, monkeypatch):
+    from lobaflex.tools import manifest
+
+    result_manifest = manifest.get_manifest(run_dir)
+    assert result_manifest.query().checksum.isna().all()
+
+    assert result_manifest.update_checksums(run_dir) == 2
+    df = result_manifest.query()
+    assert list(df.checksum) == [manifest.file_checksum(f) for f in df.file]
+    # unchanged files aren't read again
+    assert result_manifest.update_checksums() == 0
@@ -0,0 +1,108 @@
+import os
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("edisgo")
+
+from lobaflex.tools import scheduling  # noqa: E402
+
+
+def write_feeder(path, n_buses=10, n_heat_pumps=2, timesteps=48):
+    (path / "topology").mkdir(parents=True)
+    (path / "timeseries").mkdir()
+    pd.DataFrame(index=[f"bus_{i}" for i in range(n_buses)]).to_csv(
+        path / "topology" / "buses.csv"
+    )
+    pd.DataFrame(
+        {"type": ["heat_pump"] * n_heat_pumps + ["conventional_load"]}
+    ).to_csv(path / "topology" / "loads.csv")
+    index = pd.date_range("2011-01-01", periods=timesteps, freq="h")
+    pd.DataFrame({"load_1": 1.0}, index=index).to_csv(
+        path / "timeseries" / "loads_active_power.csv"
+    )
+    return path
+
+
+def test_cost_by_timesteps_of_dump(tmp_path):
+    write_feeder(tmp_path / "01", timesteps=48)
+    write_feeder(tmp_path / "02", timesteps=24)
+
+    assert scheduling.estimate_feeder_cost(tmp_path / "01") == 18 * 48
+    assert scheduling.estimate_feeder_cost(tmp_path / "02") == 18 * 24
+
+
+def test_cost_of_parquet_snapshot(tmp_path):
+    pytest.importorskip("pyarrow")
+    path = write_feeder(tmp_path / "01", timesteps=48)
+    (path / "timeseries" / "loads_active_power.csv").unlink()
+    (path / scheduling.SNAPSHOT_DIR).mkdir()
+    index = pd.date_range("2011-01-01", periods=24, freq="h")
+    pd.DataFrame(index=index).to_parquet(
+        path / scheduling.SNAPSHOT_DIR / "timeindex.parquet"
+    )
+
+    assert scheduling.estimate_feeder_cost(path) == 18 * 24
+
+
+def test_cost_without_timeseries(tmp_path):
+    path = write_feeder(tmp_path / "01")
+    (path / "timeseries" / "loads_active_power.csv").unlink()
+
+    assert scheduling.estimate_feeder_cost(path) is None
+
+
+def test_cached_cost_of_unchanged_dump(tmp_path, monkeypatch):
+    path = write_feeder(tmp_path / "01")
+    cache_file = tmp_path / "task_costs.json"
+    cache = scheduling.load_cost_cache(cache_file)
+    scheduling.get_cached_feeder_cost(path, cache)
+    scheduling.save_cost_cache(cache, cache_file)
+
+    def estimate(feeder_path):
+        raise AssertionError("cost estimated despite cache")
+
+    monkeypatch.setattr(scheduling, "estimate_feeder_cost", estimate)
+    cache = scheduling.load_cost_cache(cache_file)
+    assert scheduling.get_cached_feeder_cost(path, cache) == 18 * 48
+
+    buses_file = path / "topology" / "buses.csv"
+    os.utime(buses_file, ns=(0, buses_file.stat().st_mtime_ns + 10**9))
+    with pytest.raises(AssertionError):
+        scheduling.get_cached_feeder_cost(path, cache)
+
+
+def test_task_costs_by_runtime_and_estimate(tmp_path, monkeypatch):
+    monkeypatch.setattr(scheduling, "load_cost_cache", lambda: {})
+    saved = []
+    monkeypatch.setattr(scheduling, "save_cost_cache", saved.append)
+
+    def run_dispatch_optimization():
+        pass
+
+    tasks = [
+        {
+            "name": f"task_{feeder}",
+            "actions": [
+                (
+                    run_dispatch_optimization,
+                    [],
+                    {
+                        "obj_or_path": write_feeder(
+                            tmp_path / feeder, n_buses=n_buses
+                        )
+                    },
+                )
+            ],
+        }
+        for feeder, n_buses in [("01", 10), ("02", 30)]
+    ] + [{"name": "concat", "actions": [(print, [], {})]}]
+
+    costs = scheduling.get_task_costs(
+        "min_pot", tasks, runtimes={"min_pot:task_01": 18 * 48 * 2}
+    )
+
+    # estimate scaled by the ratio of the recorded task
+    assert costs == [18 * 48 * 2, 38 * 48 * 2, None]
+    (cache,) = saved
+    assert sorted(cache) == [str(tmp_path / "01"), str(tmp_path / "02")]
@@ -0,0 +1,117 @@
+from copy import deepcopy
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("edisgo")
+
+from lobaflex.tools import snapshot  # noqa: E402
+from lobaflex.tools.object_cache import ObjectCache  # noqa: E402
+
+
+class EDisGo(SimpleNamespace):
+    pass
+
+
+@pytest.fixture
+def imports(monkeypatch):
+    """Calls of load_edisgo."""
+    calls = []
+
+    def load_edisgo(edisgo_path, **kwargs):
+        calls.append((edisgo_path, kwargs))
+        return EDisGo(
+            heat_pump=SimpleNamespace(cop_df="cop"),
+            results="imported",
+        )
+
+    monkeypatch.setattr(snapshot, "load_edisgo", load_edisgo)
+    return calls
+
+
+def test_deepcopy_keeps_component_lazy(tmp_path, imports):
+    edisgo_obj = EDisGo(topology="topology")
+    edisgo_obj.heat_pump = snapshot.LazyComponent(
+        edisgo_obj, "heat_pump", tmp_path
+    )
+
+    edisgo_copy = deepcopy(edisgo_obj)
+
+    assert not imports
+    lazy = edisgo_copy.heat_pump
+    assert isinstance(lazy, snapshot.LazyComponent)
+    assert lazy._edisgo_obj is edisgo_copy
+    assert lazy._edisgo_path == tmp_path
+    # imported to the copy only
+    assert lazy.cop_df == "cop"
+    assert edisgo_copy.heat_pump is lazy._component
+    assert not edisgo_obj.heat_pump.loaded
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ObjectCache(max_bytes=2**20)
+    monkeypatch.setattr(snapshot, "get_object_cache", lambda: cache)
+    return cache
+
+
+def cache_dump(tmp_path, save=None, **kwargs):
+    edisgo_obj = EDisGo(topology="topology", results="results")
+    save = save or dict.fromkeys(snapshot.COMPONENTS, True)
+    snapshot._cache_edisgo(
+        edisgo_obj,
+        tmp_path,
+        save,
+        snapshot.ELECTROMOBILITY_ATTRIBUTES,
+        dict(save_topology=True, save_results=True, **kwargs),
+    )
+
+
+def test_stage_import_from_cache(tmp_path, cache, imports):
+    cache_dump(tmp_path)
+
+    edisgo_obj = snapshot.load_stage_edisgo(
+        tmp_path, "grid_reinforcement", import_results=True
+    )
+
+    assert not imports
+    assert edisgo_obj.results == "results"
+
+
+def test_results_dropped_if_not_imported(tmp_path, cache, imports):
+    cache_dump(tmp_path)
+
+    edisgo_obj = snapshot.load_stage_edisgo(tmp_path, "feeder_extraction")
+
+    assert not imports
+    assert isinstance(edisgo_obj.results, snapshot.Results)
+
+
+@pytest.mark.parametrize(
+    "save, kwargs",
+    [
+        (dict(timeseries=True, heat_pump=False, electromobility=True), {}),
+        (None, dict(reduce_memory=True)),
+    ],
+    ids=["component_not_saved", "unknown_argument"],
+)
+def test_cache_skipped_on_different_content(
+    tmp_path, cache, imports, save, kwargs
+):
+    cache_dump(tmp_path, save=save, **kwargs)
+
+    snapshot.load_stage_edisgo(tmp_path, "grid_reinforcement")
+
+    assert len(imports) == 1
+
+
+def test_cache_skipped_for_import_arguments(tmp_path, cache, imports):
+    cache_dump(tmp_path)
+
+    snapshot.load_stage_edisgo(
+        tmp_path, "grid_reinforcement", import_overlying_grid=False
+    )
+
+    ((_, kwargs),) = imports
+    assert kwargs["import_timeseries"]
+    assert not kwargs["import_heat_pump"]
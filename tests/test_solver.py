@@ -0,0 +1,76 @@
+import pytest
+
+pm = pytest.importorskip("pyomo.environ")
+
+from lobaflex.opt.solver import (  # noqa: E402
+    get_warm_start_values,
+    set_warm_start_values,
+)
+
+
+def build_model(n_timesteps):
+    model = pm.ConcreteModel()
+    model.time_set = pm.RangeSet(0, n_timesteps - 1)
+    model.time_non_zero = model.time_set - [model.time_set.at(1)]
+    model.buses = pm.Set(initialize=["a", "b"])
+    model.power = pm.Var(model.buses, model.time_set)
+    model.charging = pm.Var(model.time_set)
+    model.delta = pm.Var(model.time_non_zero)
+    model.slack = pm.Var()
+    return model
+
+
+@pytest.fixture
+def solved_model():
+    model = build_model(6)
+    for (bus, t), var in model.power.items():
+        var.set_value(10 * t + (bus == "b"))
+    for t, var in model.charging.items():
+        var.set_value(t)
+    for t, var in model.delta.items():
+        var.set_value(-t)
+    model.slack.set_value(1)
+    return model
+
+
+def test_only_variables_of_time_set(solved_model):
+    warm_start_values = get_warm_start_values(solved_model)
+
+    assert sorted(warm_start_values) == ["charging", "power"]
+    position, timesteps, values = warm_start_values["power"]
+    assert position == 1
+    assert timesteps == list(range(6))
+    assert values[("b", 2)] == 21
+
+
+def test_shifted_start_values(solved_model):
+    model = build_model(6)
+
+    set_warm_start_values(model, get_warm_start_values(solved_model), shift=4)
+
+    # shifted by 4 and padded with the last value of the previous solution
+    assert [model.charging[t].value for t in range(6)] == [4, 5, 5, 5, 5, 5]
+    assert model.power["b", 1].value == 51
+    assert model.delta[1].value is None
+    assert model.slack.value is None
+
+
+def test_model_without_time_set(solved_model):
+    model = pm.ConcreteModel()
+    model.time = pm.RangeSet(0, 5)
+    model.charging = pm.Var(model.time)
+
+    assert get_warm_start_values(model) == {}
+    set_warm_start_values(model, get_warm_start_values(solved_model), shift=4)
+    assert model.charging[0].value is None
+
+
+def test_fixed_variables_keep_value(solved_model):
+    model = build_model(6)
+    model.charging[2].fix(0)
+
+    set_warm_start_values(model, get_warm_start_values(solved_model), shift=4)
+
+    assert model.charging[2].fixed
+    assert model.charging[2].value == 0
+    assert model.charging[1].value == 5
@@ -0,0 +1,215 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("edisgo")
+
+from lobaflex.opt import timeframe_selection  # noqa: E402
+
+INDEX = pd.date_range("2011-01-01", periods=24 * 28, freq="h")
+
+
+@pytest.fixture
+def df():
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        rng.random((len(INDEX), 3)), index=INDEX, columns=["a", "b", "c"]
+    )
+
+
+TIMEFRAMES = {
+    "contiguous": INDEX[24:72],
+    "two_periods": INDEX[24:72].append(INDEX[200:248]),
+    "single": INDEX[[5]],
+    "empty": INDEX[:0],
+}
+
+
+@pytest.mark.parametrize("timeframe", TIMEFRAMES.values(), ids=TIMEFRAMES)
+def test_select_timeframe_matches_label_slicing(df, timeframe):
+    selected = timeframe_selection.select_timeframe(df, timeframe)
+
+    # the frequency of the index is kept for slices
+    pd.testing.assert_frame_equal(
+        selected, df.loc[timeframe], check_freq=False
+    )
+    pd.testing.assert_series_equal(
+        timeframe_selection.select_timeframe(df["a"], timeframe),
+        df["a"].loc[timeframe],
+        check_freq=False,
+    )
+
+
+def test_contiguous_timeframe_is_view(df):
+    timeframe = TIMEFRAMES["contiguous"]
+
+    view = timeframe_selection.select_timeframe(df, timeframe)
+    copy = timeframe_selection.select_timeframe(df, timeframe, copy=True)
+
+    assert np.shares_memory(view["a"].values, df["a"].values)
+    assert not np.shares_memory(copy["a"].values, df["a"].values)
+    pd.testing.assert_frame_equal(copy, df.loc[timeframe])
+
+
+def test_positions_cached_per_index(df, monkeypatch):
+    calls = []
+    get_positions = timeframe_selection.get_timeframe_positions
+
+    def counted(index, timeframe):
+        calls.append(index)
+        return get_positions(index, timeframe)
+
+    monkeypatch.setattr(
+        timeframe_selection, "get_timeframe_positions", counted
+    )
+    cache = {}
+    timeframe = TIMEFRAMES["two_periods"]
+    for column in df:
+        timeframe_selection.select_timeframe(
+            df[column], timeframe, cache=cache
+        )
+    other = df.set_index(INDEX.copy(deep=True))
+    selected = timeframe_selection.select_timeframe(
+        other, timeframe, cache=cache
+    )
+
+    # positions are determined once for equal indexes
+    assert len(calls) == 1
+    pd.testing.assert_frame_equal(selected, df.loc[timeframe])
+
+
+def test_select_timeframe_with_duplicated_index(df):
+    df = pd.concat([df.iloc[:48], df.iloc[24:48]])
+    timeframe = INDEX[30:40]
+
+    pd.testing.assert_frame_equal(
+        timeframe_selection.select_timeframe(df, timeframe), df.loc[timeframe]
+    )
+
+
+def test_timeframe_not_in_index(df):
+    timeframe = pd.date_range("2010-12-31", periods=48, freq="h")
+
+    with pytest.raises(KeyError):
+        timeframe_selection.select_timeframe(df, timeframe)
+
+
+def residual_load_grid(sign):
+    residual_load = pd.Series(sign * np.ones(len(INDEX)), index=INDEX)
+    return SimpleNamespace(
+        timeseries=SimpleNamespace(residual_load=residual_load)
+    )
+
+
+SELECTION = {
+    "method": "grid_mapping",
+    "window_days": 7,
+    "load_grids": [2534, 177],
+    "feedin_grids": [1056, 176, 1690, 1811],
+}
+
+
+@pytest.mark.parametrize(
+    "grid_id, grid_type",
+    [(177, "load"), ("1056", "feedin"), (1111, "feedin")],
+)
+def test_grid_type_by_mapping(grid_id, grid_type):
+    # the mapping takes precedence over the residual load, unlisted grids
+    # are classified by it
+    edisgo_obj = residual_load_grid(-1)
+
+    assert (
+        timeframe_selection.get_grid_type(edisgo_obj, grid_id, SELECTION)
+        == grid_type
+    )
+
+
+def test_grid_type_by_residual_load():
+    selection = dict(SELECTION, method="observation_periods")
+
+    for sign, grid_type in [(1, "load"), (-1, "feedin")]:
+        edisgo_obj = residual_load_grid(sign)
+        assert (
+            timeframe_selection.get_grid_type(edisgo_obj, 1111, selection)
+            == grid_type
+        )
+
+
+def test_grid_type_without_selection():
+    edisgo_obj = residual_load_grid(1)
+
+    selection = dict(SELECTION, method=None)
+    assert (
+        timeframe_selection.get_grid_type(edisgo_obj, 177, selection) is None
+    )
+    with pytest.raises(ValueError):
+        timeframe_selection.get_grid_type(
+            edisgo_obj, 177, dict(SELECTION, method="clustering")
+        )
+
+
+@pytest.fixture
+def residual_load():
+    rng = np.random.default_rng(0)
+    return pd.Series(rng.normal(size=len(INDEX)), index=INDEX)
+
+
+def brute_force_period(residual_load, window_days, criterion):
+    """Window starting at the first hour of a day with the max or min mean
+    by rolling means."""
+    values = (
+        residual_load.abs() if criterion.startswith("abs_") else residual_load
+    )
+    means = (
+        values.rolling(window_days * 24).mean().shift(-window_days * 24 + 1)
+    )
+    means = means.iloc[::24].dropna()
+    return means.idxmax() if criterion.endswith("max") else means.idxmin()
+
+
+@pytest.mark.parametrize("window_days", [1, 7])
+def test_observation_periods_match_rolling_mean(residual_load, window_days):
+    edisgo_obj = SimpleNamespace(
+        timeseries=SimpleNamespace(residual_load=residual_load)
+    )
+    criteria = ["max", "min", "abs_max", "abs_min"]
+
+    periods = timeframe_selection.find_observation_periods(
+        edisgo_obj, window_days=[window_days], criteria=criteria
+    )
+
+    assert list(periods.criterion) == criteria
+    for period in periods.itertuples():
+        assert period.start == brute_force_period(
+            residual_load, window_days, period.criterion
+        )
+        assert period.end - period.start == pd.Timedelta(
+            hours=window_days * 24 - 1
+        )
+        assert period.value == pytest.approx(
+            (
+                residual_load.abs()
+                if "abs" in period.criterion
+                else residual_load
+            )
+            .loc[period.start : period.end]
+            .mean()
+        )
+
+
+def test_observation_periods_do_not_overlap(residual_load):
+    edisgo_obj = SimpleNamespace(
+        timeseries=SimpleNamespace(residual_load=residual_load)
+    )
+
+    periods = timeframe_selection.find_observation_periods(
+        edisgo_obj, window_days=7, criteria=["max"], n_periods=3
+    )
+
+    timeframe = timeframe_selection.get_periods_timeframe(periods)
+    assert list(periods["rank"]) == [0, 1, 2]
+    assert len(timeframe) == 3 * 7 * 24
+    assert not timeframe.duplicated().any()
+    assert timeframe.isin(INDEX).all()
@@ -0,0 +1,299 @@
+import json
+
+import pytest
+
+from doit.dependency import Dependency, JsonDB
+
+pytest.importorskip("edisgo")
+
+from lobaflex.opt import work_queue  # noqa: E402
+from lobaflex.tools import manifest, pydoit  # noqa: E402
+from lobaflex.tools.ledger import RuntimeLedger  # noqa: E402
+
+
+def make_job(job_id, deps=(), digest="a"):
+    return {
+        "id": job_id,
+        "digest": digest,
+        "function": "run_dispatch_optimization",
+        "kwargs": {},
+        "deps": list(deps),
+    }
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return work_queue.WorkQueue(tmp_path / "queue")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = {"now": 0.0}
+    monkeypatch.setattr(work_queue.time, "monotonic", lambda: clock["now"])
+    return clock
+
+
+def test_claim_by_priority_and_dependencies(queue):
+    queue.publish(
+        [
+            make_job("min_pot:concat", deps=["min_pot:01", "min_pot:02"]),
+            make_job("min_pot:01"),
+            make_job("min_pot:02"),
+        ]
+    )
+
+    first = queue.claim("worker_1")
+    second = queue.claim("worker_2")
+    assert [first["id"], second["id"]] == ["min_pot:01", "min_pot:02"]
+    # dependencies are running
+    assert queue.claim("worker_1") is None
+
+    assert queue.complete(first, {"objective": 1})
+    assert queue.complete(second, {"objective": 2})
+    assert queue.claim("worker_1")["id"] == "min_pot:concat"
+    done, _ = queue.jobs("done")
+    assert work_queue._decode(done["result"]) == {"objective": 1}
+
+
+def test_failed_dependency_fails_job(queue):
+    queue.publish(
+        [make_job("min_pot:01"), make_job("min_pot:concat", ["min_pot:01"])]
+    )
+
+    job = queue.claim("worker_1")
+    assert queue.fail(job, "Traceback")
+
+    assert queue.claim("worker_1") is None
+    assert queue.status() == {
+        "pending": 0,
+        "running": 0,
+        "done": 0,
+        "failed": 2,
+    }
+
+
+def test_stale_job_is_requeued(queue, clock):
+    queue.publish([make_job("min_pot:01")])
+    queue.claim("worker_1")
+
+    assert queue.requeue_stale(timeout=10) == 0
+    clock["now"] = 9
+    assert queue.requeue_stale(timeout=10) == 0
+    clock["now"] = 10
+    assert queue.requeue_stale(timeout=10) == 1
+
+    assert queue.claim("worker_2")["worker"] == "worker_2"
+
+
+def test_job_with_heartbeat_is_not_requeued(queue, clock):
+    queue.publish([make_job("min_pot:01")])
+    job = queue.claim("worker_1")
+    file = queue._running_file(job)
+    # the clock of the worker node is behind
+    mtime = file.stat().st_mtime_ns - 3600 * 10**9
+
+    queue.requeue_stale(timeout=10)
+    for i in range(1, 4):
+        clock["now"] = 9 * i
+        work_queue.os.utime(file, ns=(mtime + i, mtime + i))
+        assert queue.requeue_stale(timeout=10) == 0
+
+
+def test_requeued_job_is_owned_by_new_worker(queue, clock):
+    queue.publish([make_job("min_pot:01")])
+    old = queue.claim("worker_1")
+    queue.requeue_stale(timeout=10)
+    clock["now"] = 10
+    queue.requeue_stale(timeout=10)
+
+    # the old worker finishes before the job is claimed again
+    assert not queue.complete(old, {"objective": 1})
+    new = queue.claim("worker_2")
+    # and after
+    assert not queue.fail(old, "Traceback")
+    assert queue.status()["running"] == 1
+    assert queue.complete(new, {"objective": 2})
+
+    (done,) = queue.jobs("done")
+    assert done["worker"] == "worker_2"
+    assert work_queue._decode(done["result"]) == {"objective": 2}
+
+
+def test_publish_replaces_changed_jobs(queue):
+    assert queue.publish([make_job("min_pot:01"), make_job("min_pot:02")]) == 2
+    job = queue.claim("worker_1")
+    queue.complete(job, {"objective": 1})
+
+    # unchanged jobs are kept
+    assert queue.publish([make_job("min_pot:01"), make_job("min_pot:02")]) == 0
+    assert queue.publish([make_job("min_pot:01", digest="b")]) == 1
+
+    assert queue.status()["done"] == 0
+    pending, _ = queue.jobs("pending")
+    assert (pending["id"], pending["digest"]) == ("min_pot:01", "b")
+
+
+def test_running_job_is_not_replaced(queue):
+    queue.publish([make_job("min_pot:01")])
+    queue.claim("worker_1")
+
+    assert queue.publish([make_job("min_pot:01", digest="b")]) == 0
+    assert queue.status()["running"] == 1
+
+
+def test_manifest_changes_are_recorded(tmp_path, monkeypatch):
+    run_dir = tmp_path / "run"
+    file = run_dir / "1111" / "min_pot" / "results" / "01" / "x.csv"
+    file.parent.mkdir(parents=True)
+    file.write_text("a\n1\n")
+    monkeypatch.setattr(manifest, "results_dir", tmp_path)
+    monkeypatch.setattr(
+        manifest, "get_config", lambda path: {"result_manifest": True}
+    )
+    record = {
+        "file": file,
+        "grid": 1111,
+        "feeder": "01",
+        "parameter": "x",
+        "kind": "iteration",
+    }
+
+    with manifest.record_manifest_changes() as changes:
+        manifest.get_manifest(file, create=True).add([record])
+    assert not (run_dir / manifest.MANIFEST_NAME).exists()
+    assert manifest.get_manifest(file) is None
+
+    # changes are stored in the job file
+    manifest.apply_manifest_changes(json.loads(json.dumps(changes)))
+    (row,) = manifest.get_manifest(file).query().to_dict("records")
+    assert (row["file"], row["objective"]) == (str(file.resolve()), "min_pot")
+
+
+def run_dispatch_optimization(obj_or_path, objective):
+    return {"objective": objective}
+
+
+@pytest.fixture
+def doit_tasks(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        pydoit, "get_config", lambda path: {"run_id": "test", "version": 0}
+    )
+    ledger_file = tmp_path / "ledger.sqlite"
+    monkeypatch.setattr(
+        work_queue, "RuntimeLedger", lambda: RuntimeLedger(ledger_file)
+    )
+    feeder = tmp_path / "feeder"
+    feeder.mkdir()
+    (feeder / "buses.csv").write_text("name\nbus_1\n")
+    tasks = [
+        {
+            "name": "1111/01",
+            "actions": [
+                (
+                    run_dispatch_optimization,
+                    [],
+                    {"obj_or_path": feeder, "objective": "minimize_loading"},
+                )
+            ],
+            "uptodate": [
+                pydoit.content_uptodate(
+                    [feeder], functions=[run_dispatch_optimization]
+                )
+            ],
+        }
+    ]
+    return tasks, feeder
+
+
+def test_publish_and_collect_tasks(tmp_path, doit_tasks):
+    tasks, feeder = doit_tasks
+    dep_manager = Dependency(JsonDB, str(tmp_path / "doit.json"))
+    path = tmp_path / "queue"
+    queue = work_queue.WorkQueue(path)
+
+    assert work_queue.publish_tasks(path, "min_pot", tasks, dep_manager) == 1
+    job = queue.claim("worker_1")
+    assert queue.complete(job, {"objective": "minimize_loading"})
+    assert work_queue.collect_jobs(path, "min_pot", tasks, dep_manager) == {
+        "collected": 1,
+        "failed": 0,
+    }
+    # collected once
+    assert work_queue.collect_jobs(path, "min_pot", tasks, dep_manager) == {
+        "collected": 0,
+        "failed": 0,
+    }
+    assert dep_manager.get_result("min_pot:1111/01") == {
+        "objective": "minimize_loading"
+    }
+    # skipped as uptodate even if the queue was removed
+    (path / "done" / queue._file_name(job["id"], job["priority"])).unlink()
+    assert work_queue.publish_tasks(path, "min_pot", tasks, dep_manager) == 0
+
+    (feeder / "buses.csv").write_text("name\nbus_2\n")
+    assert work_queue.publish_tasks(path, "min_pot", tasks, dep_manager) == 1
+
+
+def test_job_of_changed_task_is_not_collected(tmp_path, doit_tasks):
+    tasks, feeder = doit_tasks
+    dep_manager = Dependency(JsonDB, str(tmp_path / "doit.json"))
+    path = tmp_path / "queue"
+    queue = work_queue.WorkQueue(path)
+    work_queue.publish_tasks(path, "min_pot", tasks, dep_manager)
+    job = queue.claim("worker_1")
+    queue.complete(job, {"objective": "minimize_loading"})
+
+    (feeder / "buses.csv").write_text("name\nbus_2\n")
+
+    assert work_queue.collect_jobs(path, "min_pot", tasks, dep_manager) == {
+        "collected": 0,
+        "failed": 0,
+    }
+    assert dep_manager.get_values("min_pot:1111/01") == {}
+
+
+def test_task_without_job_function_is_not_published(
+    tmp_path, doit_tasks, caplog
+):
+    tasks, feeder = doit_tasks
+    tasks.append({"name": "export", "actions": [(print, [], {})]})
+
+    assert work_queue.publish_tasks(tmp_path / "queue", "min_pot", tasks) == 1
+    assert "min_pot:export can't be executed by workers" in caplog.text
+
+
+def test_job_of_task_is_built_once(tmp_path, doit_tasks, monkeypatch):
+    tasks, feeder = doit_tasks
+    dep_manager = Dependency(JsonDB, str(tmp_path / "doit.json"))
+    calls = []
+    task_to_job = work_queue.task_to_job
+
+    def count(*args, **kwargs):
+        calls.append(args)
+        return task_to_job(*args, **kwargs)
+
+    monkeypatch.setattr(work_queue, "task_to_job", count)
+
+    work_queue.publish_tasks(tmp_path / "queue", "min_pot", tasks, dep_manager)
+
+    assert len(calls) == 1
+
+
+def test_parallel_optimization_is_a_job_function():
+    task = {
+        "name": "concat_minimize_loading_1111",
+        "actions": [
+            (
+                work_queue.measure_resources(
+                    work_queue.run_dispatch_optimization_parallel
+                ),
+                [],
+                {"grid_id": 1111, "feeders": ["01"]},
+            )
+        ],
+    }
+
+    assert (
+        work_queue.get_job_function(task)
+        == "run_dispatch_optimization_parallel"
+    )